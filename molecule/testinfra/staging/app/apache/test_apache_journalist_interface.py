@@ -85,7 +85,7 @@ common_apache2_directory_declarations = """
   "WSGIDaemonProcess journalist processes=2 threads=30 display-name=%{{GROUP}} python-path={}".format(  # noqa
       securedrop_test_vars.securedrop_code),
   'WSGIProcessGroup journalist',
-  'WSGIScriptAlias / /var/www/journalist.wsgi',
+  'WSGIScriptAlias / /var/www/journalist.wsgi process-group=journalist application-group=%{GLOBAL}',  # noqa
   'WSGIPassAuthorization On',
   'Header set Cache-Control "no-store"',
   "Alias /static {}/static".format(securedrop_test_vars.securedrop_code),
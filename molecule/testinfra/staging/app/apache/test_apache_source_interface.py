@@ -25,7 +25,7 @@ def test_apache_headers_source_interface(File, header):
     "WSGIDaemonProcess source  processes=2 threads=30 display-name=%{{GROUP}} python-path={}".format(  # noqa
         securedrop_test_vars.securedrop_code),
     'WSGIProcessGroup source',
-    'WSGIScriptAlias / /var/www/source.wsgi',
+    'WSGIScriptAlias / /var/www/source.wsgi process-group=source application-group=%{GLOBAL}',  # noqa
     'Header set Cache-Control "no-store"',
     'Header set Referrer-Policy "same-origin"',
     "Alias /static {}/static".format(securedrop_test_vars.securedrop_code),
@@ -71,6 +71,33 @@ def test_securedrop_tmp_clean_cron(Command, Sudo):
         assert cronjob in cronlist
 
 
+def test_securedrop_prune_login_attempts_cron(Command, Sudo):
+    """ Ensure login attempt pruning cron job in place """
+    with Sudo():
+        cronlist = Command("crontab -l").stdout
+        cronjob = "@daily {}/manage.py prune-login-attempts".format(
+            sdvars.securedrop_code)
+        assert cronjob in cronlist
+
+
+def test_securedrop_db_maintenance_cron(Command, Sudo):
+    """ Ensure database maintenance cron job in place """
+    with Sudo():
+        cronlist = Command("crontab -l").stdout
+        cronjob = "@hourly {}/manage.py db-maintenance".format(
+            sdvars.securedrop_code)
+        assert cronjob in cronlist
+
+
+def test_securedrop_purge_pending_sources_cron(Command, Sudo):
+    """ Ensure pending source purging cron job in place """
+    with Sudo():
+        cronlist = Command("crontab -l").stdout
+        cronjob = "@daily {}/manage.py purge-pending-sources".format(
+            sdvars.securedrop_code)
+        assert cronjob in cronlist
+
+
 def test_app_workerlog_dir(File, Sudo):
     """ ensure directory for worker logs is present """
     f = File('/var/log/securedrop_worker')
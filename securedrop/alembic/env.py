@@ -14,7 +14,7 @@ fileConfig(config.config_file_name)
 
 # needed to import local modules
 sys.path.insert(0, path.realpath(path.join(path.dirname(__file__), '..')))
-from db import db  # noqa
+from db import db, configure_engine  # noqa
 
 try:
     # These imports are only needed for offline generation of automigrations.
@@ -60,10 +60,10 @@ def run_migrations_online():
     and associate a connection with the context.
 
     """
-    connectable = engine_from_config(
+    connectable = configure_engine(engine_from_config(
         config.get_section(config.config_ini_section),
         prefix='sqlalchemy.',
-        poolclass=pool.NullPool)
+        poolclass=pool.NullPool))
 
     with connectable.connect() as connection:
         context.configure(
@@ -0,0 +1,35 @@
+"""switch to incremental auto-vacuum
+
+Revision ID: 3da3fcab826a
+Revises: e1dce86e38ad
+Create Date: 2019-01-29 15:21:44.318762
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3da3fcab826a'
+down_revision = 'e1dce86e38ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # With FULL auto-vacuum, every commit that frees pages moves pages
+    # around to truncate the file, which makes bulk deletions slow. With
+    # INCREMENTAL, free pages are kept until `maintenance.vacuum_database`
+    # reclaims them. secure_delete still overwrites the deleted content.
+    #
+    # Changing from NONE, which databases created before auto_vacuum was
+    # first set are still using, only takes effect after a VACUUM.
+    conn = op.get_bind()
+    conn.execute(sa.text('PRAGMA auto_vacuum = INCREMENTAL'))
+    conn.execute(sa.text('VACUUM'))
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text('PRAGMA auto_vacuum = FULL'))
+    conn.execute(sa.text('VACUUM'))
@@ -0,0 +1,70 @@
+"""add pack locations to submissions and replies
+
+Revision ID: 7c6b9a0d2e41
+Revises: 3da3fcab826a
+Create Date: 2019-02-05 11:42:17.604289
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c6b9a0d2e41'
+down_revision = '3da3fcab826a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Both columns are NULL for the messages and replies that have a file of
+    # their own, which all of the existing ones do
+    for table in ('submissions', 'replies'):
+        op.add_column(table, sa.Column('pack_generation', sa.Integer(),
+                                       nullable=True))
+        op.add_column(table, sa.Column('pack_offset', sa.Integer(),
+                                       nullable=True))
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table in ('submissions', 'replies'):
+        packed = conn.execute(sa.text(
+            'SELECT COUNT(*) FROM {} WHERE pack_offset IS NOT NULL'.format(
+                table))).scalar()
+        if packed:
+            raise RuntimeError(
+                '{} {} are in pack files: run `./manage.py unpack-messages` '
+                'with STORE_PACK_MESSAGES disabled before downgrading'.format(
+                    packed, table))
+
+    # SQLite can not drop columns. The tables are recreated from their DDL,
+    # without the columns the upgrade appended to it, so that the previous
+    # schema is restored exactly. batch_alter_table would not: it fails to
+    # reflect the foreign key of replies to journalists_tmp left by an
+    # earlier migration.
+    for table in ('submissions', 'replies'):
+        ddl = conn.execute(sa.text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' "
+            "AND name = :table"), table=table).scalar()
+        ddl = re.sub(r',\s*pack_(generation|offset) INTEGER', '', ddl)
+        indexes = conn.execute(sa.text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            "AND tbl_name = :table AND sql IS NOT NULL"), table=table) \
+            .fetchall()
+        columns = [row[1] for row in conn.execute(
+            sa.text('PRAGMA table_info({})'.format(table)))
+            if not row[1].startswith('pack_')]
+
+        op.rename_table(table, table + '_tmp')
+        for name, _ in indexes:
+            op.drop_index(name, table + '_tmp')
+        conn.execute(sa.text(ddl))
+        conn.execute(sa.text(
+            'INSERT INTO {table} SELECT {columns} FROM {table}_tmp'.format(
+                table=table, columns=', '.join(columns))))
+        op.drop_table(table + '_tmp')
+        for _, sql in indexes:
+            conn.execute(sa.text(sql))
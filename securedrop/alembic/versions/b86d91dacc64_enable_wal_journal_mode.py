@@ -0,0 +1,28 @@
+"""enable WAL journal mode
+
+Revision ID: b86d91dacc64
+Revises: f2833ac34bb6
+Create Date: 2019-01-15 14:02:37.512874
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b86d91dacc64'
+down_revision = 'f2833ac34bb6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Unlike the other pragmas (see `db.configure_engine`), the journal mode
+    # is stored in the database file, so it only needs to be set once.
+    conn = op.get_bind()
+    conn.execute(sa.text('PRAGMA journal_mode = WAL'))
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text('PRAGMA journal_mode = DELETE'))
@@ -0,0 +1,40 @@
+"""add indexes for hot queries
+
+Revision ID: e1dce86e38ad
+Revises: b86d91dacc64
+Create Date: 2019-01-22 11:48:05.106311
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1dce86e38ad'
+down_revision = 'b86d91dacc64'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_sources_pending_last_updated',
+     'sources', ['pending', 'last_updated']),
+    ('ix_submissions_source_id_downloaded',
+     'submissions', ['source_id', 'downloaded']),
+    ('ix_submissions_filename',
+     'submissions', ['filename']),
+    ('ix_replies_source_id_deleted_by_source',
+     'replies', ['source_id', 'deleted_by_source']),
+    ('ix_source_stars_source_id',
+     'source_stars', ['source_id']),
+    ('ix_journalist_login_attempt_journalist_id_timestamp',
+     'journalist_login_attempt', ['journalist_id', 'timestamp']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class ExecutorBusy(Exception):
+
+    """Raised when a BoundedExecutor already has as many calls waiting as it
+    allows."""
+
+
+class BoundedExecutor(object):
+    """Runs at most `workers` calls at the same time in this process, in the
+    calling threads. Up to `max_queued` more calls wait for their turn, and
+    any call beyond that is rejected right away with `ExecutorBusy` rather
+    than tying up yet another request thread.
+
+    This is meant for expensive calls, like hashing passwords, that release
+    the GIL: the work happens in the caller's thread, but the number of
+    them competing for the CPU and memory is bounded.
+    """
+
+    def __init__(self, name, workers, max_queued):
+        self.name = name
+        self.workers = workers
+        self.max_queued = max_queued
+        self._slots = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = dict(calls=0, rejected=0, queued_time=0.0,
+                           max_queued_time=0.0, run_time=0.0,
+                           max_pending=0)
+
+    def run(self, func, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queued:
+                self._stats['rejected'] += 1
+                raise ExecutorBusy('{} calls already pending for {}'.format(
+                    self._pending, self.name))
+            self._pending += 1
+            self._stats['max_pending'] = max(self._stats['max_pending'],
+                                             self._pending)
+
+        start = time.time()
+        try:
+            with self._slots:
+                started = time.time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(started - start, time.time() - started)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _record(self, queued_time, run_time):
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['queued_time'] += queued_time
+            self._stats['max_queued_time'] = max(
+                self._stats['max_queued_time'], queued_time)
+            self._stats['run_time'] += run_time
+        log.debug('{} waited {:.3f}s and ran for {:.3f}s'.format(
+            self.name, queued_time, run_time))
+
+    def stats(self):
+        """Return the timing metrics collected so far: the number of calls
+        that ran and that were rejected, the total and maximum time spent
+        waiting, the total time spent running, and the highest number of
+        calls pending at once."""
+        with self._lock:
+            return dict(self._stats)
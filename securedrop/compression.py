@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+import Queue
+import collections
+import multiprocessing
+import os
+import struct
+import threading
+import zlib
+
+# gzip levels of file submissions. Those that would not get much smaller
+# are stored in the .gz file uncompressed, which is only there to carry
+# their original filename.
+STORE = 0
+FAST = 1
+DEFAULT = 6
+
+# The start of files in formats which are compressed already: archives,
+# images, audio and video
+COMPRESSED_MAGIC = (
+    b'PK\x03\x04',  # zip, and the formats based on it: docx, odt, epub...
+    b'\x1f\x8b',  # gzip
+    b'BZh',  # bzip2
+    b'\xfd7zXZ\x00',  # xz
+    b'7z\xbc\xaf\x27\x1c',  # 7z
+    b'Rar!\x1a\x07',  # rar
+    b'\x28\xb5\x2f\xfd',  # zstd
+    b'\xff\xd8\xff',  # jpeg
+    b'\x89PNG\r\n\x1a\n',  # png
+    b'GIF87a',
+    b'GIF89a',
+    b'ID3',  # mp3
+    b'OggS',
+    b'fLaC',
+    b'\x1a\x45\xdf\xa3',  # matroska and webm
+)
+
+# Formats which start with the size of a box, then its type
+COMPRESSED_BOXES = (
+    b'ftyp',  # mp4, mov, m4a, heic
+)
+
+# How small a sample has to get when compressed quickly, relative to its
+# size, for the file to be compressed at all, and at the default level
+STORE_RATIO = 0.95
+FAST_RATIO = 0.8
+
+
+def is_compressed(sample):
+    """Return whether `sample`, the start of a file, is that of a format
+    which is compressed already."""
+    return sample.startswith(COMPRESSED_MAGIC) or \
+        sample[4:8] in COMPRESSED_BOXES
+
+
+def gzip_level(sample):
+    """Return the gzip level to compress a file with, given `sample`, its
+    first chunk.
+
+    Files in a format compressed already are stored. Otherwise, the ratio
+    `sample` gets compressed to at the fastest level estimates its entropy:
+    files that barely get smaller, like PDFs made of compressed streams, are
+    stored too, those that get a little smaller are compressed quickly, and
+    the others are compressed at the default level.
+    """
+    if not sample:
+        return DEFAULT
+    if is_compressed(sample):
+        return STORE
+
+    ratio = float(len(zlib.compress(sample, FAST))) / len(sample)
+    if ratio > STORE_RATIO:
+        return STORE
+    if ratio > FAST_RATIO:
+        return FAST
+    return DEFAULT
+
+
+# How many threads compress a file submission, unless GZIP_THREADS is set in
+# the configuration
+GZIP_THREADS = min(multiprocessing.cpu_count(), 4)
+
+# How much of a file each thread compresses at a time
+BLOCK_SIZE = 512 * 1024
+
+
+class _Block(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.output = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ParallelGzipFile(object):
+    """Write-only gzip file, like gzip.GzipFile with `mtime=0`, whose data is
+    compressed by `threads` threads, in blocks of `block_size` bytes, like
+    pigz does.
+
+    Each block is compressed on its own and flushed to a byte boundary, so
+    that they can be concatenated into the single deflate stream of a
+    standard gzip file, which carries `filename`. Blocks do not share their
+    history, which makes the file a little bigger than gzip.GzipFile would.
+    At most twice as many blocks as threads are in memory at a time.
+    """
+
+    def __init__(self, filename, fileobj, compresslevel=DEFAULT,
+                 threads=GZIP_THREADS, block_size=BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.threads = threads
+        self.block_size = block_size
+        self._buffer = []
+        self._buffer_size = 0
+        self._crc = zlib.crc32(b'') & 0xffffffff
+        self._size = 0
+        # Blocks being compressed, in the order they are written in
+        self._pending = collections.deque()
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._write_header(filename)
+
+    def _write_header(self, filename):
+        # Like gzip.GzipFile, without the extension added to the name of the
+        # file it writes to
+        fname = os.path.basename(filename)
+        if fname.endswith('.gz'):
+            fname = fname[:-3]
+        flags = 0x08 if fname else 0
+        self.fileobj.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, flags, 0,
+                                       2, 255))
+        if fname:
+            self.fileobj.write(fname + b'\0')
+
+    def _compress(self, data):
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED,
+                                      -zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _work(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            try:
+                block.output = self._compress(block.data)
+            except Exception as e:
+                block.error = e
+            finally:
+                block.done.set()
+
+    def _write_oldest(self):
+        block = self._pending.popleft()
+        block.done.wait()
+        if block.error:
+            raise block.error
+        self.fileobj.write(block.output)
+
+    def _submit(self, data, last=False):
+        self._crc = zlib.crc32(data, self._crc) & 0xffffffff
+        self._size += len(data)
+        # Files of a single block are not worth starting threads for
+        if self.threads <= 1 or (last and not self._workers):
+            self.fileobj.write(self._compress(data))
+            return
+
+        if not self._workers:
+            for _ in range(self.threads):
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+        block = _Block(data)
+        self._pending.append(block)
+        self._queue.put(block)
+        while len(self._pending) > 2 * self.threads:
+            self._write_oldest()
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self.block_size:
+            data = b''.join(self._buffer)
+            self._buffer = []
+            self._buffer_size = 0
+            for start in range(0, len(data) - self.block_size + 1,
+                               self.block_size):
+                self._submit(data[start:start + self.block_size])
+            rest = len(data) % self.block_size
+            if rest:
+                self._buffer.append(data[-rest:])
+                self._buffer_size = rest
+
+    def _stop(self):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def close(self, error=False):
+        """Compress what is left, then write the end of the deflate stream
+        and the trailer of the file, unless closing because of `error`."""
+        try:
+            if not error:
+                if self._buffer:
+                    self._submit(b''.join(self._buffer), last=True)
+                    self._buffer = []
+                while self._pending:
+                    self._write_oldest()
+                # An empty final block
+                self.fileobj.write(zlib.compressobj(
+                    self.compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS).flush())
+                self.fileobj.write(struct.pack('<II', self._crc,
+                                               self._size & 0xffffffff))
+        finally:
+            self._stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(error=exc_type is not None)
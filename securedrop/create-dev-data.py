@@ -13,6 +13,7 @@ import journalist_app
 from sdconfig import config
 from db import db
 from models import Journalist, Reply, Source, Submission
+from store import stored_filename
 
 
 def main():
@@ -64,7 +65,7 @@ def create_source_and_submissions(num_submissions=2, num_replies=2):
     db.session.commit()
 
     # Generate submissions directory and generate source key
-    os.mkdir(current_app.storage.path(source.filesystem_id))
+    current_app.storage.create_source_directory(source.filesystem_id)
     current_app.crypto_util.genkeypair(source.filesystem_id, codename)
 
     # Generate some test submissions
@@ -73,7 +74,6 @@ def create_source_and_submissions(num_submissions=2, num_replies=2):
         fpath = current_app.storage.save_message_submission(
             source.filesystem_id,
             source.interaction_count,
-            source.journalist_filename,
             'test submission!'
         )
         source.last_updated = datetime.datetime.utcnow()
@@ -83,8 +83,7 @@ def create_source_and_submissions(num_submissions=2, num_replies=2):
     # Generate some test replies
     for _ in range(num_replies):
         source.interaction_count += 1
-        fname = "{}-{}-reply.gpg".format(source.interaction_count,
-                                         source.journalist_filename)
+        fname = stored_filename(source.interaction_count, 'reply')
         current_app.crypto_util.encrypt(
             'this is a test reply!',
             [current_app.crypto_util.getkey(source.filesystem_id),
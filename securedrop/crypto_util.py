@@ -6,6 +6,7 @@ import os
 import io
 import scrypt
 import subprocess
+import threading
 from random import SystemRandom
 
 from base64 import b32encode
@@ -77,29 +78,64 @@ class CryptoUtil:
         self.scrypt_id_pepper = scrypt_id_pepper
         self.scrypt_gpg_pepper = scrypt_gpg_pepper
 
-        self.do_runtime_tests()
+        if self.scrypt_id_pepper == self.scrypt_gpg_pepper:
+            raise AssertionError('scrypt_id_pepper == scrypt_gpg_pepper')
 
-        self.gpg = gnupg.GPG(binary='gpg2', homedir=gpg_key_dir)
+        # The GPG keyring and the dictionaries are set up on first use, or
+        # by preload()
+        self.__gpg_key_dir = gpg_key_dir
+        self.__gpg = None  # type: gnupg.GPG
+        self.__gpg_lock = threading.Lock()
+        self.__nouns_file = nouns_file
+        self.__nouns = None  # type: List[Text]
+        self.__adjectives_file = adjectives_file
+        self.__adjectives = None  # type: List[Text]
 
         # map code for a given language to a localized wordlist
         self.__language2words = {}  # type: Dict[Text, List[str]]
 
-        with io.open(nouns_file) as f:
-            self.nouns = f.read().splitlines()
-
-        with io.open(adjectives_file) as f:
-            self.adjectives = f.read().splitlines()
-
-    # Make sure these pass before the app can run
+    # Make sure these pass before GPG is used
     def do_runtime_tests(self):
-        if self.scrypt_id_pepper == self.scrypt_gpg_pepper:
-            raise AssertionError('scrypt_id_pepper == scrypt_gpg_pepper')
         # crash if we don't have srm:
         try:
             subprocess.check_call(['srm'], stdout=subprocess.PIPE)
         except subprocess.CalledProcessError:
             pass
 
+    @property
+    def gpg(self):
+        # type: () -> gnupg.GPG
+        if self.__gpg is None:
+            with self.__gpg_lock:
+                if self.__gpg is None:
+                    self.do_runtime_tests()
+                    self.__gpg = gnupg.GPG(binary='gpg2',
+                                           homedir=self.__gpg_key_dir)
+        return self.__gpg
+
+    @property
+    def nouns(self):
+        # type: () -> List[Text]
+        if self.__nouns is None:
+            with io.open(self.__nouns_file) as f:
+                self.__nouns = f.read().splitlines()
+        return self.__nouns
+
+    @property
+    def adjectives(self):
+        # type: () -> List[Text]
+        if self.__adjectives is None:
+            with io.open(self.__adjectives_file) as f:
+                self.__adjectives = f.read().splitlines()
+        return self.__adjectives
+
+    def preload(self):
+        """Set up everything that is otherwise set up on first use."""
+        self.gpg
+        self.nouns
+        self.adjectives
+        self.get_wordlist('en')
+
     def get_wordlist(self, locale):
         # type: (Text) -> List[str]
         """" Ensure the wordlist for the desired locale is read and available
@@ -210,7 +246,11 @@ class CryptoUtil:
         else:
             return None
 
-    def encrypt(self, plaintext, fingerprints, output=None):
+    def encrypt(self, plaintext, fingerprints, output=None, compress=True):
+        """Encrypt `plaintext` to `fingerprints`, compressing it first
+        unless `compress` is False, for plaintexts that are compressed
+        already.
+        """
         # Verify the output path
         if output:
             current_app.storage.verify(output)
@@ -229,7 +269,9 @@ class CryptoUtil:
                                *fingerprints,
                                output=output,
                                always_trust=True,
-                               armor=False)
+                               armor=False,
+                               compress_algo='ZLIB' if compress
+                               else 'Uncompressed')
         if out.ok:
             return out.data
         else:
@@ -1,5 +1,128 @@
 # -*- coding: utf-8 -*-
 
+import sqlalchemy
+import time
+
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from sdconfig import SDConfig  # noqa: F401
+    from sqlalchemy.engine import Engine  # noqa: F401
 
 db = SQLAlchemy()
+
+# How long a connection waits for another one to release the write lock
+# before giving up with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = 30 * 1000
+
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def get_database_uri(config):
+    # type: (SDConfig) -> str
+    if config.DATABASE_ENGINE == "sqlite":
+        return config.DATABASE_ENGINE + ":///" + config.DATABASE_FILE
+    else:
+        return (
+            config.DATABASE_ENGINE + '://' +
+            config.DATABASE_USERNAME + ':' +
+            config.DATABASE_PASSWORD + '@' +
+            config.DATABASE_HOST + '/' +
+            config.DATABASE_NAME
+        )
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the per-connection SQLite settings. `journal_mode = WAL` is not
+    one of them because it is persistent and set by a migration.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA busy_timeout = {}'.format(SQLITE_BUSY_TIMEOUT_MS))
+    # Not persistent, so this has to be enabled on every connection
+    cursor.execute('PRAGMA secure_delete = ON')
+    # Keep temporary tables and indices out of the filesystem
+    cursor.execute('PRAGMA temp_store = MEMORY')
+    cursor.close()
+
+
+def configure_engine(engine):
+    # type: (Engine) -> Engine
+    """Set up `engine` the way every SecureDrop database connection expects,
+    whether it belongs to one of the web apps, a management command or a
+    background thread.
+    """
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    return engine
+
+
+def make_engine(db_uri):
+    # type: (str) -> Engine
+    """Create a configured engine for use outside of Flask-SQLAlchemy."""
+    return configure_engine(sqlalchemy.create_engine(db_uri))
+
+
+def instrument_lock_waits(app):
+    """Record how long each request waited for SQLite's write lock, and log
+    it once the request is done.
+
+    SQLite only allows one writer at a time, and pysqlite only takes the
+    write lock when the first write statement of a transaction is executed.
+    The time spent in that statement is therefore (almost entirely) time
+    spent waiting for any other writer to commit.
+    """
+    engine = db.get_engine(app)
+    if engine.dialect.name != 'sqlite':
+        return
+
+    def _record_lock_wait(conn):
+        start = conn.info.pop('lock_wait_start', None)
+        if start is not None and has_request_context():
+            g.db_lock_wait = g.get('db_lock_wait', 0) + time.time() - start
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if conn.info.get('holds_write_lock'):
+            return
+        if statement.lstrip().upper().startswith(_WRITE_STATEMENTS):
+            conn.info['lock_wait_start'] = time.time()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        if 'lock_wait_start' in conn.info:
+            conn.info['holds_write_lock'] = True
+            _record_lock_wait(conn)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        # Most likely "database is locked": we gave up waiting
+        if exception_context.connection is not None:
+            _record_lock_wait(exception_context.connection)
+
+    @event.listens_for(engine, 'commit')
+    @event.listens_for(engine, 'rollback')
+    def release_write_lock(conn):
+        conn.info.pop('holds_write_lock', None)
+
+    @event.listens_for(engine, 'checkin')
+    def checkin(dbapi_connection, connection_record):
+        connection_record.info.pop('holds_write_lock', None)
+        connection_record.info.pop('lock_wait_start', None)
+
+    @app.after_request
+    def log_lock_wait(response):
+        lock_wait = g.get('db_lock_wait')
+        if lock_wait is not None:
+            app.logger.debug('Waited {:.3f}s for the database write lock'
+                             .format(lock_wait))
+        return response
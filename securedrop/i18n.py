@@ -15,20 +15,49 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-from flask import request, session
+from flask import g, request, session
 from flask_babel import Babel
-from babel import core
+from babel import core, support
+from werkzeug.datastructures import LanguageAccept
+from werkzeug.http import parse_accept_header
 
 import collections
 import os
 import re
+import threading
 
 from os import path
 
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Dict, Optional, Tuple  # noqa: F401
+
 LOCALE_SPLIT = re.compile('(-|_)')
 LOCALES = ['en_US']
 babel = None
 
+# Metadata about each of the LOCALES, computed once by setup_app instead of
+# on every request
+LOCALE2NAME = collections.OrderedDict()  # type: Dict[str, str]
+TEXT_DIRECTIONS = {}  # type: Dict[str, str]
+RFC_5646_TAGS = {}  # type: Dict[str, str]
+BABEL_LOCALES = {}  # type: Dict[str, core.Locale]
+# Translation catalogs of the LOCALES, loaded on first use or by preload()
+TRANSLATIONS = {}  # type: Dict[str, support.Translations]
+_translations_source = None  # type: Optional[Tuple[str, str]]
+_translations_lock = threading.Lock()
+
+# Locales negotiated for the most recently seen Accept-Language headers
+ACCEPT_LANGUAGES_CACHE_SIZE = 256
+_accept_languages_cache = \
+    collections.OrderedDict()  # type: Dict[str, Optional[str]]
+_accept_languages_cache_lock = threading.Lock()
+
 
 class LocaleNotFound(Exception):
 
@@ -67,20 +96,77 @@ def setup_app(config, app):
         getattr(config, 'DEFAULT_LOCALE', None),
         translation_directories)
 
+    _build_registry(translation_directories, babel.domain)
+
     babel.localeselector(lambda: get_locale(config))
 
 
-def get_locale(config):
+def _build_registry(translation_directories, domain):
+    """Compute the metadata about LOCALES that is needed on every request.
+    Their translation catalogs are loaded by get_translations().
     """
-    Get the locale as follows, by order of precedence:
-    - l request argument or session['locale']
-    - browser suggested locale, from the Accept-Languages header
-    - config.DEFAULT_LOCALE
-    - 'en_US'
+    global _translations_source
+
+    for registry in (LOCALE2NAME, TEXT_DIRECTIONS, RFC_5646_TAGS,
+                     BABEL_LOCALES, TRANSLATIONS):
+        registry.clear()
+    for l in LOCALES:
+        locale = core.Locale.parse(l)
+        if l in NAME_OVERRIDES:
+            LOCALE2NAME[l] = NAME_OVERRIDES[l]
+        else:
+            LOCALE2NAME[l] = locale.languages[locale.language]
+        TEXT_DIRECTIONS[l] = locale.text_direction
+        RFC_5646_TAGS[l] = locale_to_rfc_5646(l)
+        BABEL_LOCALES[l] = locale
+    _translations_source = (translation_directories, domain)
+
+    with _accept_languages_cache_lock:
+        _accept_languages_cache.clear()
+
+
+def get_translations(locale):
+    # type: (str) -> support.Translations
+    """Return the translation catalog of `locale`, one of the LOCALES."""
+    translations = TRANSLATIONS.get(locale)
+    if translations is None:
+        with _translations_lock:
+            translations = TRANSLATIONS.get(locale)
+            if translations is None:
+                dirname, domain = _translations_source
+                translations = _load_translations(dirname, locale, domain)
+                TRANSLATIONS[locale] = translations
+    return translations
+
+
+def preload():
+    """Load the translation catalogs of all of the LOCALES."""
+    for l in LOCALES:
+        get_translations(l)
+
+
+def _load_translations(dirname, locale, domain):
+    # Same as what Flask-Babel does for each request in get_translations()
+    translations = support.Translations()
+    catalog = support.Translations.load(dirname, [locale], domain)
+    translations.merge(catalog)
+    if hasattr(catalog, 'plural'):
+        translations.plural = catalog.plural
+    return translations
+
+
+def negotiate_accept_languages(header):
+    """Return the best match among LOCALES for the Accept-Language `header`,
+    or None if nothing matches.
     """
-    locale = None
+    with _accept_languages_cache_lock:
+        if header in _accept_languages_cache:
+            locale = _accept_languages_cache.pop(header)
+            _accept_languages_cache[header] = locale
+            return locale
+
     accept_languages = []
-    for l in request.accept_languages.values():
+    for l in parse_accept_header(header, LanguageAccept).values():
         if '-' in l:
             sep = '-'
         else:
@@ -89,11 +175,30 @@ def get_locale(config):
             accept_languages.append(str(core.Locale.parse(l, sep)))
         except Exception:
             pass
+    locale = core.negotiate_locale(accept_languages, LOCALES)
+
+    with _accept_languages_cache_lock:
+        _accept_languages_cache[header] = locale
+        while len(_accept_languages_cache) > ACCEPT_LANGUAGES_CACHE_SIZE:
+            _accept_languages_cache.popitem(last=False)
+    return locale
+
+
+def get_locale(config):
+    """
+    Get the locale as follows, by order of precedence:
+    - l request argument or session['locale']
+    - browser suggested locale, from the Accept-Languages header
+    - config.DEFAULT_LOCALE
+    - 'en_US'
+    """
+    locale = None
+    accept_languages = request.headers.get('Accept-Language', '')
     if 'l' in request.args:
         if len(request.args['l']) == 0:
             if 'locale' in session:
                 del session['locale']
-            locale = core.negotiate_locale(accept_languages, LOCALES)
+            locale = negotiate_accept_languages(accept_languages)
         else:
             locale = core.negotiate_locale([request.args['l']], LOCALES)
             session['locale'] = locale
@@ -101,7 +206,7 @@ def get_locale(config):
         if 'locale' in session:
             locale = session['locale']
         else:
-            locale = core.negotiate_locale(accept_languages, LOCALES)
+            locale = negotiate_accept_languages(accept_languages)
 
     if locale:
         return locale
@@ -109,7 +214,26 @@ def get_locale(config):
         return getattr(config, 'DEFAULT_LOCALE', 'en_US')
 
 
+def set_locale(config):
+    """Negotiate the locale of the current request, and store it along with
+    its metadata in `g` and its translations for Flask-Babel.
+    """
+    g.locale = get_locale(config)
+    g.text_direction = get_text_direction(g.locale)
+    g.html_lang = RFC_5646_TAGS.get(g.locale) or \
+        locale_to_rfc_5646(g.locale)
+    g.locales = get_locale2name()
+
+    # Spare Flask-Babel from selecting the locale again and loading its
+    # catalog from disk
+    if g.locale in BABEL_LOCALES:
+        request.babel_locale = BABEL_LOCALES[g.locale]
+        request.babel_translations = get_translations(g.locale)
+
+
 def get_text_direction(locale):
+    if locale in TEXT_DIRECTIONS:
+        return TEXT_DIRECTIONS[locale]
     return core.Locale.parse(locale).text_direction
 
 
@@ -144,14 +268,7 @@ NAME_OVERRIDES = {
 
 
 def get_locale2name():
-    locale2name = collections.OrderedDict()
-    for l in LOCALES:
-        if l in NAME_OVERRIDES:
-            locale2name[l] = NAME_OVERRIDES[l]
-        else:
-            locale = core.Locale.parse(l)
-            locale2name[l] = locale.languages[locale.language]
-    return locale2name
+    return LOCALE2NAME
 
 
 def locale_to_rfc_5646(locale):
@@ -10,16 +10,18 @@ from os import path
 from werkzeug.exceptions import default_exceptions  # type: ignore
 
 import i18n
+import template_cache
 import template_filters
 import version
 import platform
 
 from crypto_util import CryptoUtil
-from db import db
+from db import (db, configure_engine, get_database_uri,
+                instrument_lock_waits)
 from journalist_app import account, admin, api, main, col
+from journalist_app.cache import JournalistCache
 from journalist_app.utils import (get_source, logged_in,
                                   JournalistInterfaceSessionInterface)
-from models import Journalist
 from store import Storage
 
 import typing
@@ -47,30 +49,25 @@ def create_app(config):
     csrf = CSRFProtect(app)
     Environment(app)
 
-    if config.DATABASE_ENGINE == "sqlite":
-        db_uri = (config.DATABASE_ENGINE + ":///" +
-                  config.DATABASE_FILE)
-    else:
-        db_uri = (
-            config.DATABASE_ENGINE + '://' +
-            config.DATABASE_USERNAME + ':' +
-            config.DATABASE_PASSWORD + '@' +
-            config.DATABASE_HOST + '/' +
-            config.DATABASE_NAME
-        )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri(config)
     db.init_app(app)
+    configure_engine(db.get_engine(app))
+    instrument_lock_waits(app)
 
     # Magic values for Xenial upgrade message
     app.config.update(
         XENIAL_WARNING_DATE=datetime.strptime('Mar 4 2019', '%b %d %Y'),
         XENIAL_VER='16.04'
     )
+    # This is slow, and can't change while the app is running
+    distribution_version = platform.linux_distribution()[1]
 
     app.storage = Storage(config.STORE_DIR,
                           config.TEMP_DIR,
-                          config.JOURNALIST_KEY)
+                          config.JOURNALIST_KEY,
+                          getattr(config, 'STORE_LAYOUT', 'flat'),
+                          getattr(config, 'STORE_PACK_MESSAGES', False))
 
     app.crypto_util = CryptoUtil(
         scrypt_params=config.SCRYPT_PARAMS,
@@ -83,6 +80,8 @@ def create_app(config):
         gpg_key_dir=config.GPG_KEY_DIR,
     )
 
+    app.journalist_cache = JournalistCache()
+
     @app.errorhandler(CSRFError)
     def handle_csrf_error(e):
         # render the message first to ensure it's localized.
@@ -107,6 +106,7 @@ def create_app(config):
 
     app.jinja_env.trim_blocks = True
     app.jinja_env.lstrip_blocks = True
+    template_cache.setup_app(app, config)
     app.jinja_env.globals['version'] = version.__version__
     if hasattr(config, 'CUSTOM_HEADER_IMAGE'):
         app.jinja_env.globals['header_image'] = \
@@ -135,14 +135,11 @@ def create_app(config):
 
         uid = session.get('uid', None)
         if uid:
-            g.user = Journalist.query.get(uid)
+            g.user = app.journalist_cache.get(uid)
 
-        g.locale = i18n.get_locale(config)
-        g.text_direction = i18n.get_text_direction(g.locale)
-        g.html_lang = i18n.locale_to_rfc_5646(g.locale)
-        g.locales = i18n.get_locale2name()
+        i18n.set_locale(config)
 
-        if (platform.linux_distribution()[1] != app.config['XENIAL_VER'] and
+        if (distribution_version != app.config['XENIAL_VER'] and
                 datetime.now() >= app.config['XENIAL_WARNING_DATE']):
             g.show_xenial_warning = True
 
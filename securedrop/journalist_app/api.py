@@ -1,7 +1,7 @@
 import json
 
 from datetime import datetime, timedelta
-from flask import abort, Blueprint, current_app, jsonify, request
+from flask import abort, Blueprint, current_app, g, jsonify, request
 from functools import wraps
 from sqlalchemy.exc import IntegrityError
 from os import path
@@ -13,7 +13,7 @@ from journalist_app import utils
 from models import (Journalist, Reply, Source, Submission,
                     LoginThrottledException, InvalidUsernameException,
                     BadTokenException, WrongPasswordException)
-from store import NotEncrypted
+from store import NotEncrypted, check_encrypted, stored_filename
 
 
 TOKEN_EXPIRATION_MINS = 60 * 8
@@ -21,11 +21,9 @@ TOKEN_EXPIRATION_MINS = 60 * 8
 
 def get_user_object(request):
     """Helper function to use in token_required views that need a user
-    object
+    object. The user was already looked up by `token_required`.
     """
-    auth_token = request.headers.get('Authorization').split(" ")[1]
-    user = Journalist.validate_api_token_and_get_user(auth_token)
-    return user
+    return g.user
 
 
 def token_required(f):
@@ -43,8 +41,10 @@ def token_required(f):
             auth_token = split[1]
         else:
             auth_token = ''
-        if not Journalist.validate_api_token_and_get_user(auth_token):
+        user = Journalist.validate_api_token_and_get_user(auth_token)
+        if not user:
             return abort(403, 'API token is invalid or expired.')
+        g.user = user
         return f(*args, **kwargs)
     return decorated_function
 
@@ -182,7 +182,7 @@ def make_blueprint(config):
         submission.downloaded = True
         db.session.commit()
 
-        return utils.serve_file_with_etag(source, submission.filename)
+        return utils.serve_file_with_etag(source, submission)
 
     @api.route('/sources/<source_uuid>/replies/<reply_uuid>/download',
                methods=['GET'])
@@ -191,7 +191,7 @@ def make_blueprint(config):
         source = get_or_404(Source, source_uuid, column=Source.uuid)
         reply = get_or_404(Reply, reply_uuid, column=Reply.uuid)
 
-        return utils.serve_file_with_etag(source, reply.filename)
+        return utils.serve_file_with_etag(source, reply)
 
     @api.route('/sources/<source_uuid>/submissions/<submission_uuid>',
                methods=['GET', 'DELETE'])
@@ -233,13 +233,16 @@ def make_blueprint(config):
             if not data['reply']:
                 abort(400, 'reply should not be empty')
 
-            source.interaction_count += 1
+            index = source.reserve_interaction_indexes()[0]
             try:
-                filename = current_app.storage.save_pre_encrypted_reply(
-                    source.filesystem_id,
-                    source.interaction_count,
-                    source.journalist_filename,
-                    data['reply'])
+                if current_app.storage.pack_messages:
+                    check_encrypted(data['reply'])
+                    filename = stored_filename(index, 'reply')
+                else:
+                    filename = current_app.storage.save_pre_encrypted_reply(
+                        source.filesystem_id,
+                        index,
+                        data['reply'])
             except NotEncrypted:
                 return jsonify(
                     {'message': 'You must encrypt replies client side'}), 400
@@ -247,8 +250,6 @@ def make_blueprint(config):
             # issue #3918
             filename = path.basename(filename)
 
-            reply = Reply(user, source, filename)
-
             reply_uuid = data.get('uuid', None)
             if reply_uuid is not None:
                 # check that is is parseable
@@ -256,22 +257,34 @@ def make_blueprint(config):
                     UUID(reply_uuid)
                 except ValueError:
                     abort(400, "'uuid' was not a valid UUID")
-                reply.uuid = reply_uuid
 
-            try:
-                db.session.add(reply)
-                db.session.add(source)
-                db.session.commit()
-            except IntegrityError as e:
-                db.session.rollback()
-                if 'UNIQUE constraint failed: replies.uuid' in str(e):
-                    abort(409, 'That UUID is already in use.')
+            # What is appended to a pack file has to be committed under its
+            # lock
+            with current_app.storage.pack_lock(source.filesystem_id):
+                if current_app.storage.pack_messages:
+                    location = current_app.storage.append_to_pack(
+                        source.filesystem_id, data['reply'].encode('utf-8'))
+                    reply = Reply(user, source, filename,
+                                  pack_location=location)
                 else:
-                    raise e
+                    reply = Reply(user, source, filename)
+                if reply_uuid is not None:
+                    reply.uuid = reply_uuid
+
+                try:
+                    db.session.add(reply)
+                    db.session.add(source)
+                    db.session.commit()
+                except IntegrityError as e:
+                    db.session.rollback()
+                    if 'UNIQUE constraint failed: replies.uuid' in str(e):
+                        abort(409, 'That UUID is already in use.')
+                    else:
+                        raise e
 
             return jsonify({'message': 'Your reply has been stored',
                             'uuid': reply.uuid,
-                            'filename': reply.filename}), 201
+                            'filename': reply.download_filename}), 201
 
     @api.route('/sources/<source_uuid>/replies/<reply_uuid>',
                methods=['GET', 'DELETE'])
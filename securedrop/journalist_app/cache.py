@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import time
+import weakref
+
+from itertools import chain
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from db import db
+from models import Journalist
+
+
+class JournalistCache(object):
+    """Per-process cache of journalists, so that authenticated requests do
+    not have to look up the logged in journalist every time.
+
+    Any change to a journalist made in this process (password, two-factor
+    secret, admin status, deletion...) invalidates their entry right away.
+    Entries also expire after `ttl` seconds, which bounds how long changes
+    made by other processes can go unnoticed.
+    """
+
+    _caches = weakref.WeakSet()  # type: weakref.WeakSet
+
+    def __init__(self, ttl=5):
+        # type: (int) -> None
+        self.ttl = ttl
+        self._entries = {}  # type: dict
+        JournalistCache._caches.add(self)
+
+    def get(self, journalist_id):
+        """Return the journalist with the given ID, attached to the current
+        database session, or None if there is no such journalist.
+        """
+        entry = self._entries.get(journalist_id)
+        if entry is not None:
+            expires, values = entry
+            if time.time() < expires:
+                return db.session.merge(self._restore(values), load=False)
+
+        journalist = Journalist.query.get(journalist_id)
+        if journalist is None:
+            self._entries.pop(journalist_id, None)
+        else:
+            self._entries[journalist_id] = (time.time() + self.ttl,
+                                            self._snapshot(journalist))
+        return journalist
+
+    def invalidate(self, journalist_id):
+        self._entries.pop(journalist_id, None)
+
+    @staticmethod
+    def _snapshot(journalist):
+        return {attr.key: getattr(journalist, attr.key)
+                for attr in inspect(Journalist).column_attrs}
+
+    @staticmethod
+    def _restore(values):
+        # Bypass Journalist.__init__, which would hash a new password
+        journalist = inspect(Journalist).class_manager.new_instance()
+        for key, value in values.items():
+            setattr(journalist, key, value)
+        make_transient_to_detached(journalist)
+        return journalist
+
+
+def _invalidate_all(journalist_ids):
+    for cache in list(JournalistCache._caches):
+        for journalist_id in journalist_ids:
+            cache.invalidate(journalist_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_flushed_journalists(session, flush_context):
+    journalist_ids = set(obj.id
+                         for obj in chain(session.dirty, session.deleted)
+                         if isinstance(obj, Journalist))
+    _invalidate_all(journalist_ids)
+    # Invalidate them again on commit, in case another request cached the
+    # old values in between
+    session.info.setdefault('changed_journalists', set()) \
+                .update(journalist_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_journalists(session):
+    _invalidate_all(session.info.pop('changed_journalists', ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_journalists(session):
+    session.info.pop('changed_journalists', None)
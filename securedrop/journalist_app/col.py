@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 
+from io import BytesIO
+
 from flask import (Blueprint, redirect, url_for, render_template, flash,
                    request, abort, send_file, current_app)
 from flask_babel import gettext
 from sqlalchemy.orm.exc import NoResultFound
 
 from db import db
-from models import Submission
+from models import Reply, Source, Submission
 from journalist_app.forms import ReplyForm
 from journalist_app.utils import (make_star_true, make_star_false, get_source,
                                   delete_collection, col_download_unread,
@@ -75,15 +77,38 @@ def make_blueprint(config):
 
         # only mark as read when it's a submission (and not a journalist reply)
         if not fn.endswith('reply.gpg'):
+            # Files are named after their index, which is only unique
+            # among those of their source
             try:
-                Submission.query.filter(
-                    Submission.filename == fn).one().downloaded = True
+                item = Submission.query.join(Submission.source) \
+                    .filter(Source.filesystem_id == filesystem_id,
+                            Submission.filename == fn) \
+                    .one()
+                item.downloaded = True
                 db.session.commit()
             except NoResultFound as e:
+                item = None
                 current_app.logger.error(
                     "Could not mark " + fn + " as downloaded: %s" % (e,))
-
-        return send_file(current_app.storage.path(filesystem_id, fn),
-                         mimetype="application/pgp-encrypted")
+        else:
+            item = Reply.query.join(Reply.source) \
+                .filter(Source.filesystem_id == filesystem_id,
+                        Reply.filename == fn) \
+                .first()
+
+        if item is None:
+            # The filename comes from the URL only
+            path = current_app.storage.path(filesystem_id, fn)
+            current_app.storage.verify(path)
+            return send_file(path, mimetype="application/pgp-encrypted")
+        if item.pack_location is not None:
+            content = BytesIO(current_app.storage.read_packed_item(
+                filesystem_id, item)[0])
+        else:
+            content = current_app.storage.path(filesystem_id, fn)
+        return send_file(content,
+                         mimetype="application/pgp-encrypted",
+                         as_attachment=True,
+                         attachment_filename=item.download_filename)
 
     return view
@@ -10,6 +10,7 @@ from sqlalchemy.sql.expression import false
 
 from db import db
 from models import Source, SourceStar, Submission, Reply
+from store import stored_filename
 from journalist_app.forms import ReplyForm
 from journalist_app.utils import (validate_user, bulk_delete, download,
                                   confirm_bulk_delete, get_source)
@@ -100,20 +101,31 @@ def make_blueprint(config):
                 flash(error, "error")
             return redirect(url_for('col.col', filesystem_id=g.filesystem_id))
 
-        g.source.interaction_count += 1
-        filename = "{0}-{1}-reply.gpg".format(g.source.interaction_count,
-                                              g.source.journalist_filename)
-        current_app.crypto_util.encrypt(
-            form.message.data,
-            [current_app.crypto_util.getkey(g.filesystem_id),
-             config.JOURNALIST_KEY],
-            output=current_app.storage.path(g.filesystem_id, filename),
-        )
-        reply = Reply(g.user, g.source, filename)
-
         try:
-            db.session.add(reply)
-            db.session.commit()
+            index = g.source.reserve_interaction_indexes()[0]
+            filename = stored_filename(index, 'reply')
+            fingerprints = [current_app.crypto_util.getkey(g.filesystem_id),
+                            config.JOURNALIST_KEY]
+            if current_app.storage.pack_messages:
+                ciphertext = current_app.crypto_util.encrypt(
+                    form.message.data, fingerprints)
+                with current_app.storage.pack_lock(g.filesystem_id):
+                    location = current_app.storage.append_to_pack(
+                        g.filesystem_id, ciphertext)
+                    reply = Reply(g.user, g.source, filename,
+                                  pack_location=location)
+                    db.session.add(reply)
+                    db.session.commit()
+            else:
+                current_app.crypto_util.encrypt(
+                    form.message.data,
+                    fingerprints,
+                    output=current_app.storage.path(g.filesystem_id,
+                                                    filename),
+                )
+                reply = Reply(g.user, g.source, filename)
+                db.session.add(reply)
+                db.session.commit()
         except Exception as exc:
             flash(gettext(
                 "An unexpected error occurred! Please "
@@ -168,12 +180,8 @@ def make_blueprint(config):
     def regenerate_code():
         original_journalist_designation = g.source.journalist_designation
         g.source.journalist_designation = current_app.crypto_util.display_id()
-
-        for item in g.source.collection:
-            item.filename = current_app.storage.rename_submission(
-                g.filesystem_id,
-                item.filename,
-                g.source.journalist_filename)
+        # Files are stored under names without the designation: only
+        # downloads are named after the new one
         db.session.commit()
 
         flash(gettext(
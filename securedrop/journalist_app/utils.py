@@ -5,9 +5,11 @@ from flask import (g, flash, current_app, abort, send_file, redirect, url_for,
                    render_template, Markup, sessions, request)
 from flask_babel import gettext, ngettext
 import hashlib
+from io import BytesIO
 from sqlalchemy.sql.expression import false
 
 import i18n
+import maintenance
 import worker
 
 from db import db
@@ -171,16 +173,34 @@ def download(zip_basename, submissions):
                      as_attachment=True)
 
 
-def delete_file(filesystem_id, filename, file_object):
-    file_path = current_app.storage.path(filesystem_id, filename)
-    worker.enqueue(srm, file_path)
+def delete_file(filesystem_id, filename, file_object, compact=True):
+    """Delete a submission or reply, and return whether it was in a pack
+    file. The pack files are compacted to remove it, unless `compact` is
+    False for callers deleting several items of the source, which compact
+    them once after."""
+    packed = file_object.pack_location is not None
+    if not packed:
+        file_path = current_app.storage.path(filesystem_id, filename)
+        worker.enqueue(srm, file_path)
     db.session.delete(file_object)
     db.session.commit()
+    if packed and compact:
+        compact_packs(filesystem_id)
+    return packed
+
+
+def compact_packs(filesystem_id):
+    # Removes what was deleted from the pack files, and securely deletes them
+    return worker.enqueue(maintenance.compact_pack, filesystem_id)
 
 
 def bulk_delete(filesystem_id, items_selected):
+    packed = False
     for item in items_selected:
-        delete_file(filesystem_id, item.filename, item)
+        if delete_file(filesystem_id, item.filename, item, compact=False):
+            packed = True
+    if packed:
+        compact_packs(filesystem_id)
 
     flash(ngettext("Submission deleted.",
                    "{num} submissions deleted.".format(
@@ -326,11 +346,19 @@ def col_download_all(cols_selected):
     return download("all", submissions)
 
 
-def serve_file_with_etag(source, filename):
-    response = send_file(current_app.storage.path(source.filesystem_id,
-                                                  filename),
+def serve_file_with_etag(source, item):
+    if item.pack_location is None:
+        content = current_app.storage.path(source.filesystem_id,
+                                           item.filename)
+    else:
+        content = BytesIO(current_app.storage.read_packed_item(
+            source.filesystem_id, item)[0])
+    # Files are not stored under the name of the designation of their
+    # source, which can change: it is only given when they are downloaded
+    response = send_file(content,
                          mimetype="application/pgp-encrypted",
                          as_attachment=True,
+                         attachment_filename=item.download_filename,
                          add_etags=False)  # Disable Flask default ETag
 
     response.direct_passthrough = False
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+import datetime
+import logging
+import os
+import time
+
+from flask import current_app
+
+import management
+
+from db import db
+from models import Journalist, Source
+from store import pack_filename
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Any, Dict, Iterator, List  # noqa: F401
+    from crypto_util import CryptoUtil  # noqa: F401
+    from sdconfig import SDConfig  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+# Each step holds the write lock, so keep them short, and leave a gap
+# between them for the web applications to write
+VACUUM_STEP_PAGES = 256
+STEP_PAUSE = 0.1
+
+
+def get_fragmentation(cursor):
+    # type: (Any) -> Dict[str, Any]
+    """Return the size of the database, in pages, and how many of them are
+    free: those are what an incremental vacuum gives back to the
+    filesystem."""
+    page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+    freelist_count = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+    return dict(
+        page_count=page_count,
+        freelist_count=freelist_count,
+        page_size=cursor.execute('PRAGMA page_size').fetchone()[0],
+        auto_vacuum=AUTO_VACUUM_MODES.get(
+            cursor.execute('PRAGMA auto_vacuum').fetchone()[0]),
+        fragmentation=(float(freelist_count) / page_count
+                       if page_count else 0.0),
+    )
+
+
+def is_quiet(minutes):
+    # type: (int) -> bool
+    """Whether neither sources nor journalists were active in the last
+    `minutes` minutes."""
+    since = datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes)
+    return (Source.query.filter(Source.last_updated > since).count() == 0 and
+            Journalist.query.filter(Journalist.last_access > since)
+                            .count() == 0)
+
+
+def _incremental_vacuum(cursor, deadline):
+    freed = 0
+    while time.time() < deadline:
+        before = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        if before == 0:
+            break
+        # The pragma frees one page each time it is stepped, so all of its
+        # results have to be fetched
+        cursor.execute('PRAGMA incremental_vacuum({})'.format(
+            VACUUM_STEP_PAGES)).fetchall()
+        freed += before - cursor.execute(
+            'PRAGMA freelist_count').fetchone()[0]
+        time.sleep(STEP_PAUSE)
+    return freed
+
+
+def _analyze(cursor, deadline):
+    tables = [row[0] for row in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%'").fetchall()]
+    analyzed = 0
+    for table in tables:
+        if time.time() >= deadline:
+            break
+        cursor.execute('ANALYZE "{}"'.format(table))
+        analyzed += 1
+        time.sleep(STEP_PAUSE)
+    # Only does something with SQLite 3.18 or later
+    cursor.execute('PRAGMA optimize')
+    return analyzed
+
+
+def maintain_database(max_duration=60, quiet_minutes=10, config=None):
+    # type: (int, int, SDConfig) -> Dict[str, Any]
+    """Reclaim the free pages of the database and update the statistics
+    of the query planner, in steps, for at most about `max_duration`
+    seconds. Nothing is done unless the interfaces have been idle for
+    `quiet_minutes` minutes.
+
+    This runs as a job in the worker, which runs as the same user as the
+    web applications: SQLite files it creates are usable by them.
+    """
+    if config is None:
+        from sdconfig import config
+
+    start = time.time()
+    with management.app_context(config):
+        if db.engine.dialect.name != 'sqlite':
+            return dict(skipped='not using SQLite')
+        if not is_quiet(quiet_minutes):
+            log.info('Database maintenance skipped: the interfaces were '
+                     'used in the last {} minutes'.format(quiet_minutes))
+            return dict(skipped='not quiet')
+        # Release the read transaction of the queries above
+        db.session.remove()
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            report = dict(before=get_fragmentation(cursor))
+            deadline = start + max_duration
+
+            phase_start = time.time()
+            if report['before']['auto_vacuum'] == 'incremental':
+                report['pages_freed'] = _incremental_vacuum(cursor, deadline)
+            else:
+                report['pages_freed'] = 0
+            report['vacuum_time'] = time.time() - phase_start
+
+            phase_start = time.time()
+            report['tables_analyzed'] = _analyze(cursor, deadline)
+            report['analyze_time'] = time.time() - phase_start
+
+            report['after'] = get_fragmentation(cursor)
+        finally:
+            connection.close()
+
+    report['time'] = time.time() - start
+    log.info('Database maintenance: {} pages freed in {:.1f}s, '
+             'fragmentation {:.1%} -> {:.1%}, {} tables analyzed in '
+             '{:.1f}s'.format(report['pages_freed'], report['vacuum_time'],
+                              report['before']['fragmentation'],
+                              report['after']['fragmentation'],
+                              report['tables_analyzed'],
+                              report['analyze_time']))
+    return report
+
+
+def _pending_sources(batch_size):
+    # type: (int) -> Iterator[List[Source]]
+    """Yield the pending sources in batches of `batch_size`, by id, so the
+    sources deleted from a batch do not shift the next one."""
+    last_id = 0
+    while True:
+        batch = Source.query.filter(Source.pending == True,  # noqa: E712
+                                    Source.id > last_id) \
+                            .order_by(Source.id) \
+                            .limit(batch_size) \
+                            .all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+
+def _is_abandoned(source, cutoff):
+    # type: (Source, float) -> bool
+    """Return whether the store directory of a pending source was created
+    before `cutoff`. Sources do not get a creation date in the database:
+    their directory stays empty, and keeps the time it was created, until
+    they submit something."""
+    if source.filesystem_id is None:
+        return False
+    try:
+        directory = current_app.storage.path(source.filesystem_id)
+        return os.stat(directory).st_mtime < cutoff
+    except OSError:
+        return False
+
+
+def _delete_abandoned(source):
+    # type: (Source) -> bool
+    """Delete a pending source if they have not started to submit anything,
+    and return whether they were. Submitting reserves an interaction index
+    before anything is written to their directory, so checking both in the
+    DELETE spares a source who submits after they were selected."""
+    return Source.query.filter(
+        Source.id == source.id,
+        Source.pending == True,  # noqa: E712
+        Source.interaction_count == 0
+    ).delete(synchronize_session=False) == 1
+
+
+def _reply_keys(crypto_util):
+    # type: (CryptoUtil) -> Dict[str, str]
+    """Map the filesystem ids of the sources with a reply keypair to its
+    fingerprint, which is cheaper than CryptoUtil.getkey listing the
+    keyring for each of them."""
+    keys = {}
+    for key in crypto_util.gpg.list_keys():
+        for uid in key['uids']:
+            if '<' in uid and uid.endswith('>'):
+                keys[uid[uid.index('<') + 1:-1]] = key['fingerprint']
+    return keys
+
+
+def purge_pending_sources(max_age_days=30, batch_size=100, config=None):
+    # type: (int, int, SDConfig) -> Dict[str, Any]
+    """Delete the sources who generated a codename at least `max_age_days`
+    days ago and never submitted anything, with their empty store
+    directory and any reply keypair, `batch_size` sources at a time.
+    """
+    if config is None:
+        from sdconfig import config
+
+    start = time.time()
+    cutoff = start - max_age_days * 24 * 60 * 60
+    report = dict(examined=0, purged=0, reply_keys_deleted=0)
+    purged_ids = []
+    with management.app_context(config):
+        for batch in _pending_sources(batch_size):
+            report['examined'] += len(batch)
+            deleted = [source.filesystem_id for source in batch
+                       if _is_abandoned(source, cutoff) and
+                       _delete_abandoned(source)]
+            if not deleted:
+                continue
+            db.session.commit()
+            report['purged'] += len(deleted)
+            purged_ids.extend(deleted)
+            # Only the directories of the sources deleted above, which can
+            # no longer submit anything
+            for filesystem_id in deleted:
+                directory = current_app.storage.path(filesystem_id)
+                try:
+                    os.rmdir(directory)
+                except OSError as e:
+                    log.warning('Could not remove {}: {}'.format(directory, e))
+
+        # Pending sources only get a reply keypair if they were created by
+        # an older version: the keyring is listed once for all of them
+        if purged_ids:
+            crypto_util = current_app.crypto_util
+            keys = _reply_keys(crypto_util)
+            for filesystem_id in purged_ids:
+                fingerprint = keys.get(filesystem_id)
+                if fingerprint is None:
+                    continue
+                # The private key needs to be deleted before the public key
+                crypto_util.gpg.delete_keys(fingerprint, True)
+                crypto_util.gpg.delete_keys(fingerprint)
+                report['reply_keys_deleted'] += 1
+
+    report['time'] = time.time() - start
+    log.info('{purged} abandoned pending sources of {examined} purged, '
+             '{reply_keys_deleted} reply keypairs deleted, in '
+             '{time:.1f}s'.format(**report))
+    return report
+
+
+def compact_pack(filesystem_id, config=None):
+    # type: (str, SDConfig) -> Dict[str, Any]
+    """Copy the messages and replies of a source still in the database to a
+    new pack file, then securely delete the previous pack files, and with
+    them what was deleted from the database.
+    """
+    if config is None:
+        from sdconfig import config
+
+    start = time.time()
+    with management.app_context(config):
+        storage = current_app.storage
+        source = Source.query.filter(
+            Source.filesystem_id == filesystem_id).one_or_none()
+        # delete_collection removed the whole directory
+        if source is None:
+            return dict(skipped='source deleted')
+
+        with storage.pack_lock(filesystem_id):
+            previous = storage.pack_generations(filesystem_id)
+            items = sorted(
+                [item for item in source.submissions + source.replies
+                 if item.pack_location is not None],
+                key=lambda item: item.pack_location)
+            size = sum(item.size for item in items)
+            previous_size = sum(
+                os.path.getsize(storage.path(filesystem_id,
+                                             pack_filename(generation)))
+                for generation in previous)
+            if len(previous) <= 1 and size == previous_size:
+                return dict(skipped='nothing to compact')
+
+            locations = storage.write_pack(
+                filesystem_id, [item.pack_location for item in items])
+            for item, location in zip(items, locations):
+                item.pack_generation = location.generation
+                item.pack_offset = location.offset
+            db.session.commit()
+
+        # Requests that loaded locations in them before the commit either
+        # finish reading first, or find them deleted and load the new ones
+        for generation in previous:
+            storage.remove_pack(filesystem_id, generation)
+
+    report = dict(items=len(items), bytes_reclaimed=previous_size - size,
+                  time=time.time() - start)
+    log.info('Pack files of a source compacted: {items} messages and '
+             'replies kept, {bytes_reclaimed} bytes reclaimed, in '
+             '{time:.1f}s'.format(**report))
+    return report
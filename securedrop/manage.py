@@ -7,27 +7,37 @@ import datetime
 import logging
 import os
 import pwd
-import qrcode
 import subprocess
 import shutil
 import signal
+import stat
 import sys
 import time
 import traceback
 
 from contextlib import contextmanager
 from flask import current_app
-from sqlalchemy import create_engine
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.orm import sessionmaker
 
 os.environ['SECUREDROP_ENV'] = 'dev'  # noqa
 from sdconfig import config
-import journalist_app
+import management
+import secure_tempfile
 
 from db import db
-from models import Source, Journalist, PasswordError, InvalidUsernameException
+from models import (Source, Journalist, JournalistLoginAttempt, PasswordError,
+                    InvalidUsernameException)
 from management.run import run
+from management.startup_profile import INTERFACES, profile_startup
+
+# Find the best implementation available on this platform
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir  # type: ignore
+    except ImportError:
+        scandir = None
 
 logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
 log = logging.getLogger(__name__)
@@ -71,7 +81,7 @@ def reset(args):
         # 3. Create the DB from the metadata directly when in 'dev' so
         # developers can test application changes without first writing
         # alembic migration.
-        with journalist_app.create_app(config).app_context():
+        with management.app_context(config):
             db.create_all()
     else:
         # We have to override the hardcoded .ini file because during testing
@@ -190,6 +200,7 @@ def _add_user(is_admin=False):
                 print('\nScan the QR code below with FreeOTP:\n')
                 uri = user.totp.provisioning_uri(username,
                                                  issuer_name='SecureDrop')
+                import qrcode
                 qr = qrcode.QRCode()
                 qr.add_data(uri)
                 sys.stdout = codecs.getwriter("utf-8")(sys.stdout)
@@ -220,7 +231,7 @@ def _get_delete_confirmation(user):
 
 def delete_user(args):
     """Deletes a journalist or admin from the application."""
-    with app_context():
+    with management.app_context(config):
         username = _get_username_to_delete()
         try:
             selected_user = Journalist.query.filter_by(username=username).one()
@@ -253,24 +264,106 @@ def delete_user(args):
 
 
 def clean_tmp(args):
-    """Cleanup the SecureDrop temp directory. """
-    if not os.path.exists(args.directory):
-        log.debug('{} does not exist, do nothing'.format(args.directory))
-        return 0
+    """Cleanup the SecureDrop temp directory, and the encrypted spools of
+    uploads that were abandoned in the system temp directory. Files that
+    a process has open are left alone."""
+    in_use = _open_files()
+    reclaimed = _remove_stale_files(args.directory,
+                                    args.days * 24 * 60 * 60,
+                                    '{} days'.format(args.days),
+                                    args.min_size, in_use)
+    reclaimed += _remove_stale_files(args.spool_directory,
+                                     args.spool_hours * 60 * 60,
+                                     '{} hours'.format(args.spool_hours),
+                                     args.min_size, in_use,
+                                     match=secure_tempfile.FILENAME.match)
+    log.info('{} bytes reclaimed'.format(reclaimed))
+    return 0
 
-    def listdir_fullpath(d):
-        return [os.path.join(d, f) for f in os.listdir(d)]
 
-    too_old = args.days * 24 * 60 * 60
-    for path in listdir_fullpath(args.directory):
-        if time.time() - os.stat(path).st_mtime > too_old:
-            os.remove(path)
-            log.debug('{} removed'.format(path))
+def _remove_stale_files(directory, max_age, age, min_size, in_use,
+                        match=None):
+    """Remove the files in `directory` not modified in `max_age` seconds,
+    of at least `min_size` bytes, whose name is accepted by `match` if
+    given, and which are not `in_use`. Return how many bytes were freed.
+    """
+    if not os.path.exists(directory):
+        log.debug('{} does not exist, do nothing'.format(directory))
+        return 0
+
+    reclaimed = 0
+    now = time.time()
+    for path, info in _scan_files(directory):
+        if match is not None and not match(os.path.basename(path)):
+            continue
+        if now - info.st_mtime <= max_age:
+            log.debug('{} modified less than {} ago'.format(path, age))
+        elif info.st_size < min_size:
+            log.debug('{} smaller than {} bytes'.format(path, min_size))
+        elif os.path.realpath(path) in in_use:
+            log.debug('{} is in use'.format(path))
         else:
-            log.debug('{} modified less than {} days ago'.format(
-                path, args.days))
+            try:
+                os.remove(path)
+            except OSError as e:
+                log.warning('Could not remove {}: {}'.format(path, e))
+                continue
+            reclaimed += info.st_size
+            log.debug('{} removed'.format(path))
+    return reclaimed
 
-    return 0
+
+def _scan_files(directory):
+    """Yield the path and `os.lstat` result of each regular file in
+    `directory`. With scandir, the directory is read as the files are
+    yielded. Without it, all the names in the directory are listed first,
+    and each one is lstat()ed as it is yielded."""
+    if scandir is not None:
+        for entry in scandir(directory):
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat(follow_symlinks=False)
+            except OSError:
+                # Removed in the meantime
+                pass
+        return
+
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            info = os.lstat(path)
+        except OSError:
+            # Removed in the meantime
+            continue
+        if stat.S_ISREG(info.st_mode):
+            yield path, info
+
+
+def _open_files():
+    """Return the paths of the files open in the processes whose file
+    descriptors are visible to us, which is all of them when run as root.
+    """
+    paths = set()
+    try:
+        pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+    except OSError:
+        log.warning('/proc is not available, files in use cannot be '
+                    'detected')
+        return paths
+
+    for pid in pids:
+        fd_dir = os.path.join('/proc', pid, 'fd')
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            # The process exited, or is not ours
+            continue
+        for fd in fds:
+            try:
+                paths.add(os.readlink(os.path.join(fd_dir, fd)))
+            except OSError:
+                pass
+    return paths
 
 
 def init_db(args):
@@ -282,26 +375,126 @@ def init_db(args):
 
 
 def were_there_submissions_today(args):
-    if config.DATABASE_ENGINE == "sqlite":
-        db_uri = (config.DATABASE_ENGINE + ":///" +
-                  config.DATABASE_FILE)
-    else:
-        db_uri = (
-            config.DATABASE_ENGINE + '://' +
-            config.DATABASE_USERNAME + ':' +
-            config.DATABASE_PASSWORD + '@' +
-            config.DATABASE_HOST + '/' +
-            config.DATABASE_NAME
-        )
-    session = sessionmaker(bind=create_engine(db_uri))()
-    something = session.query(Source).filter(
-        Source.last_updated >
-        datetime.datetime.utcnow() - datetime.timedelta(hours=24)
-    ).count() > 0
+    with management.app_context(config):
+        something = Source.query.filter(
+            Source.last_updated >
+            datetime.datetime.utcnow() - datetime.timedelta(hours=24)
+        ).count() > 0
     count_file = os.path.join(args.data_root, 'submissions_today.txt')
     open(count_file, 'w').write(something and '1' or '0')
 
 
+def prune_login_attempts(args):
+    """Delete old login attempts. Logins are throttled in Redis, so these
+    are only recorded when it is unavailable."""
+    before = datetime.datetime.utcnow() - datetime.timedelta(days=args.days)
+    with management.app_context(config):
+        deleted = JournalistLoginAttempt.prune(before, args.batch_size)
+    log.info('{} login attempts older than {} days removed'.format(
+        deleted, args.days))
+    return 0
+
+
+def db_maintenance(args):
+    """Have the worker reclaim free space in the database and update its
+    statistics, if the interfaces are not in use."""
+    import maintenance
+    import worker
+    worker.enqueue(maintenance.maintain_database, args.max_duration,
+                   args.quiet_minutes)
+    log.info('Database maintenance scheduled')
+    return 0
+
+
+def purge_pending_sources(args):
+    """Have the worker delete the sources who never submitted anything
+    after generating their codename."""
+    import maintenance
+    import worker
+    worker.enqueue(maintenance.purge_pending_sources, args.days,
+                   args.batch_size)
+    log.info('Purge of the pending sources scheduled')
+    return 0
+
+
+def apply_retention_policy(args):
+    """Have the worker delete what the retention policy given on the
+    command line selects. A dry run is made right away, and reports what
+    would be deleted."""
+    import retention
+    policy = {}
+    if args.downloaded_submissions_days is not None:
+        policy[retention.DownloadedSubmissions.name] = \
+            args.downloaded_submissions_days
+    if args.inactive_sources_days is not None:
+        policy[retention.InactiveSources.name] = args.inactive_sources_days
+    if not policy:
+        log.error('No retention rule given, nothing to do')
+        return 1
+
+    if args.dry_run:
+        retention.apply_retention_policy(policy, dry_run=True,
+                                         batch_size=args.batch_size,
+                                         config=config)
+    else:
+        import worker
+        worker.enqueue(retention.apply_retention_policy, policy, False,
+                       args.batch_size)
+        log.info('Retention policy scheduled')
+    return 0
+
+
+def migrate_store(args):
+    """Move the directories of the sources to another layout of the
+    store, while the interfaces keep finding them. If interrupted, it
+    carries on from where it stopped when run again."""
+    from management import store_layout
+    store_layout.migrate(args.store_dir, args.layout, args.batch_size)
+    return 0
+
+
+def migrate_filenames(args):
+    """Rename the files of the store named after the designation of their
+    source, as older versions did. It can run while the interfaces are in
+    use, and carries on from where it stopped when run again."""
+    from management import store_filenames
+    with management.app_context(config):
+        store_filenames.migrate(args.batch_size)
+    return 0
+
+
+def unpack_messages(args):
+    """Give each message and reply in pack files a file of its own again,
+    which downgrading to a version without pack files requires."""
+    from management import unpack_messages
+    with management.app_context(config):
+        if current_app.storage.pack_messages:
+            log.error('STORE_PACK_MESSAGES must be disabled before unpacking '
+                      'messages and replies')
+            return 1
+        unpack_messages.unpack()
+    return 0
+
+
+def compile_templates(args):
+    """Compile the templates of both interfaces into the bytecode cache.
+    Their bytecode does not depend on the locale: translations are looked
+    up when the templates are rendered."""
+    import journalist_app
+    import source_app
+    import template_cache
+
+    for interface in (source_app, journalist_app):
+        app = interface.create_app(config)
+        if app.jinja_env.bytecode_cache is None:
+            log.error('The template cache is not available')
+            return 1
+        count = template_cache.precompile(app)
+        log.info('{} {} templates compiled'.format(
+            count, interface.__name__))
+    return 0
+
+
 def get_args():
     parser = argparse.ArgumentParser(prog=__file__, description='Management '
                                      'and testing utility for SecureDrop.')
@@ -347,6 +540,32 @@ def get_args():
 
     set_were_there_submissions_today(subps)
 
+    set_prune_login_attempts_parser(subps)
+
+    set_db_maintenance_parser(subps)
+
+    set_purge_pending_sources_parser(subps)
+
+    set_apply_retention_policy_parser(subps)
+
+    set_migrate_store_parser(subps)
+
+    set_migrate_filenames_parser(subps)
+
+    unpack_messages_subp = subps.add_parser(
+        'unpack-messages',
+        help=('Give each message and reply in pack files a file of its own '
+              'again, before downgrading to a version without them.'))
+    unpack_messages_subp.set_defaults(func=unpack_messages)
+
+    compile_templates_subp = subps.add_parser(
+        'compile-templates',
+        help='Precompile the templates of the source and journalist '
+             'interfaces.')
+    compile_templates_subp.set_defaults(func=compile_templates)
+
+    set_profile_startup_parser(subps)
+
     init_db_subp = subps.add_parser('init-db', help='initialize the DB')
     init_db_subp.add_argument('-u', '--user',
                               help='Unix user for the DB',
@@ -364,6 +583,163 @@ def set_were_there_submissions_today(subps):
     parser.set_defaults(func=were_there_submissions_today)
 
 
+def set_prune_login_attempts_parser(subps):
+    parser = subps.add_parser(
+        'prune-login-attempts',
+        help='Remove old journalist login attempts from the database.')
+    default_days = 1
+    parser.add_argument(
+        '--days',
+        default=default_days,
+        type=int,
+        help=('remove login attempts older than a given number of DAYS '
+              '(default {} days)'.format(default_days)))
+    default_batch_size = 1000
+    parser.add_argument(
+        '--batch-size',
+        default=default_batch_size,
+        type=int,
+        help=('number of login attempts to remove per transaction '
+              '(default {})'.format(default_batch_size)))
+    parser.set_defaults(func=prune_login_attempts)
+
+
+def set_db_maintenance_parser(subps):
+    parser = subps.add_parser(
+        'db-maintenance',
+        help=('Have the worker vacuum and analyze the database in steps, '
+              'if the interfaces are not in use.'))
+    default_max_duration = 60
+    parser.add_argument(
+        '--max-duration',
+        default=default_max_duration,
+        type=int,
+        help=('stop after about a given number of SECONDS '
+              '(default {} seconds)'.format(default_max_duration)))
+    default_quiet_minutes = 10
+    parser.add_argument(
+        '--quiet-minutes',
+        default=default_quiet_minutes,
+        type=int,
+        help=('only run if the interfaces were not used in a given number '
+              'of MINUTES (default {} minutes)'.format(
+                  default_quiet_minutes)))
+    parser.set_defaults(func=db_maintenance)
+
+
+def set_purge_pending_sources_parser(subps):
+    parser = subps.add_parser(
+        'purge-pending-sources',
+        help=('Have the worker delete the sources who generated a codename '
+              'but never submitted anything, with their directory and '
+              'reply keypair.'))
+    default_days = 30
+    parser.add_argument(
+        '--days',
+        default=default_days,
+        type=int,
+        help=('only delete the sources who generated their codename more '
+              'than a given number of DAYS ago: their database row, empty '
+              'store directory and any reply keypair are deleted '
+              '(default {} days)'.format(default_days)))
+    default_batch_size = 100
+    parser.add_argument(
+        '--batch-size',
+        default=default_batch_size,
+        type=int,
+        help=('delete the sources in batches of a given size '
+              '(default {})'.format(default_batch_size)))
+    parser.set_defaults(func=purge_pending_sources)
+
+
+def set_apply_retention_policy_parser(subps):
+    parser = subps.add_parser(
+        'apply-retention-policy',
+        help=('Have the worker delete the submissions and sources older '
+              'than the given retention periods.'))
+    parser.add_argument(
+        '--downloaded-submissions-days',
+        type=int,
+        help=('delete the downloaded submissions of the sources whose '
+              'latest submission was received more than a given number of '
+              'DAYS ago: submissions are not aged one by one, since their '
+              'files all get the time of the latest one'))
+    parser.add_argument(
+        '--inactive-sources-days',
+        type=int,
+        help=('delete the sources, with all their submissions and replies, '
+              'who did not submit anything in a given number of DAYS'))
+    default_batch_size = 100
+    parser.add_argument(
+        '--batch-size',
+        default=default_batch_size,
+        type=int,
+        help=('pause after deleting a given number of items '
+              '(default {})'.format(default_batch_size)))
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='only report what would be deleted')
+    parser.set_defaults(func=apply_retention_policy)
+
+
+def set_migrate_store_parser(subps):
+    parser = subps.add_parser(
+        'migrate-store',
+        help=('Move the directories of the sources to the layout of the '
+              'store set in the configuration.'))
+    default_layout = getattr(config, 'STORE_LAYOUT', 'flat')
+    parser.add_argument(
+        '--layout',
+        default=default_layout,
+        choices=('flat', 'sharded'),
+        help='layout to move to (default {})'.format(default_layout))
+    default_batch_size = 100
+    parser.add_argument(
+        '--batch-size',
+        default=default_batch_size,
+        type=int,
+        help=('report progress and pause after moving a given number of '
+              'directories (default {})'.format(default_batch_size)))
+    parser.set_defaults(func=migrate_store)
+
+
+def set_migrate_filenames_parser(subps):
+    parser = subps.add_parser(
+        'migrate-filenames',
+        help=('Rename the files of the store that are named after the '
+              'designation of their source.'))
+    default_batch_size = 100
+    parser.add_argument(
+        '--batch-size',
+        default=default_batch_size,
+        type=int,
+        help=('rename the files of a given number of submissions or '
+              'replies at a time (default {})'.format(default_batch_size)))
+    parser.set_defaults(func=migrate_filenames)
+
+
+def set_profile_startup_parser(subps):
+    parser = subps.add_parser(
+        'profile-startup',
+        help=('Report the time spent importing modules and initializing '
+              'the interfaces when they start.'))
+    default_top = 20
+    parser.add_argument(
+        '--top',
+        default=default_top,
+        type=int,
+        help=('number of modules and packages to report '
+              '(default {})'.format(default_top)))
+    parser.add_argument(
+        'interfaces',
+        nargs='*',
+        default=list(INTERFACES),
+        help=('interfaces to profile, among {} (default all of them)'
+              .format(', '.join(INTERFACES))))
+    parser.set_defaults(func=profile_startup)
+
+
 def set_clean_tmp_parser(subps, name):
     parser = subps.add_parser(name, help='Cleanup the '
                               'SecureDrop temp directory.')
@@ -379,6 +755,26 @@ def set_clean_tmp_parser(subps, name):
         default=config.TEMP_DIR,
         help=('remove old files from DIRECTORY '
               '(default {})'.format(config.TEMP_DIR)))
+    default_spool_hours = 24
+    parser.add_argument(
+        '--spool-hours',
+        default=default_spool_hours,
+        type=int,
+        help=('remove upload spools not modified in a given number of HOURS '
+              '(default {} hours)'.format(default_spool_hours)))
+    default_spool_directory = '/tmp'  # nosec
+    parser.add_argument(
+        '--spool-directory',
+        default=default_spool_directory,
+        help=('remove old upload spools from SPOOL_DIRECTORY '
+              '(default {})'.format(default_spool_directory)))
+    default_min_size = 0
+    parser.add_argument(
+        '--min-size',
+        default=default_min_size,
+        type=int,
+        help=('only remove files of at least MIN_SIZE bytes '
+              '(default {})'.format(default_min_size)))
     parser.set_defaults(func=clean_tmp)
 
 
@@ -391,6 +787,9 @@ def setup_verbosity(args):
 
 @contextmanager
 def app_context():
+    """The journalist interface's application context, for the commands
+    that need more than `management.app_context` provides."""
+    import journalist_app
     with journalist_app.create_app(config).app_context():
         yield
 
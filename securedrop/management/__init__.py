@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from flask import Flask
+
+from crypto_util import CryptoUtil
+from db import db, configure_engine, get_database_uri
+from store import Storage
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from sdconfig import SDConfig  # noqa: F401
+
+
+def create_app(config):
+    # type: (SDConfig) -> Flask
+    """Create an application with only the database, the storage and the
+    cryptographic utilities, for the management commands and background
+    jobs that do not need either of the web interfaces. It spares them
+    setting up sessions, CSRF protection, translations and assets. GPG is
+    only set up if it is used.
+    """
+    app = Flask(__name__)
+    app.sdconfig = config
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri(config)
+    db.init_app(app)
+    configure_engine(db.get_engine(app))
+
+    app.storage = Storage(config.STORE_DIR,
+                          config.TEMP_DIR,
+                          config.JOURNALIST_KEY,
+                          getattr(config, 'STORE_LAYOUT', 'flat'),
+                          getattr(config, 'STORE_PACK_MESSAGES', False))
+
+    app.crypto_util = CryptoUtil(
+        scrypt_params=config.SCRYPT_PARAMS,
+        scrypt_id_pepper=config.SCRYPT_ID_PEPPER,
+        scrypt_gpg_pepper=config.SCRYPT_GPG_PEPPER,
+        securedrop_root=config.SECUREDROP_ROOT,
+        word_list=config.WORD_LIST,
+        nouns_file=config.NOUNS,
+        adjectives_file=config.ADJECTIVES,
+        gpg_key_dir=config.GPG_KEY_DIR,
+    )
+    return app
+
+
+@contextmanager
+def app_context(config):
+    # type: (SDConfig) -> typing.Iterator[None]
+    with create_app(config).app_context():
+        yield
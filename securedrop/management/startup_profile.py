@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Measure where the time goes when one of the interfaces starts. This runs
+in a fresh interpreter (see `profile_startup`), since the modules imported
+by manage.py itself would otherwise not be imported again.
+"""
+import __builtin__
+import argparse
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import time
+
+__all__ = ['profile_startup']
+
+INTERFACES = ('source_app', 'journalist_app')
+
+
+class ImportTimer(object):
+    """Wraps `__import__` to record how long it takes to import each module
+    for the first time, excluding the time spent importing the modules it
+    imports itself."""
+
+    def __init__(self):
+        self.times = {}
+        self._children = []
+        self._import = __builtin__.__import__
+
+    def install(self):
+        __builtin__.__import__ = self._timed_import
+
+    def uninstall(self):
+        __builtin__.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=None,
+                      level=-1):
+        candidates = _absolute_names(name, globals, level)
+        if any(sys.modules.get(c) is not None for c in candidates):
+            return self._import(name, globals, locals, fromlist, level)
+
+        self._children.append(0.0)
+        start = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            children = self._children.pop()
+            imported = [c for c in candidates if sys.modules.get(c)]
+            if imported:
+                self.times[imported[0]] = self.times.get(imported[0], 0) + \
+                    elapsed - children
+            else:
+                # Failed, it only counts towards the module importing it
+                elapsed = children
+            if self._children:
+                self._children[-1] += elapsed
+
+    def by_package(self):
+        """Return the import times summed by top-level package."""
+        packages = {}
+        for name, elapsed in self.times.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + elapsed
+        return packages
+
+
+def _absolute_names(name, globals, level):
+    """Return the names `name` may refer to in sys.modules, when imported
+    from the module whose globals are `globals`."""
+    if level == 0 or not globals or '__name__' not in globals:
+        return [name]
+    package = globals.get('__package__')
+    if not package:
+        package = globals['__name__']
+        if '__path__' not in globals:
+            package = package.rpartition('.')[0]
+    if level > 0:
+        package = package.rsplit('.', level - 1)[0]
+        return ['.'.join(n for n in (package, name) if n)]
+    # Implicit relative import, which Python 2 tries first
+    if package:
+        return [package + '.' + name, name]
+    return [name]
+
+
+def _timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def _report(title, times, top):
+    print(title)
+    for label, elapsed in sorted(times, key=lambda t: t[1],
+                                 reverse=True)[:top]:
+        print('    {:<40} {:8.1f} ms'.format(label, elapsed * 1000))
+
+
+def _profile(interface, top):
+    timer = ImportTimer()
+    timer.install()
+    try:
+        start = time.time()
+        from sdconfig import config
+        module = importlib.import_module(interface)
+        import_time = time.time() - start
+    finally:
+        timer.uninstall()
+    import startup
+
+    start = time.time()
+    app = module.create_app(config)
+    init_times = [('create_app', time.time() - start)]
+    for label, step in startup.PRELOAD_STEPS:
+        init_times.append(('preload ' + label, _timed(step, app)))
+
+    print('{}: {:.1f} ms to import, {:.1f} ms to initialize'.format(
+        interface, import_time * 1000,
+        sum(t for _, t in init_times) * 1000))
+    _report('Import time by package (top {})'.format(top),
+            timer.by_package().items(), top)
+    _report('Import time by module (top {})'.format(top),
+            timer.times.items(), top)
+    _report('Initialization time', init_times, len(init_times))
+
+
+def profile_startup(args):
+    """Report how long it takes to import and initialize each interface,
+    each in a new process."""
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for interface in args.interfaces:
+        subprocess.check_call([sys.executable, '-m',
+                               'management.startup_profile',
+                               '--top', str(args.top), interface],
+                              cwd=here)
+    return 0
+
+
+def _main():  # pragma: no cover
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('interface', choices=INTERFACES)
+    args = parser.parse_args()
+    _profile(args.interface, args.top)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    _main()
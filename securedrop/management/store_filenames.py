@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import errno
+import logging
+import os
+import time
+
+from flask import current_app
+
+import store
+from db import db
+from models import Reply, Submission
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Any, Iterator, List  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+# Pause between batches of renames, for the interfaces to keep up
+BATCH_PAUSE = 0.1
+
+
+def _batches(model, batch_size):
+    # type: (Any, int) -> Iterator[List[Any]]
+    last_id = 0
+    while True:
+        batch = model.query.filter(model.id > last_id) \
+                           .order_by(model.id) \
+                           .limit(batch_size) \
+                           .all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+
+def _new_filename(filename):
+    # type: (str) -> str
+    match = store.VALIDATE_FILENAME(filename)
+    if not match:
+        return filename
+    return store.stored_filename(match.group('index'),
+                                 match.group('file_type'))
+
+
+def _link(item, new_filename):
+    # type: (Any, str) -> bool
+    """Give the file of `item` its new name as well, and return whether it
+    has it."""
+    filesystem_id = item.source.filesystem_id
+    try:
+        os.link(current_app.storage.path(filesystem_id, item.filename),
+                current_app.storage.path(filesystem_id, new_filename))
+    except OSError as e:
+        # Linked before an interruption
+        if e.errno == errno.EEXIST:
+            return True
+        log.error('{} of {} not renamed: {}'.format(
+            item.filename, filesystem_id, e))
+        return False
+    return True
+
+
+def migrate(batch_size=100):
+    # type: (int) -> int
+    """Rename the files of the store named after the designation of their
+    source, as older versions did, to names that do not change with it, and
+    return how many were renamed. Each file gets its new name as well before
+    the database is updated, and loses the old one after, so this can run
+    while the interfaces are in use. If interrupted, running it again
+    carries on with the files left to rename.
+    """
+    renamed = 0
+    for model in (Submission, Reply):
+        for batch in _batches(model, batch_size):
+            old_paths = []
+            for item in batch:
+                # The directory of the source was deleted
+                if item.source is None:
+                    continue
+                new_filename = _new_filename(item.filename)
+                if new_filename == item.filename:
+                    continue
+                # What is in a pack file is only named in the database
+                if item.pack_location is None:
+                    if not _link(item, new_filename):
+                        continue
+                    old_paths.append(current_app.storage.path(
+                        item.source.filesystem_id, item.filename))
+                item.filename = new_filename
+                renamed += 1
+            db.session.commit()
+
+            for path in old_paths:
+                os.unlink(path)
+            if old_paths:
+                log.info('{} files renamed'.format(renamed))
+                time.sleep(BATCH_PAUSE)
+
+    log.info('{} files renamed after their index and type'.format(renamed))
+    return renamed
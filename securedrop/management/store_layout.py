@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import errno
+import logging
+import os
+import time
+
+import store
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Iterator, Tuple  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+# Pause between batches of moves, for the interfaces to keep up
+BATCH_PAUSE = 0.1
+
+
+def _flat_directories(store_dir):
+    # type: (str) -> Iterator[Tuple[str, str]]
+    """Yield the filesystem id of the sources whose directory is where the
+    flat layout puts it, and its path relative to the store."""
+    for name in os.listdir(store_dir):
+        if (not store.IS_SHARD(name) and
+                os.path.isdir(os.path.join(store_dir, name))):
+            yield name, name
+
+
+def _sharded_directories(store_dir):
+    # type: (str) -> Iterator[Tuple[str, str]]
+    """Yield the filesystem id of the sources whose directory is where the
+    sharded layout puts it, and its path relative to the store."""
+    for first in os.listdir(store_dir):
+        if not store.IS_SHARD(first):
+            continue
+        for second in os.listdir(os.path.join(store_dir, first)):
+            if not store.IS_SHARD(second):
+                continue
+            for name in os.listdir(os.path.join(store_dir, first, second)):
+                yield name, os.path.join(first, second, name)
+
+
+def _make_shards(store_dir, filesystem_id):
+    # type: (str, str) -> None
+    first, second = store.shards(filesystem_id)
+    try:
+        os.makedirs(os.path.join(store_dir, first, second))
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        return
+    # The interfaces create the directories of new sources in them, so they
+    # belong to the owner of the store when this runs as root
+    owner = os.stat(store_dir)
+    if os.geteuid() == 0:
+        for directory in (os.path.join(store_dir, first),
+                          os.path.join(store_dir, first, second)):
+            os.chown(directory, owner.st_uid, owner.st_gid)
+
+
+def _remove_empty_shards(store_dir, relative_path):
+    # type: (str, str) -> None
+    first, second = relative_path.split(os.path.sep)[:2]
+    try:
+        os.rmdir(os.path.join(store_dir, first, second))
+        os.rmdir(os.path.join(store_dir, first))
+    except OSError:
+        # Other sources are still in there
+        pass
+
+
+def migrate(store_dir, layout, batch_size=100):
+    # type: (str, str, int) -> int
+    """Move the directories of the sources to where `layout` puts them, and
+    return how many were moved. Each of them is renamed in one step and
+    Storage.path finds them in either place, so this can run while the
+    interfaces are in use. If interrupted, running it again carries on
+    with the directories left to move.
+    """
+    if layout == store.SHARDED:
+        directories = list(_flat_directories(store_dir))
+    else:
+        directories = list(_sharded_directories(store_dir))
+
+    moved = 0
+    for count, (filesystem_id, current) in enumerate(directories, 1):
+        target = store.source_directory(filesystem_id, layout)
+        if os.path.exists(os.path.join(store_dir, target)):
+            log.error('{} is also in {}, leaving it alone'.format(
+                current, target))
+        else:
+            if layout == store.SHARDED:
+                _make_shards(store_dir, filesystem_id)
+            try:
+                os.rename(os.path.join(store_dir, current),
+                          os.path.join(store_dir, target))
+            except OSError as e:
+                # The source was deleted meanwhile
+                if e.errno != errno.ENOENT:
+                    raise
+            else:
+                moved += 1
+            if layout == store.FLAT:
+                _remove_empty_shards(store_dir, current)
+
+        if count % batch_size == 0:
+            log.info('{} of {} source directories moved'.format(
+                moved, len(directories)))
+            time.sleep(BATCH_PAUSE)
+
+    log.info('{} source directories moved to the {} layout'.format(
+        moved, layout))
+    return moved
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import io
+import logging
+
+from flask import current_app
+from sqlalchemy import or_
+
+from db import db
+from models import Reply, Source, Submission
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Iterator  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+
+def _packed_sources():
+    # type: () -> Iterator[Source]
+    last_id = 0
+    while True:
+        source = Source.query.filter(
+            Source.id > last_id,
+            or_(Source.submissions.any(Submission.pack_offset.isnot(None)),
+                Source.replies.any(Reply.pack_offset.isnot(None)))) \
+            .order_by(Source.id) \
+            .first()
+        if source is None:
+            return
+        last_id = source.id
+        yield source
+
+
+def unpack():
+    # type: () -> int
+    """Give each message and reply in the pack files of the store a file of
+    its own again, as older versions expect, and return how many were
+    unpacked. The pack files of a source are securely deleted once nothing
+    in them is referenced. New messages and replies must not be packed
+    while this runs: STORE_PACK_MESSAGES has to be disabled first.
+    """
+    storage = current_app.storage
+    unpacked = 0
+    for source in _packed_sources():
+        filesystem_id = source.filesystem_id
+        with storage.pack_lock(filesystem_id):
+            generations = storage.pack_generations(filesystem_id)
+            for item in source.submissions + source.replies:
+                location = item.pack_location
+                if location is None:
+                    continue
+                with io.open(storage.path(filesystem_id, item.filename),
+                             'wb') as fh:
+                    fh.write(storage.read_packed(filesystem_id, location))
+                item.pack_generation = None
+                item.pack_offset = None
+                unpacked += 1
+            db.session.commit()
+
+        # Like after a compaction, requests that loaded the previous
+        # locations find the file of each message and reply instead
+        for generation in generations:
+            storage.remove_pack(filesystem_id, generation)
+
+    log.info('{} messages and replies unpacked from pack files'.format(
+        unpacked))
+    return unpacked
@@ -2,12 +2,9 @@
 import binascii
 import datetime
 import base64
+import hmac
 import os
 import scrypt
-import pyotp
-import qrcode
-# Using svg because it doesn't require additional dependencies
-import qrcode.image.svg
 import uuid
 
 # Find the best implementation available on this platform
@@ -19,13 +16,17 @@ except ImportError:
 from flask import current_app, url_for
 from itsdangerous import TimedJSONWebSignatureSerializer, BadData
 from jinja2 import Markup
-from passlib.hash import argon2
-from sqlalchemy import ForeignKey
+from redis.exceptions import RedisError
+from sqlalchemy import ForeignKey, func
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Binary
+from sqlalchemy import (Column, Integer, String, Boolean, DateTime, Binary,
+                        Index)
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
 
+from bounded_executor import BoundedExecutor, ExecutorBusy
 from db import db
+from store import PackLocation, designation_filename
+from rate_limit import SlidingWindowCounter
 
 
 LOGIN_HARDENING = True
@@ -34,6 +35,33 @@ if os.environ.get('SECUREDROP_ENV') == 'test':
 
 ARGON2_PARAMS = dict(memory_cost=2**16, rounds=4, parallelism=2)
 
+# Each verification uses 64 MiB and two threads (see ARGON2_PARAMS), so only
+# let a few logins per process verify passwords at the same time
+ARGON2_VERIFICATIONS = BoundedExecutor('Argon2 verification',
+                                       workers=2, max_queued=8)
+
+# passlib, pyotp and qrcode are only needed to log in or set up two-factor
+# authentication, so they are imported on first use rather than by every
+# program that uses the models. See preload().
+
+
+def _argon2():
+    from passlib.hash import argon2
+    return argon2.using(**ARGON2_PARAMS)
+
+
+def _random_base32():
+    import pyotp
+    return pyotp.random_base32()
+
+
+def preload():
+    """Import the modules that are otherwise imported on first use, and
+    load the Argon2 backend."""
+    import pyotp  # noqa: F401
+    import qrcode.image.svg  # noqa: F401
+    _argon2().get_backend()
+
 
 def get_one_or_else(query, logger, failure_method):
     try:
@@ -50,6 +78,10 @@ def get_one_or_else(query, logger, failure_method):
 
 class Source(db.Model):
     __tablename__ = 'sources'
+    __table_args__ = (
+        # The journalist index lists non-pending sources by last update
+        Index('ix_sources_pending_last_updated', 'pending', 'last_updated'),
+    )
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36), unique=True, nullable=False)
     filesystem_id = Column(String(96), unique=True)
@@ -96,6 +128,29 @@ class Source(db.Model):
                     self.docs_msgs_count['documents'] += 1
             return self.docs_msgs_count
 
+    def reserve_interaction_indexes(self, count=1):
+        """Atomically allocate `count` consecutive interaction indexes for
+        this source, for use as the numeric prefix of new submission and
+        reply filenames.
+
+        The counter is incremented by the database and committed straight
+        away rather than incremented in Python and committed along with the
+        rest of the request. This way two requests racing for the same source
+        can never be handed the same index (and overwrite each other's files),
+        and the write lock is released before the caller starts encrypting.
+
+        :returns: A list of the reserved indexes, in ascending order.
+        """
+        db.session.query(Source).filter(Source.id == self.id).update(
+            {Source.interaction_count: Source.interaction_count + count},
+            synchronize_session=False)
+        interaction_count = db.session.query(Source.interaction_count) \
+                                      .filter(Source.id == self.id) \
+                                      .scalar()
+        db.session.commit()
+        return list(range(interaction_count - count + 1,
+                          interaction_count + 1))
+
     @property
     def collection(self):
         """Return the list of submissions and replies for this source, sorted
@@ -158,6 +213,12 @@ class Source(db.Model):
 
 class Submission(db.Model):
     __tablename__ = 'submissions'
+    __table_args__ = (
+        # Also covers lookups by source alone
+        Index('ix_submissions_source_id_downloaded',
+              'source_id', 'downloaded'),
+        Index('ix_submissions_filename', 'filename'),
+    )
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36), unique=True, nullable=False)
     source_id = Column(Integer, ForeignKey('sources.id'))
@@ -170,16 +231,34 @@ class Submission(db.Model):
     size = Column(Integer, nullable=False)
     downloaded = Column(Boolean, default=False)
 
-    def __init__(self, source, filename):
+    # Set if the submission is in the pack files of its source
+    pack_generation = Column(Integer, nullable=True)
+    pack_offset = Column(Integer, nullable=True)
+
+    def __init__(self, source, filename, pack_location=None):
         self.source_id = source.id
         self.filename = filename
         self.uuid = str(uuid.uuid4())
-        self.size = os.stat(current_app.storage.path(source.filesystem_id,
-                                                     filename)).st_size
+        if pack_location is None:
+            self.size = os.stat(current_app.storage.path(
+                source.filesystem_id, filename)).st_size
+        else:
+            self.pack_generation, self.pack_offset, self.size = pack_location
 
     def __repr__(self):
         return '<Submission %r>' % (self.filename)
 
+    @property
+    def download_filename(self):
+        return designation_filename(self.filename,
+                                    self.source.journalist_filename)
+
+    @property
+    def pack_location(self):
+        if self.pack_offset is None:
+            return None
+        return PackLocation(self.pack_generation, self.pack_offset, self.size)
+
     def to_json(self):
         json_submission = {
             'source_url': url_for('api.single_source',
@@ -187,7 +266,7 @@ class Submission(db.Model):
             'submission_url': url_for('api.single_submission',
                                       source_uuid=self.source.uuid,
                                       submission_uuid=self.uuid),
-            'filename': self.filename,
+            'filename': self.download_filename,
             'size': self.size,
             'is_read': self.downloaded,
             'uuid': self.uuid,
@@ -200,6 +279,10 @@ class Submission(db.Model):
 
 class Reply(db.Model):
     __tablename__ = "replies"
+    __table_args__ = (
+        Index('ix_replies_source_id_deleted_by_source',
+              'source_id', 'deleted_by_source'),
+    )
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36), unique=True, nullable=False)
 
@@ -221,17 +304,35 @@ class Reply(db.Model):
 
     deleted_by_source = Column(Boolean, default=False, nullable=False)
 
-    def __init__(self, journalist, source, filename):
+    # Set if the reply is in the pack files of its source
+    pack_generation = Column(Integer, nullable=True)
+    pack_offset = Column(Integer, nullable=True)
+
+    def __init__(self, journalist, source, filename, pack_location=None):
         self.journalist_id = journalist.id
         self.source_id = source.id
         self.uuid = str(uuid.uuid4())
         self.filename = filename
-        self.size = os.stat(current_app.storage.path(source.filesystem_id,
-                                                     filename)).st_size
+        if pack_location is None:
+            self.size = os.stat(current_app.storage.path(
+                source.filesystem_id, filename)).st_size
+        else:
+            self.pack_generation, self.pack_offset, self.size = pack_location
 
     def __repr__(self):
         return '<Reply %r>' % (self.filename)
 
+    @property
+    def download_filename(self):
+        return designation_filename(self.filename,
+                                    self.source.journalist_filename)
+
+    @property
+    def pack_location(self):
+        if self.pack_offset is None:
+            return None
+        return PackLocation(self.pack_generation, self.pack_offset, self.size)
+
     def to_json(self):
         json_submission = {
             'source_url': url_for('api.single_source',
@@ -239,7 +340,7 @@ class Reply(db.Model):
             'reply_url': url_for('api.single_reply',
                                  source_uuid=self.source.uuid,
                                  reply_uuid=self.uuid),
-            'filename': self.filename,
+            'filename': self.download_filename,
             'size': self.size,
             'journalist_username': self.journalist.username,
             'journalist_uuid': self.journalist.uuid,
@@ -251,6 +352,9 @@ class Reply(db.Model):
 
 class SourceStar(db.Model):
     __tablename__ = 'source_stars'
+    __table_args__ = (
+        Index('ix_source_stars_source_id', 'source_id'),
+    )
     id = Column("id", Integer, primary_key=True)
     source_id = Column("source_id", Integer, ForeignKey('sources.id'))
     starred = Column("starred", Boolean, default=True)
@@ -325,7 +429,7 @@ class Journalist(db.Model):
     pw_hash = Column(Binary(256))
     is_admin = Column(Boolean)
 
-    otp_secret = Column(String(16), default=pyotp.random_base32)
+    otp_secret = Column(String(16), default=_random_base32)
     is_totp = Column(Boolean, default=True)
     hotp_counter = Column(Integer, default=0)
     last_token = Column(String(6))
@@ -368,17 +472,20 @@ class Journalist(db.Model):
         # "migrate" from the legacy case
         if not self.passphrase_hash:
             self.passphrase_hash = \
-                argon2.using(**ARGON2_PARAMS).hash(passphrase)
+                _argon2().hash(passphrase)
             # passlib creates one merged field that embeds randomly generated
             # salt in the output like $alg$salt$hash
             self.pw_hash = None
             self.pw_salt = None
 
-        # Don't do anything if user's password hasn't changed.
-        if self.passphrase_hash and self.valid_password(passphrase):
+        # Don't do anything if user's password hasn't changed. This is not a
+        # login, so it does not wait for ARGON2_VERIFICATIONS and can not be
+        # throttled.
+        if self.passphrase_hash and \
+                _argon2().verify(passphrase, self.passphrase_hash):
             return
 
-        self.passphrase_hash = argon2.using(**ARGON2_PARAMS).hash(passphrase)
+        self.passphrase_hash = _argon2().hash(passphrase)
 
     @classmethod
     def check_username_acceptable(cls, username):
@@ -411,17 +518,22 @@ class Journalist(db.Model):
 
         if self.passphrase_hash:
             # default case
-            is_valid = argon2.verify(passphrase, self.passphrase_hash)
+            try:
+                is_valid = ARGON2_VERIFICATIONS.run(_argon2().verify,
+                                                    passphrase,
+                                                    self.passphrase_hash)
+            except ExecutorBusy as e:
+                raise LoginThrottledException(str(e))
         else:
             # legacy support
-            is_valid = pyotp.utils.compare_digest(
+            is_valid = hmac.compare_digest(
                 self._scrypt_hash(passphrase, self.pw_salt),
                 self.pw_hash)
 
         # migrate new passwords
         if is_valid and not self.passphrase_hash:
             self.passphrase_hash = \
-                argon2.using(**ARGON2_PARAMS).hash(passphrase)
+                _argon2().hash(passphrase)
             # passlib creates one merged field that embeds randomly generated
             # salt in the output like $alg$salt$hash
             self.pw_salt = None
@@ -432,7 +544,7 @@ class Journalist(db.Model):
         return is_valid
 
     def regenerate_totp_shared_secret(self):
-        self.otp_secret = pyotp.random_base32()
+        self.otp_secret = _random_base32()
 
     def set_hotp_secret(self, otp_secret):
         self.otp_secret = base64.b32encode(
@@ -446,6 +558,7 @@ class Journalist(db.Model):
     @property
     def totp(self):
         if self.is_totp:
+            import pyotp
             return pyotp.TOTP(self.otp_secret)
         else:
             raise ValueError('{} is not using TOTP'.format(self))
@@ -453,6 +566,7 @@ class Journalist(db.Model):
     @property
     def hotp(self):
         if not self.is_totp:
+            import pyotp
             return pyotp.HOTP(self.otp_secret)
         else:
             raise ValueError('{} is not using HOTP'.format(self))
@@ -463,6 +577,9 @@ class Journalist(db.Model):
             self.username,
             issuer_name="SecureDrop")
 
+        import qrcode
+        # Using svg because it doesn't require additional dependencies
+        import qrcode.image.svg
         qr = qrcode.QRCode(
             box_size=15,
             image_factory=qrcode.image.svg.SvgPathImage
@@ -513,25 +630,44 @@ class Journalist(db.Model):
 
     _LOGIN_ATTEMPT_PERIOD = 60  # seconds
     _MAX_LOGIN_ATTEMPTS_PER_PERIOD = 5
+    _login_attempts = SlidingWindowCounter('login_attempts',
+                                           _LOGIN_ATTEMPT_PERIOD,
+                                           _MAX_LOGIN_ATTEMPTS_PER_PERIOD)
 
     @classmethod
     def throttle_login(cls, user):
         # Record the login attempt...
+        try:
+            attempts_within_period = cls._login_attempts.hit(user.uuid)
+        except RedisError as e:
+            # ...in the database if Redis is unavailable, so that logins are
+            # still throttled
+            current_app.logger.warning(
+                "Falling back to the database for login throttling: "
+                "{}".format(e))
+            attempts_within_period = cls._record_login_attempt(user)
+
+        # ...and reject it if they have exceeded the threshold
+        if attempts_within_period > cls._MAX_LOGIN_ATTEMPTS_PER_PERIOD:
+            raise LoginThrottledException(
+                "throttled ({} attempts in last {} seconds)".format(
+                    attempts_within_period,
+                    cls._LOGIN_ATTEMPT_PERIOD))
+
+    @classmethod
+    def _record_login_attempt(cls, user):
         login_attempt = JournalistLoginAttempt(user)
         db.session.add(login_attempt)
         db.session.commit()
 
-        # ...and reject it if they have exceeded the threshold
         login_attempt_period = datetime.datetime.utcnow() - \
             datetime.timedelta(seconds=cls._LOGIN_ATTEMPT_PERIOD)
-        attempts_within_period = JournalistLoginAttempt.query.filter(
-            JournalistLoginAttempt.journalist_id == user.id).filter(
-            JournalistLoginAttempt.timestamp > login_attempt_period).all()
-        if len(attempts_within_period) > cls._MAX_LOGIN_ATTEMPTS_PER_PERIOD:
-            raise LoginThrottledException(
-                "throttled ({} attempts in last {} seconds)".format(
-                    len(attempts_within_period),
-                    cls._LOGIN_ATTEMPT_PERIOD))
+        return db.session.query(func.count(JournalistLoginAttempt.id)) \
+                         .filter(JournalistLoginAttempt.journalist_id ==
+                                 user.id) \
+                         .filter(JournalistLoginAttempt.timestamp >
+                                 login_attempt_period) \
+                         .scalar()
 
     @classmethod
     def login(cls, username, password, token):
@@ -546,7 +682,7 @@ class Journalist(db.Model):
 
             # Prevent TOTP token reuse
             if user.last_token is not None:
-                if pyotp.utils.compare_digest(token, user.last_token):
+                if hmac.compare_digest(token, user.last_token):
                     raise BadTokenException("previously used token "
                                             "{}".format(token))
         if not user.verify_token(token):
@@ -567,7 +703,7 @@ class Journalist(db.Model):
             data = s.loads(token)
         except BadData:
             return None
-        return Journalist.query.get(data['id'])
+        return current_app.journalist_cache.get(data['id'])
 
     def to_json(self):
         json_user = {
@@ -585,9 +721,31 @@ class JournalistLoginAttempt(db.Model):
     rate limit them in order to prevent attackers from brute forcing
     passwords or two-factor tokens."""
     __tablename__ = "journalist_login_attempt"
+    __table_args__ = (
+        Index('ix_journalist_login_attempt_journalist_id_timestamp',
+              'journalist_id', 'timestamp'),
+    )
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     journalist_id = Column(Integer, ForeignKey('journalists.id'))
 
     def __init__(self, journalist):
         self.journalist_id = journalist.id
+
+    @classmethod
+    def prune(cls, before, batch_size=1000):
+        """Delete the login attempts made before `before`, `batch_size` rows
+        per transaction so that logins are not blocked for long. Returns
+        the number of deleted rows.
+        """
+        deleted = 0
+        while True:
+            ids = [id for (id,) in db.session.query(cls.id)
+                                             .filter(cls.timestamp < before)
+                                             .limit(batch_size)]
+            if not ids:
+                return deleted
+            cls.query.filter(cls.id.in_(ids)).delete(
+                synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
@@ -6,6 +6,7 @@ import os
 import random
 import string
 import sys
+import time
 
 from argparse import ArgumentParser
 from datetime import datetime
@@ -64,6 +65,7 @@ class QaLoader(object):
 
     JOURNALIST_COUNT = 10
     SOURCE_COUNT = 50
+    PENDING_SOURCE_COUNT = 10
 
     def __init__(self, config, multiplier):
         self.config = config
@@ -73,6 +75,7 @@ class QaLoader(object):
         self.journalists = []
         self.sources = []
         self.submissions = []
+        self.pending_sources = []
 
     def new_journalist(self):
         # Make a diceware-like password
@@ -115,6 +118,23 @@ class QaLoader(object):
         db.session.flush()
         self.sources.append(source.id)
 
+    def new_pending_source(self):
+        '''A source who generated a codename and never submitted anything,
+        sometimes long enough ago for it to be purged'''
+        filesystem_id = random_chars(32, nullable=False,
+                                     chars=string.ascii_lowercase)
+        source = Source(filesystem_id,
+                        random_chars(random.randint(4, 32), nullable=False))
+        db.session.add(source)
+        db.session.flush()
+
+        source_dir = current_app.storage.create_source_directory(
+            filesystem_id)
+        if random_bool():
+            created = time.time() - random.randint(31, 365) * 24 * 60 * 60
+            os.utime(source_dir, (created, created))
+        self.pending_sources.append(source.id)
+
     def new_submission(self, source_id):
         source = Source.query.get(source_id)
 
@@ -137,9 +157,8 @@ class QaLoader(object):
         self.submissions.append(submission.id)
 
     def fake_file(self, source_fid):
-        source_dir = path.join(self.config.STORE_DIR, source_fid)
-        if not path.exists(source_dir):
-            os.mkdir(source_dir)
+        if not path.exists(current_app.storage.path(source_fid)):
+            current_app.storage.create_source_directory(source_fid)
 
         filename = random_chars(20,
                                 nullable=False,
@@ -207,6 +226,10 @@ class QaLoader(object):
                 self.new_source()
             db.session.commit()
 
+            for _ in range(self.PENDING_SOURCE_COUNT * self.multiplier):
+                self.new_pending_source()
+            db.session.commit()
+
             for sid in self.sources[0::5]:
                 for _ in range(1, self.multiplier + 1):
                     self.new_submission(sid)
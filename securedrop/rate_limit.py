@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import time
+import uuid
+
+from redis import Redis
+
+
+class SlidingWindowCounter(object):
+    """Counts events per key over the last `period` seconds.
+
+    The counts are kept in Redis, so they are shared by all of the web
+    server's processes. Each key is a sorted set of event timestamps which
+    never holds more than `limit + 1` entries: once that many events are in
+    the window, the exact number no longer matters.
+    """
+
+    def __init__(self, prefix, period, limit, redis=None):
+        self.prefix = prefix
+        self.period = period
+        self.limit = limit
+        self.redis = redis or Redis(socket_connect_timeout=1,
+                                    socket_timeout=1)
+
+    def hit(self, key):
+        """Record an event for `key` and return the number of events in the
+        current window, including this one. Raises a
+        `redis.exceptions.RedisError` if Redis is unavailable.
+        """
+        name = '{}:{}'.format(self.prefix, key)
+        now = time.time()
+
+        pipe = self.redis.pipeline()
+        pipe.zremrangebyscore(name, '-inf', now - self.period)
+        pipe.zadd(name, str(uuid.uuid4()), now)
+        pipe.zremrangebyrank(name, 0, -(self.limit + 2))
+        pipe.zcard(name)
+        pipe.expire(name, self.period)
+        return pipe.execute()[3]
@@ -1,9 +1,128 @@
+import logging
+import threading
 from io import BytesIO
 
 from flask import wrappers
 
 from secure_tempfile import SecureTemporaryFile
 
+log = logging.getLogger(__name__)
+
+# How much memory the uploads received at the same time by a process may be
+# buffered in, in total, unless SPOOL_MEMORY_BUDGET is set in the
+# configuration
+SPOOL_MEMORY_BUDGET = 16 * 1024 * 1024
+
+
+class SpoolBudget(object):
+    """Memory shared by the uploads being received by this process. Each
+    upload is buffered in memory while there is some left, and spills to
+    disk once there is not."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._memory = 0
+        self._stats = dict(max_memory=0, spilled_uploads=0, spilled_bytes=0)
+
+    def reserve(self, size):
+        """Take `size` bytes of the budget, and return whether there were
+        that many left."""
+        with self._lock:
+            if self._memory + size > self.limit:
+                return False
+            self._memory += size
+            self._stats['max_memory'] = max(self._stats['max_memory'],
+                                            self._memory)
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self._memory -= size
+
+    def spilled(self, size, upload=False):
+        """Record that `size` bytes were written to disk, and whether they
+        are the first of an upload."""
+        with self._lock:
+            self._stats['spilled_bytes'] += size
+            if upload:
+                self._stats['spilled_uploads'] += 1
+
+    def stats(self):
+        """Return the memory the uploads are buffered in now, the limit and
+        the highest it reached, and how many uploads and bytes spilled to
+        disk so far."""
+        with self._lock:
+            return dict(self._stats, memory=self._memory, limit=self.limit)
+
+
+SPOOL_BUDGET = SpoolBudget(SPOOL_MEMORY_BUDGET)
+
+
+class BudgetedSpool(object):
+    """Buffer for an upload: a BytesIO while `budget` allows, then a
+    SecureTemporaryFile, which is encrypted with an ephemeral key to
+    mitigate forensic recovery of the plaintext. Uploads bigger than the
+    whole budget go to disk right away.
+    """
+
+    def __init__(self, budget, size=0):
+        self._budget = budget
+        self._reserved = 0
+        self._file = BytesIO()
+        self.spilled = False
+        if size > budget.limit:
+            self._spill()
+
+    def _spill(self):
+        # We don't use `config.TEMP_DIR` here because that
+        # directory is exposed via X-Send-File and there is no
+        # reason for these files to be publicly accessible. See
+        # note in `config.py` for more info. Instead, we just use
+        # `/tmp`, which has the additional benefit of being
+        # automatically cleared on reboot.
+        spool = SecureTemporaryFile('/tmp')  # nosec
+        spool.write(self._file.getvalue())
+        self._budget.spilled(self._reserved, upload=True)
+        self._release()
+        self._file = spool
+        self.spilled = True
+        log.debug('Upload spilled to disk: {memory} of {limit} bytes of '
+                  'spool memory in use'.format(**self._budget.stats()))
+
+    def _release(self):
+        if self._reserved:
+            self._budget.release(self._reserved)
+            self._reserved = 0
+
+    def write(self, data):
+        if not self.spilled:
+            if self._budget.reserve(len(data)):
+                self._reserved += len(data)
+                self._file.write(data)
+                return
+            self._spill()
+        self._file.write(data)
+        self._budget.spilled(len(data))
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._release()
+        self._file.close()
+
+    def __del__(self):
+        # The form parser does not close what it was writing to when the
+        # request fails
+        self._release()
+
 
 class RequestThatSecuresFileUploads(wrappers.Request):
 
@@ -11,21 +130,11 @@ class RequestThatSecuresFileUploads(wrappers.Request):
                             filename=None, content_length=None):
         """Storage class for data streamed in from requests.
 
-        If the data is relatively small (512KB), just store it in
-        memory. Otherwise, use the SecureTemporaryFile class to buffer
-        it on disk, encrypted with an ephemeral key to mitigate
-        forensic recovery of the plaintext.
-
+        Uploads are kept in memory as long as those received by this
+        process at the same time fit in SPOOL_BUDGET. Otherwise they are
+        buffered on disk, encrypted: see BudgetedSpool.
         """
-        if total_content_length > 1024 * 512:
-            # We don't use `config.TEMP_DIR` here because that
-            # directory is exposed via X-Send-File and there is no
-            # reason for these files to be publicly accessible. See
-            # note in `config.py` for more info. Instead, we just use
-            # `/tmp`, which has the additional benefit of being
-            # automatically cleared on reboot.
-            return SecureTemporaryFile('/tmp')  # nosec
-        return BytesIO()
+        return BudgetedSpool(SPOOL_BUDGET, total_content_length or 0)
 
     def make_form_data_parser(self):
         return self.form_data_parser_class(self._secure_file_stream,
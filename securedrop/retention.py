@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+import abc
+import datetime
+import logging
+import os
+import time
+
+from flask import current_app
+
+import management
+
+from journalist_app import utils
+from models import Source, Submission
+from store import pack_filename
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Any, Dict, Iterator, List, Set, Tuple  # noqa: F401
+    from sdconfig import SDConfig  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+# Seconds to wait between two batches of deletions, for the interfaces and
+# the srm jobs to keep up
+BATCH_PAUSE = 1.0
+
+
+class RetentionRule(object):
+    """A rule of the retention policy: what it selects is deleted once it
+    is older than `days` days, the way a journalist would delete it."""
+
+    __metaclass__ = abc.ABCMeta
+
+    name = None  # type: str
+
+    def __init__(self, days):
+        # type: (int) -> None
+        self.days = days
+
+    @abc.abstractmethod
+    def batches(self, batch_size):
+        # type: (int) -> Iterator[List[Any]]
+        """Yield what the rule selects, in batches of at most
+        `batch_size`."""
+
+    @abc.abstractmethod
+    def measure(self, item):
+        # type: (Any) -> Tuple[int, int]
+        """Return the bytes and the database rows deleting `item`
+        reclaims."""
+
+    @abc.abstractmethod
+    def delete(self, item):
+        # type: (Any) -> None
+        """Delete `item` and what goes with it."""
+
+    def finish(self):
+        # type: () -> None
+        """Called once all that the rule selected was deleted."""
+
+
+class DownloadedSubmissions(RetentionRule):
+    """Submissions downloaded by a journalist whose source last submitted
+    something more than `days` days ago. The database does not record when
+    a submission was received, and the modification time of its file is not
+    when it was received either: normalize_timestamps sets the files of a
+    source to the time of their latest submission. So the submissions of a
+    source expire together, `days` days after the last one."""
+
+    name = 'downloaded-submissions'
+
+    def __init__(self, days):
+        # type: (int) -> None
+        super(DownloadedSubmissions, self).__init__(days)
+        # The sources whose pack files need to be compacted
+        self._packed = set()  # type: Set[str]
+
+    def batches(self, batch_size):
+        cutoff = time.time() - self.days * 24 * 60 * 60
+        last_id = 0
+        while True:
+            batch = Submission.query \
+                .filter(Submission.downloaded == True,  # noqa: E712
+                        Submission.id > last_id) \
+                .order_by(Submission.id) \
+                .limit(batch_size) \
+                .all()
+            if not batch:
+                return
+            last_id = batch[-1].id
+            expired = [submission for submission in batch
+                       if self._last_submitted_before(submission, cutoff)]
+            if expired:
+                yield expired
+
+    @staticmethod
+    def _last_submitted_before(submission, cutoff):
+        # A submission without a source can not be found in the store
+        if submission.source is None:
+            return False
+        # A pack file has the time of the last submission appended to it
+        location = submission.pack_location
+        filename = submission.filename if location is None else \
+            pack_filename(location.generation)
+        try:
+            return os.stat(current_app.storage.path(
+                submission.source.filesystem_id,
+                filename)).st_mtime < cutoff
+        except OSError:
+            return False
+
+    def measure(self, submission):
+        return submission.size, 1
+
+    def delete(self, submission):
+        filesystem_id = submission.source.filesystem_id
+        if utils.delete_file(filesystem_id, submission.filename, submission,
+                             compact=False):
+            self._packed.add(filesystem_id)
+
+    def finish(self):
+        for filesystem_id in sorted(self._packed):
+            utils.compact_packs(filesystem_id)
+
+
+class InactiveSources(RetentionRule):
+    """Sources who did not submit anything in the last `days` days, with
+    all of their submissions and replies."""
+
+    name = 'inactive-sources'
+
+    def batches(self, batch_size):
+        cutoff = datetime.datetime.utcnow() - \
+            datetime.timedelta(days=self.days)
+        last_id = 0
+        while True:
+            # Pending sources are purged by purge-pending-sources instead
+            batch = Source.query \
+                .filter(Source.pending == False,  # noqa: E712
+                        Source.last_updated < cutoff,
+                        Source.filesystem_id.isnot(None),
+                        Source.id > last_id) \
+                .order_by(Source.id) \
+                .limit(batch_size) \
+                .all()
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    def measure(self, source):
+        files = source.submissions + source.replies
+        rows = 1 + len(files) + (1 if source.star else 0)
+        return sum(f.size for f in files), rows
+
+    def delete(self, source):
+        utils.delete_collection(source.filesystem_id)
+
+
+RULES = dict((rule.name, rule) for rule in (DownloadedSubmissions,
+                                            InactiveSources))
+
+
+def apply_retention_policy(policy, dry_run=False, batch_size=100,
+                           config=None):
+    # type: (Dict[str, int], bool, int, SDConfig) -> Dict[str, Any]
+    """Apply the rules of `policy`, which maps their names to the number of
+    days after which they delete what they select. Deletions are made
+    `batch_size` at a time, with a pause between batches. With `dry_run`,
+    nothing is deleted but the report tells what would have been.
+    """
+    if config is None:
+        from sdconfig import config
+
+    start = time.time()
+    report = dict(dry_run=dry_run, rules={})  # type: Dict[str, Any]
+    with management.app_context(config):
+        for name, days in sorted(policy.items()):
+            rule = RULES[name](days)
+            result = dict(days=days, selected=0, deleted=0, bytes=0, rows=0)
+            for batch in rule.batches(batch_size):
+                for item in batch:
+                    size, rows = rule.measure(item)
+                    result['selected'] += 1
+                    result['bytes'] += size
+                    result['rows'] += rows
+                    if not dry_run:
+                        rule.delete(item)
+                        result['deleted'] += 1
+                if not dry_run:
+                    time.sleep(BATCH_PAUSE)
+            if not dry_run:
+                rule.finish()
+            report['rules'][name] = result
+            log.info('Retention rule {} ({} days){}: {} selected, {} '
+                     'deleted, {} bytes and {} rows {}'.format(
+                         name, days, ' (dry run)' if dry_run else '',
+                         result['selected'], result['deleted'],
+                         result['bytes'], result['rows'],
+                         'reclaimable' if dry_run else 'reclaimed'))
+
+    report['time'] = time.time() - start
+    return report
@@ -72,6 +72,11 @@ class SDConfig(object):
         except AttributeError:
             pass
 
+        try:
+            self.GZIP_THREADS = _config.GZIP_THREADS  # type: ignore
+        except AttributeError:
+            pass
+
         try:
             self.JOURNALIST_KEY = _config.JOURNALIST_KEY  # type: ignore
         except AttributeError:
@@ -124,11 +129,28 @@ class SDConfig(object):
         except AttributeError:
             pass
 
+        try:
+            self.SPOOL_MEMORY_BUDGET = \
+                _config.SPOOL_MEMORY_BUDGET  # type: ignore
+        except AttributeError:
+            pass
+
         try:
             self.STORE_DIR = _config.STORE_DIR  # type: ignore
         except AttributeError:
             pass
 
+        try:
+            self.STORE_LAYOUT = _config.STORE_LAYOUT  # type: ignore
+        except AttributeError:
+            pass
+
+        try:
+            self.STORE_PACK_MESSAGES = \
+                _config.STORE_PACK_MESSAGES  # type: ignore
+        except AttributeError:
+            pass
+
         try:
             self.SUPPORTED_LOCALES = \
                 _config.SUPPORTED_LOCALES  # type: ignore
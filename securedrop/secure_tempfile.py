@@ -2,6 +2,7 @@
 import base64
 import os
 import io
+import re
 from tempfile import _TemporaryFileWrapper
 
 from gnupg._util import _STREAMLIKE_TYPES
@@ -11,6 +12,13 @@ from cryptography.hazmat.primitives.ciphers.algorithms import AES
 from cryptography.hazmat.primitives.ciphers.modes import CTR
 from cryptography.hazmat.primitives.ciphers import Cipher
 
+# Name of the files SecureTemporaryFile creates: 32 random bytes, encoded
+# in URL-safe base64 without padding
+FILENAME = re.compile(r'^[A-Za-z0-9_-]{43}\.aes$')
+
+# How much SecureTemporaryFile encrypts or decrypts at a time, by default
+CHUNK_SIZE = 64 * 1024
+
 
 class SecureTemporaryFile(_TemporaryFileWrapper, object):
     """Temporary file that provides on-the-fly encryption.
@@ -28,13 +36,15 @@ class SecureTemporaryFile(_TemporaryFileWrapper, object):
 
     WARNING: you can't use this like a normal file object. It supports
     being appended to however many times you wish (although content may not be
-    overwritten), and then it's contents may be read only once (although it may
-    be done in chunks) and only after it's been written to.
+    overwritten), and then it's contents may be read, in chunks, and only after
+    it's been written to. Once reading has started, the file may be seeked to
+    any position and read again, for instance to retry what consumed it, but
+    not written to any more.
     """
     AES_key_size = 256
     AES_block_size = 128
 
-    def __init__(self, store_dir):
+    def __init__(self, store_dir, chunk_size=CHUNK_SIZE):
         """Generates an AES key and an initialization vector, and opens
         a file in the `store_dir` directory with a
         pseudorandomly-generated filename.
@@ -42,10 +52,22 @@ class SecureTemporaryFile(_TemporaryFileWrapper, object):
         Args:
             store_dir (str): the directory to create the secure
                 temporary file under.
+            chunk_size (int): how many bytes are buffered before being
+                encrypted and written, and read and decrypted at a time.
 
         Returns: self
         """
         self.last_action = 'init'
+        self.chunk_size = chunk_size
+        # Plaintext written but not encrypted yet
+        self._pending = []
+        self._pending_size = 0
+        # Output of the cipher, allocated once: it needs room for a block
+        # more than its input. While reading, it holds the plaintext
+        # decrypted ahead, from `_position` to `_filled`.
+        self._buffer = bytearray(chunk_size + self.AES_block_size // 8)
+        self._view = memoryview(self._buffer)
+        self._position = self._filled = 0
         self.create_key()
         self.tmp_file_id = base64.urlsafe_b64encode(os.urandom(32)).strip('=')
         self.filepath = os.path.join(store_dir,
@@ -78,6 +100,9 @@ class SecureTemporaryFile(_TemporaryFileWrapper, object):
         called any number of times following instance initialization,
         but after calling :meth:`read`, you cannot write to the file
         again.
+
+        Writes are buffered until `chunk_size` bytes are pending, so that
+        they are encrypted and written in a few large steps.
         """
         if self.last_action == 'read':
             raise AssertionError('You cannot write after reading!')
@@ -86,7 +111,94 @@ class SecureTemporaryFile(_TemporaryFileWrapper, object):
         if isinstance(data, unicode):  # noqa
             data = data.encode('utf-8')
 
-        self.file.write(self.encryptor.update(data))
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.chunk_size:
+            self._encrypt_pending()
+
+    def _encrypt_pending(self):
+        if not self._pending:
+            return
+        data = self._pending[0] if len(self._pending) == 1 \
+            else b''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        for start in range(0, len(data), self.chunk_size):
+            chunk = data[start:start + self.chunk_size] \
+                if len(data) > self.chunk_size else data
+            count = self.encryptor.update_into(chunk, self._buffer)
+            self.file.write(self._view[:count])
+
+    def flush(self):
+        self._encrypt_pending()
+        self.file.flush()
+
+    def seek(self, offset, whence=0):
+        """Move to the plaintext at `offset`, relative to what `whence`
+        says like for :class:`file`, and return where that is. As the
+        plaintext and the ciphertext are the same size, this is where the
+        ciphertext is in the file too. The file can not be written to
+        after this.
+        """
+        self._encrypt_pending()
+        if whence == io.SEEK_CUR:
+            # The file itself is ahead of what was read
+            offset, whence = self.tell() + offset, io.SEEK_SET
+        if self.last_action == 'write':
+            self.last_action = 'read'
+        position = self.file.seek(offset, whence)
+        self._decrypt_from(position)
+        return position
+
+    def tell(self):
+        if self.last_action == 'read':
+            return self.file.tell() - (self._filled - self._position)
+        return self.file.tell() + self._pending_size
+
+    def _decrypt_from(self, position):
+        """Set up the decryption of the file from `position`. In CTR mode,
+        each block of 16 bytes is encrypted with the IV plus its index as
+        counter, so the decryptor starts at the counter of the block
+        `position` is in, and what comes before it in the block is
+        decrypted and skipped.
+        """
+        block_size = self.AES_block_size // 8
+        block, skip = divmod(position, block_size)
+        counter = (int(self.iv.encode('hex'), 16) + block) % \
+            2 ** self.AES_block_size
+        iv = '{:032x}'.format(counter).decode('hex')
+        try:
+            self.decryptor.finalize()
+        except AlreadyFinalized:
+            pass
+        self.decryptor = Cipher(AES(self.key), CTR(iv),
+                                default_backend()).decryptor()
+
+        self.file.seek(position - skip)
+        # What was decrypted ahead is not where the file is now
+        self._position = self._filled = 0
+        if skip:
+            self._decrypt_ahead()
+            self._position = skip
+            # Past the end of the file
+            if self._filled < skip:
+                self.file.seek(position)
+                self._position = self._filled = 0
+
+    def _start_reading(self):
+        if self.last_action == 'init':
+            raise AssertionError('You must write before reading!')
+        if self.last_action == 'write':
+            self.seek(0, 0)
+
+    def _decrypt_ahead(self):
+        """Decrypt the next chunk of the file, and return whether there
+        was any."""
+        ciphertext = self.file.read(self.chunk_size)
+        self._position = 0
+        self._filled = self.decryptor.update_into(ciphertext, self._buffer) \
+            if ciphertext else 0
+        return self._filled > 0
 
     def read(self, count=None):
         """Read `data` from the secure temporary file. This method may
@@ -94,28 +206,53 @@ class SecureTemporaryFile(_TemporaryFileWrapper, object):
         and once :meth:`write has been called at least once, but not
         before.
 
-        Before the first read operation, `seek(0, 0)` is called. So
-        while you can call this method any number of times, the full
-        contents of the file can only be read once. Additional calls to
-        read will return an empty str, which is desired behavior in that
-        it matches :class:`file` and because other modules depend on
-        this behavior to let them know they've reached the end of the
-        file.
+        Before the first read operation, `seek(0, 0)` is called. Once the
+        end of the file is reached, additional calls to read will return
+        an empty str, which is desired behavior in that it matches
+        :class:`file` and because other modules depend on this behavior
+        to let them know they've reached the end of the file. To read
+        the contents again, :meth:`seek` back first.
 
         Args:
             count (int): the number of bytes to try to read from the
                 file from the current position.
         """
-        if self.last_action == 'init':
-            raise AssertionError('You must write before reading!')
-        if self.last_action == 'write':
-            self.seek(0, 0)
-            self.last_action = 'read'
+        self._start_reading()
+
+        if not count:
+            rest = self._view[self._position:self._filled].tobytes()
+            self._position = self._filled = 0
+            return rest + self.decryptor.update(self.file.read())
+
+        chunks = []
+        while count > 0:
+            if self._position == self._filled and not self._decrypt_ahead():
+                break
+            end = min(self._position + count, self._filled)
+            chunks.append(self._view[self._position:end].tobytes())
+            count -= end - self._position
+            self._position = end
+        return b''.join(chunks)
+
+    def readinto(self, b):
+        """Read into `b`, a writable buffer such as a bytearray, and return
+        how many bytes were read. Unlike :meth:`read`, this allocates
+        nothing: the plaintext is decrypted into a buffer of the file and
+        copied from there. The same restrictions apply.
+        """
+        self._start_reading()
 
-        if count:
-            return self.decryptor.update(self.file.read(count))
-        else:
-            return self.decryptor.update(self.file.read())
+        view = memoryview(b)
+        done = 0
+        while done < len(view):
+            if self._position == self._filled and not self._decrypt_ahead():
+                break
+            count = min(len(view) - done, self._filled - self._position)
+            view[done:done + count] = \
+                self._view[self._position:self._position + count]
+            done += count
+            self._position += count
+        return done
 
     def close(self):
         """The __del__ method in tempfile._TemporaryFileWrapper (which
@@ -8,14 +8,19 @@ from jinja2 import evalcontextfilter
 from os import path
 from sqlalchemy.orm.exc import NoResultFound
 
+import compression
 import i18n
+import template_cache
 import template_filters
 import version
 
 from crypto_util import CryptoUtil
-from db import db
+from db import (db, configure_engine, get_database_uri,
+                instrument_lock_waits)
 from models import Source
-from request_that_secures_file_uploads import RequestThatSecuresFileUploads
+from request_that_secures_file_uploads import (RequestThatSecuresFileUploads,
+                                               SPOOL_BUDGET,
+                                               SPOOL_MEMORY_BUDGET)
 from source_app import main, info, api
 from source_app.decorators import ignore_static
 from source_app.utils import logged_in
@@ -37,6 +42,8 @@ def create_app(config):
                 template_folder=config.SOURCE_TEMPLATES_DIR,
                 static_folder=path.join(config.SECUREDROP_ROOT, 'static'))
     app.request_class = RequestThatSecuresFileUploads
+    SPOOL_BUDGET.limit = getattr(config, 'SPOOL_MEMORY_BUDGET',
+                                 SPOOL_MEMORY_BUDGET)
     app.config.from_object(config.SourceInterfaceFlaskConfig)
     app.sdconfig = config
 
@@ -45,24 +52,19 @@ def create_app(config):
     app.config['WTF_CSRF_TIME_LIMIT'] = 60 * 60 * 24
     CSRFProtect(app)
 
-    if config.DATABASE_ENGINE == "sqlite":
-        db_uri = (config.DATABASE_ENGINE + ":///" +
-                  config.DATABASE_FILE)
-    else:
-        db_uri = (
-            config.DATABASE_ENGINE + '://' +
-            config.DATABASE_USERNAME + ':' +
-            config.DATABASE_PASSWORD + '@' +
-            config.DATABASE_HOST + '/' +
-            config.DATABASE_NAME
-        )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri(config)
     db.init_app(app)
+    configure_engine(db.get_engine(app))
+    instrument_lock_waits(app)
 
     app.storage = Storage(config.STORE_DIR,
                           config.TEMP_DIR,
-                          config.JOURNALIST_KEY)
+                          config.JOURNALIST_KEY,
+                          getattr(config, 'STORE_LAYOUT', 'flat'),
+                          getattr(config, 'STORE_PACK_MESSAGES', False),
+                          getattr(config, 'GZIP_THREADS',
+                                  compression.GZIP_THREADS))
 
     app.crypto_util = CryptoUtil(
         scrypt_params=config.SCRYPT_PARAMS,
@@ -89,6 +91,7 @@ def create_app(config):
 
     app.jinja_env.trim_blocks = True
     app.jinja_env.lstrip_blocks = True
+    template_cache.setup_app(app, config)
     app.jinja_env.globals['version'] = version.__version__
     if getattr(config, 'CUSTOM_HEADER_IMAGE', None):
         app.jinja_env.globals['header_image'] = \
@@ -125,10 +128,7 @@ def create_app(config):
     @ignore_static
     def setup_g():
         """Store commonly used values in Flask's special g object"""
-        g.locale = i18n.get_locale(config)
-        g.text_direction = i18n.get_text_direction(g.locale)
-        g.html_lang = i18n.locale_to_rfc_5646(g.locale)
-        g.locales = i18n.get_locale2name()
+        i18n.set_locale(config)
 
         if 'expires' in session and datetime.utcnow() >= session['expires']:
             msg = render_template('session_timeout.html')
@@ -66,7 +66,7 @@ def make_blueprint(config):
             del session['codename']
             abort(500)
         else:
-            os.mkdir(current_app.storage.path(filesystem_id))
+            current_app.storage.create_source_directory(filesystem_id)
 
         session['logged_in'] = True
         return redirect(url_for('.lookup'))
@@ -79,13 +79,18 @@ def make_blueprint(config):
                                   .filter(Reply.deleted_by_source == False).all()  # noqa
 
         for reply in source_inbox:
-            reply_path = current_app.storage.path(
-                g.filesystem_id,
-                reply.filename,
-            )
             try:
-                with io.open(reply_path, "rb") as f:
-                    contents = f.read()
+                if reply.pack_location is None:
+                    reply_path = current_app.storage.path(g.filesystem_id,
+                                                          reply.filename)
+                    with io.open(reply_path, "rb") as f:
+                        contents = f.read()
+                    mtime = os.stat(reply_path).st_mtime
+                else:
+                    # A reply in a pack file is dated by the last one
+                    # appended to it
+                    contents, mtime = current_app.storage.read_packed_item(
+                        g.filesystem_id, reply)
                 reply.decrypted = current_app.crypto_util.decrypt(
                     g.codename,
                     contents).decode('utf-8')
@@ -93,8 +98,7 @@ def make_blueprint(config):
                 current_app.logger.error("Could not decode reply %s" %
                                          reply.filename)
             else:
-                reply.date = datetime.utcfromtimestamp(
-                    os.stat(reply_path).st_mtime)
+                reply.date = datetime.utcfromtimestamp(mtime)
                 replies.append(reply)
 
         # Sort the replies by date
@@ -136,24 +140,30 @@ def make_blueprint(config):
             return redirect(url_for('main.lookup'))
 
         fnames = []
-        journalist_filename = g.source.journalist_filename
+        packed = []
         first_submission = g.source.interaction_count == 0
 
-        if msg:
-            g.source.interaction_count += 1
+        # Reserve the filename indexes before encrypting anything so that
+        # concurrent submissions for this source can't be given the same ones
+        indexes = iter(g.source.reserve_interaction_indexes(
+            len([x for x in (msg, fh) if x])))
+
+        if msg and current_app.storage.pack_messages:
+            packed.append(
+                current_app.storage.encrypt_message_submission(
+                    next(indexes),
+                    msg))
+        elif msg:
             fnames.append(
                 current_app.storage.save_message_submission(
                     g.filesystem_id,
-                    g.source.interaction_count,
-                    journalist_filename,
+                    next(indexes),
                     msg))
         if fh:
-            g.source.interaction_count += 1
             fnames.append(
                 current_app.storage.save_file_submission(
                     g.filesystem_id,
-                    g.source.interaction_count,
-                    journalist_filename,
+                    next(indexes),
                     fh.filename,
                     fh.stream))
 
@@ -174,13 +184,30 @@ def make_blueprint(config):
                                   html_contents=html_contents)
             flash(Markup(msg), "success")
 
+        # The index reservation above was committed on its own, so no write
+        # transaction was open while encrypting. Keep this one short too:
+        # only touch the database right before committing, and leave key
+        # generation until after the write lock has been released.
         for fname in fnames:
             submission = Submission(g.source, fname)
             db.session.add(submission)
 
-        if g.source.pending:
+        new_source = g.source.pending
+        if new_source:
             g.source.pending = False
+        g.source.last_updated = datetime.utcnow()
+        if packed:
+            with current_app.storage.pack_lock(g.filesystem_id):
+                for fname, ciphertext in packed:
+                    location = current_app.storage.append_to_pack(
+                        g.filesystem_id, ciphertext)
+                    db.session.add(Submission(g.source, fname,
+                                              pack_location=location))
+                db.session.commit()
+        else:
+            db.session.commit()
 
+        if new_source:
             # Generate a keypair now, if there's enough entropy (issue #303)
             # (gpg reads 300 bytes from /dev/random)
             entropy_avail = get_entropy_estimate()
@@ -198,8 +225,6 @@ def make_blueprint(config):
                         "skipping key generation. entropy: {}".format(
                                 entropy_avail))
 
-        g.source.last_updated = datetime.utcnow()
-        db.session.commit()
         normalize_timestamps(g.filesystem_id)
 
         return redirect(url_for('main.lookup'))
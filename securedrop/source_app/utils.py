@@ -4,13 +4,13 @@ import subprocess
 
 from datetime import datetime
 from flask import session, current_app, abort, g
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from threading import Thread
 
 import i18n
 
 from crypto_util import CryptoException
+from db import make_engine
 from models import Source
 
 
@@ -82,7 +82,7 @@ def async_genkey(crypto_util_, db_uri, filesystem_id, codename):
     # Register key generation as update to the source, so sources will
     # filter to the top of the list in the journalist interface if a
     # flagged source logs in and has a key generated for them. #789
-    session = sessionmaker(bind=create_engine(db_uri))()
+    session = sessionmaker(bind=make_engine(db_uri))()
     try:
         source = session.query(Source).filter(
             Source.filesystem_id == filesystem_id).one()
@@ -102,7 +102,8 @@ def normalize_timestamps(filesystem_id):
     investigators. See #301.
     """
     sub_paths = [current_app.storage.path(filesystem_id, submission.filename)
-                 for submission in g.source.submissions]
+                 for submission in g.source.submissions
+                 if submission.pack_location is None]
     if len(sub_paths) > 1:
         args = ["touch"]
         args.extend(sub_paths[:-1])
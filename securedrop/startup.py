@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import i18n
+import models
+import template_cache
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from flask import Flask  # noqa: F401
+
+# What preload() does, in order, as (label, function of the app) pairs
+PRELOAD_STEPS = [
+    ('crypto_util', lambda app: app.crypto_util.preload()),
+    ('models', lambda app: models.preload()),
+    ('translations', lambda app: i18n.preload()),
+    ('templates', template_cache.precompile),
+]
+
+
+def preload(app):
+    # type: (Flask) -> None
+    """Set up everything `app` otherwise sets up while serving its first
+    requests: the GPG keyring, the word lists, the translation catalogs,
+    the templates and the modules that are imported on first use.
+
+    The WSGI scripts call this when the web server starts the application,
+    so that no request has to wait for it.
+    """
+    for label, step in PRELOAD_STEPS:
+        step(app)
@@ -1,20 +1,74 @@
 # -*- coding: utf-8 -*-
+import errno
+import fcntl
 import gzip
+import hashlib
+import io
 import os
 import re
 import tempfile
 import zipfile
 
+from collections import namedtuple
+from contextlib import contextmanager
 from flask import current_app
 from werkzeug.utils import secure_filename
 
+import compression
+from crypto_util import CryptoException
+from db import db
+from rm import srm
 from secure_tempfile import SecureTemporaryFile
 
 
+# Files are stored under their index and type, like 1-msg.gpg. Stores
+# created by older versions also have the designation of their source in
+# between, like 1-abject_hand-msg.gpg.
 VALIDATE_FILENAME = re.compile(
     "^(?P<index>\d+)\-[a-z0-9-_]*"
     "(?P<file_type>msg|doc\.(gz|zip)|reply)\.gpg$").match
 
+# With the flat layout, the directory of every source is directly in the
+# store. With the sharded layout, it is two levels down, in directories
+# named after the hash of its filesystem id, so that none of them has more
+# than a few hundred entries.
+FLAT = 'flat'
+SHARDED = 'sharded'
+LAYOUTS = (FLAT, SHARDED)
+
+IS_SHARD = re.compile(r'^[0-9a-f]{2}$').match
+
+# Messages and replies can be appended to pack files in the directory of
+# their source instead of having a file each. A compaction copies what is
+# left of them to the next generation when some are deleted.
+PACK_FILENAME = re.compile(r'^messages-(?P<generation>\d+)\.pack$').match
+
+# Where a message or reply is in the pack files of its source
+PackLocation = namedtuple('PackLocation', ['generation', 'offset', 'size'])
+
+# How many times the encryption of a file submission is attempted, from
+# its temporary file, before the submission fails
+ENCRYPTION_ATTEMPTS = 3
+
+
+def pack_filename(generation):
+    return 'messages-{}.pack'.format(generation)
+
+
+def stored_filename(count, file_type):
+    return '{}-{}.gpg'.format(count, file_type)
+
+
+def designation_filename(filename, journalist_filename):
+    """Return the name a file of the store is downloaded under, with the
+    designation of its source. It is not part of the name the file is
+    stored under, so that changing the designation renames nothing."""
+    match = VALIDATE_FILENAME(filename)
+    if not match:
+        return filename
+    return '{}-{}-{}.gpg'.format(match.group('index'), journalist_filename,
+                                 match.group('file_type'))
+
 
 class PathException(Exception):
 
@@ -31,13 +85,42 @@ class NotEncrypted(Exception):
     pass
 
 
+def shards(filesystem_id):
+    """Return the names of the directories the directory of a source is in,
+    with the sharded layout."""
+    digest = hashlib.sha256(filesystem_id.encode('utf-8')).hexdigest()
+    return [digest[0:2], digest[2:4]]
+
+
+def source_directory(filesystem_id, layout):
+    """Return the path of the directory of a source relative to the store,
+    with the given layout."""
+    if layout == SHARDED:
+        return os.path.join(*(shards(filesystem_id) + [filesystem_id]))
+    return filesystem_id
+
+
+def is_path_component(name):
+    return bool(name) and os.path.sep not in name and '\0' not in name and \
+        name not in (os.path.curdir, os.path.pardir)
+
+
+def check_encrypted(content):
+    if '-----BEGIN PGP MESSAGE-----' not in content.split('\n')[0]:
+        raise NotEncrypted
+
+
 class Storage:
 
-    def __init__(self, storage_path, temp_dir, gpg_key):
+    def __init__(self, storage_path, temp_dir, gpg_key, layout=FLAT,
+                 pack_messages=False, gzip_threads=1):
         if not os.path.isabs(storage_path):
             raise PathException("storage_path {} is not absolute".format(
                 storage_path))
         self.__storage_path = storage_path
+        # What paths in the store start with, see path()
+        self.__root = os.path.abspath(storage_path)
+        self.__prefix = self.__root.rstrip(os.path.sep) + os.path.sep
 
         if not os.path.isabs(temp_dir):
             raise PathException("temp_dir {} is not absolute".format(
@@ -46,6 +129,26 @@ class Storage:
 
         self.__gpg_key = gpg_key
 
+        if layout not in LAYOUTS:
+            raise ValueError("Unknown store layout {}".format(layout))
+        self.__layout = layout
+        # The filesystem ids of the sources whose directory was found where
+        # the layout puts it. A migration only moves directories there, so
+        # path() does not need to look for them again.
+        self.__in_layout = set()
+        self.__pack_messages = pack_messages
+        # How many threads compress a file submission
+        self.__gzip_threads = gzip_threads
+
+    @property
+    def layout(self):
+        return self.__layout
+
+    @property
+    def pack_messages(self):
+        """Whether new messages and replies are appended to pack files."""
+        return self.__pack_messages
+
     def verify(self, p):
         """Assert that the path is absolute, normalized, inside
            `self.__storage_path`, and matches the filename format.
@@ -60,13 +163,13 @@ class Storage:
             raise PathException("The path is not absolute and/or normalized")
 
         # Check that the path p is in self.__storage_path
-        if os.path.relpath(p, self.__storage_path).startswith('..'):
+        if p != self.__root and not p.startswith(self.__prefix):
             raise PathException("Invalid directory %s" % (p, ))
 
         if os.path.isfile(p):
             filename = os.path.basename(p)
             ext = os.path.splitext(filename)[-1]
-            if filename == '_FLAG':
+            if filename == '_FLAG' or PACK_FILENAME(filename):
                 return True
             if ext != '.gpg':
                 # if there's an extension, verify it's a GPG
@@ -74,14 +177,174 @@ class Storage:
             if not VALIDATE_FILENAME(filename):
                 raise PathException("Invalid filename %s" % (filename, ))
 
+    def __source_directory(self, filesystem_id):
+        directory = source_directory(filesystem_id, self.__layout)
+        if filesystem_id in self.__in_layout:
+            return directory
+        if os.path.exists(self.__prefix + directory):
+            self.__in_layout.add(filesystem_id)
+            return directory
+        # While the store is migrated to this layout, the directory may
+        # still be where the other one put it
+        other = source_directory(
+            filesystem_id, FLAT if self.__layout == SHARDED else SHARDED)
+        if os.path.exists(self.__prefix + other):
+            return other
+        return directory
+
     def path(self, *s):
         """Get the normalized, absolute file path, within
-           `self.__storage_path`.
+           `self.__storage_path`. The first component is the filesystem id of
+           a source, which is mapped to their directory in the layout of the
+           store.
+
+           Each component has to be a name, which is enough for the path to
+           be normalized and within the store: they are checked as strings,
+           without system calls. The filenames of the database are trusted;
+           paths with a filename from user input are checked with `verify`
+           as well.
+        """
+        for component in s:
+            if not is_path_component(component):
+                raise PathException("Invalid path component %s" %
+                                    (component, ))
+        if not s:
+            return self.__root
+        return self.__prefix + os.path.sep.join(
+            (self.__source_directory(s[0]), ) + s[1:])
+
+    def create_source_directory(self, filesystem_id):
+        """Create the directory of a source, and the directories it is in
+        with the sharded layout if they do not exist yet."""
+        directory = self.path(filesystem_id)
+        try:
+            os.makedirs(os.path.dirname(directory))
+        except OSError as e:
+            # The store itself, or created by another source meanwhile
+            if e.errno != errno.EEXIST:
+                raise
+        os.mkdir(directory)
+        return directory
+
+    @contextmanager
+    def pack_lock(self, filesystem_id):
+        """Hold the lock on the pack files of a source. Appending to them and
+        committing the location of what was appended to the database have to
+        happen under it, or a compaction could drop it."""
+        fd = os.open(self.path(filesystem_id), os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Releases the lock
+            os.close(fd)
+
+    def pack_generations(self, filesystem_id):
+        """Return the generations of the pack files of a source, in
+        ascending order."""
+        generations = []
+        for filename in os.listdir(self.path(filesystem_id)):
+            match = PACK_FILENAME(filename)
+            if match:
+                generations.append(int(match.group('generation')))
+        return sorted(generations)
+
+    def append_to_pack(self, filesystem_id, ciphertext):
+        """Append `ciphertext` to the current pack file of a source and
+        return its location. The caller holds `pack_lock`."""
+        generations = self.pack_generations(filesystem_id)
+        generation = generations[-1] if generations else 0
+        with io.open(self.path(filesystem_id, pack_filename(generation)),
+                     'ab') as fh:
+            fh.seek(0, os.SEEK_END)
+            offset = fh.tell()
+            fh.write(ciphertext)
+        return PackLocation(generation, offset, len(ciphertext))
+
+    @contextmanager
+    def __open_pack(self, filesystem_id, generation):
+        """Open a pack file of a source for reading, with a shared lock that
+        keeps remove_pack from deleting it meanwhile. Raise IOError with
+        ENOENT if it was deleted."""
+        path = self.path(filesystem_id, pack_filename(generation))
+        with io.open(path, 'rb') as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_SH)
+            # Deleted by remove_pack while waiting for the lock
+            if os.fstat(fh.fileno()).st_nlink == 0:
+                raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+            yield fh
+
+    def read_packed(self, filesystem_id, location):
+        """Return the ciphertext at `location` in the pack files of a
+        source."""
+        with self.__open_pack(filesystem_id, location.generation) as fh:
+            fh.seek(location.offset)
+            return fh.read(location.size)
+
+    def read_packed_item(self, filesystem_id, item):
+        """Return the ciphertext of `item`, a submission or reply in the pack
+        files of a source, and the modification time of the pack file it
+        was read from.
+
+        A compaction may have moved it since its location was loaded, and
+        deleted the pack file the location is in: the location is then
+        loaded from the database again. So is the file of a message or reply
+        that was unpacked meanwhile.
         """
-        joined = os.path.join(os.path.abspath(self.__storage_path), *s)
-        absolute = os.path.abspath(joined)
-        self.verify(absolute)
-        return absolute
+        location = item.pack_location
+        while location is not None:
+            try:
+                with self.__open_pack(filesystem_id,
+                                      location.generation) as fh:
+                    fh.seek(location.offset)
+                    return (fh.read(location.size),
+                            os.fstat(fh.fileno()).st_mtime)
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                missing = e
+            db.session.refresh(item)
+            if item.pack_location == location:
+                raise missing
+            location = item.pack_location
+
+        with io.open(self.path(filesystem_id, item.filename), 'rb') as fh:
+            return fh.read(), os.fstat(fh.fileno()).st_mtime
+
+    def remove_pack(self, filesystem_id, generation):
+        """Securely delete a pack file of a source once no request is reading
+        from it. Those that open it after find it deleted, and load the
+        location of what they read again. The locations in it must no longer
+        be in the database."""
+        path = self.path(filesystem_id, pack_filename(generation))
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            srm(path)
+        finally:
+            # Releases the lock
+            os.close(fd)
+
+    def write_pack(self, filesystem_id, locations):
+        """Copy what is at `locations` in the pack files of a source to a
+        new generation, in order, and return where it now is. The new pack
+        file keeps the modification time of the latest previous one. The
+        caller holds `pack_lock`, and deletes the previous pack files once
+        the new locations are committed."""
+        generations = self.pack_generations(filesystem_id)
+        generation = generations[-1] + 1 if generations else 0
+        path = self.path(filesystem_id, pack_filename(generation))
+        new_locations = []
+        with io.open(path, 'wb') as fh:
+            for location in locations:
+                new_locations.append(
+                    PackLocation(generation, fh.tell(), location.size))
+                fh.write(self.read_packed(filesystem_id, location))
+        if generations:
+            mtime = os.stat(self.path(filesystem_id,
+                                      pack_filename(generations[-1]))).st_mtime
+            os.utime(path, (mtime, mtime))
+        return new_locations
 
     def get_bulk_archive(self, selected_submissions, zip_directory=''):
         """Generate a zip file from the selected submissions"""
@@ -99,24 +362,28 @@ class Storage:
                 submissions = [s for s in selected_submissions
                                if s.source.journalist_designation == source]
                 for submission in submissions:
-                    filename = self.path(submission.source.filesystem_id,
-                                         submission.filename)
-                    self.verify(filename)
                     document_number = submission.filename.split('-')[0]
                     if zip_directory == submission.source.journalist_filename:
                         fname = zip_directory
                     else:
                         fname = os.path.join(zip_directory, source)
-                    zip.write(filename, arcname=os.path.join(
+                    arcname = os.path.join(
                         fname,
                         "%s_%s" % (document_number,
                                    submission.source.last_updated.date()),
-                        os.path.basename(filename)
-                    ))
+                        submission.download_filename
+                    )
+                    if submission.pack_location is not None:
+                        zip.writestr(arcname, self.read_packed_item(
+                            submission.source.filesystem_id,
+                            submission)[0])
+                        continue
+                    zip.write(self.path(submission.source.filesystem_id,
+                                        submission.filename),
+                              arcname=arcname)
         return zip_file
 
-    def save_file_submission(self, filesystem_id, count, journalist_filename,
-                             filename, stream):
+    def save_file_submission(self, filesystem_id, count, filename, stream):
         sanitized_filename = secure_filename(filename)
 
         # We store file submissions in a .gz file for two reasons:
@@ -131,35 +398,55 @@ class Storage:
         # decrypted file automatically have the name of the original
         # file. Given various usability constraints in GPG and Tails, this
         # is the most user-friendly way we have found to do this.
+        #
+        # Files that are compressed already, like most documents, images
+        # and videos, are stored in the .gz file uncompressed: see
+        # compression.gzip_level. Either way, gpg does not compress it again.
 
-        encrypted_file_name = "{0}-{1}-doc.gz.gpg".format(
-            count,
-            journalist_filename)
+        encrypted_file_name = stored_filename(count, 'doc.gz')
         encrypted_file_path = self.path(filesystem_id, encrypted_file_name)
         with SecureTemporaryFile("/tmp") as stf:  # nosec
-            with gzip.GzipFile(filename=sanitized_filename,
-                               mode='wb', fileobj=stf, mtime=0) as gzf:
-                # Buffer the stream into the gzip file to avoid excessive
-                # memory consumption
-                while True:
-                    buf = stream.read(1024 * 8)
-                    if not buf:
-                        break
+            # Buffer the stream into the gzip file to avoid excessive
+            # memory consumption, in chunks the size of those the
+            # temporary file encrypts
+            buf = stream.read(stf.chunk_size)
+            level = compression.gzip_level(buf)
+            if level == compression.STORE or self.__gzip_threads <= 1:
+                gzf = gzip.GzipFile(filename=sanitized_filename, mode='wb',
+                                    fileobj=stf, mtime=0, compresslevel=level)
+            else:
+                gzf = compression.ParallelGzipFile(
+                    sanitized_filename, stf, compresslevel=level,
+                    threads=self.__gzip_threads)
+            with gzf:
+                while buf:
                     gzf.write(buf)
+                    buf = stream.read(stf.chunk_size)
 
-            current_app.crypto_util.encrypt(
-                stf, self.__gpg_key, encrypted_file_path)
+            # The upload is still in the temporary file if gpg fails, so
+            # it is read again rather than lost
+            for attempt in range(1, ENCRYPTION_ATTEMPTS + 1):
+                stf.seek(0)
+                try:
+                    current_app.crypto_util.encrypt(
+                        stf, self.__gpg_key, encrypted_file_path,
+                        compress=False)
+                    break
+                except CryptoException as e:
+                    if attempt == ENCRYPTION_ATTEMPTS:
+                        raise
+                    current_app.logger.warning(
+                        'Encryption of {} failed, attempt {} of {}: {}'.format(
+                            encrypted_file_name, attempt, ENCRYPTION_ATTEMPTS,
+                            e))
 
         return encrypted_file_name
 
-    def save_pre_encrypted_reply(self, filesystem_id, count,
-                                 journalist_filename, content):
+    def save_pre_encrypted_reply(self, filesystem_id, count, content):
 
-        if '-----BEGIN PGP MESSAGE-----' not in content.split('\n')[0]:
-            raise NotEncrypted
+        check_encrypted(content)
 
-        encrypted_file_name = "{0}-{1}-reply.gpg".format(count,
-                                                         journalist_filename)
+        encrypted_file_name = stored_filename(count, 'reply')
         encrypted_file_path = self.path(filesystem_id, encrypted_file_name)
 
         with open(encrypted_file_path, 'wb') as fh:
@@ -167,30 +454,15 @@ class Storage:
 
         return encrypted_file_path
 
-    def save_message_submission(self, filesystem_id, count,
-                                journalist_filename, message):
-        filename = "{0}-{1}-msg.gpg".format(count, journalist_filename)
+    def encrypt_message_submission(self, count, message):
+        """Return the filename and the ciphertext of a message, to be
+        appended to a pack file."""
+        filename = stored_filename(count, 'msg')
+        return filename, current_app.crypto_util.encrypt(message,
+                                                         self.__gpg_key)
+
+    def save_message_submission(self, filesystem_id, count, message):
+        filename = stored_filename(count, 'msg')
         msg_loc = self.path(filesystem_id, filename)
         current_app.crypto_util.encrypt(message, self.__gpg_key, msg_loc)
         return filename
-
-    def rename_submission(self,
-                          filesystem_id,
-                          orig_filename,
-                          journalist_filename):
-        check_submission_name = VALIDATE_FILENAME(orig_filename)
-        if check_submission_name:
-            parsed_filename = check_submission_name.groupdict()
-            if parsed_filename.get('file_type'):
-                new_filename = "{}-{}-{}.gpg".format(
-                    parsed_filename['index'], journalist_filename,
-                    parsed_filename['file_type'])
-                try:
-                    os.rename(self.path(filesystem_id, orig_filename),
-                              self.path(filesystem_id, new_filename))
-                except OSError:
-                    pass
-                else:
-                    # Only return new filename if successful
-                    return new_filename
-        return orig_filename
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import stat
+
+from jinja2 import FileSystemBytecodeCache
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from flask import Flask  # noqa: F401
+    from sdconfig import SDConfig  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+# Bytecode is loaded as executable code, so nobody but the user running the
+# web applications may be able to write to, or even list, the cache
+CACHE_DIR_MODE = 0o700
+
+
+def get_cache_dir(config):
+    # type: (SDConfig) -> str
+    return os.path.join(config.SECUREDROP_DATA_ROOT, 'jinja_cache')
+
+
+def _ensure_cache_dir(cache_dir):
+    # type: (str) -> bool
+    try:
+        os.mkdir(cache_dir, CACHE_DIR_MODE)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+
+    info = os.stat(cache_dir)
+    if info.st_uid != os.getuid():
+        log.error('Not using the template cache {}: it is not owned by the '
+                  'current user'.format(cache_dir))
+        return False
+    if stat.S_IMODE(info.st_mode) != CACHE_DIR_MODE:
+        os.chmod(cache_dir, CACHE_DIR_MODE)
+    return True
+
+
+def setup_app(app, config):
+    # type: (Flask, SDConfig) -> None
+    """Cache the compiled templates of `app` under the data root, so that
+    new processes do not have to compile them again. Jinja checks the
+    source of each template against its cached bytecode, so templates that
+    changed since are compiled anew.
+
+    The applications run without the cache if it cannot be set up.
+    """
+    cache_dir = get_cache_dir(config)
+    try:
+        if not _ensure_cache_dir(cache_dir):
+            return
+    except OSError as e:
+        log.error('Not using the template cache {}: {}'.format(cache_dir, e))
+        return
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+
+def precompile(app):
+    # type: (Flask) -> int
+    """Compile all of the templates of `app` into its bytecode cache, and
+    return how many there are."""
+    templates = app.jinja_env.list_templates()
+    for name in templates:
+        app.jinja_env.get_template(name)
+    return len(templates)
@@ -3,18 +3,75 @@ from flask_babel import gettext, get_locale
 from babel import units, dates
 from datetime import datetime
 from jinja2 import Markup, escape
+import collections
 import math
+import threading
+
+import typing
+# https://www.python.org/dev/peps/pep-0484/#runtime-or-type-checking
+if typing.TYPE_CHECKING:
+    # flake8 can not understand type annotation yet.
+    # That is why all type annotation relative import
+    # statements has to be marked as noqa.
+    # http://flake8.pycqa.org/en/latest/user/error-codes.html?highlight=f401
+    from typing import Dict, Text, Tuple  # noqa: F401
+
+# The filters run for each row of listings like the journalist index, and
+# Babel is slow to format numbers and dates, so keep the results. Relative
+# times are few once rounded the way Babel does, see _timedelta_bucket(). File
+# sizes are kept for the CACHE_SIZE most recently formatted ones. Absolute
+# dates are not cached: they are almost all different.
+CACHE_SIZE = 20000
+_relative_times = {}  # type: Dict[Tuple, Text]
+_file_sizes = collections.OrderedDict()  # type: Dict[Tuple, Text]
+_cache_lock = threading.Lock()
+
+
+def _cached(cache, key, func):
+    """Return the value of `key` in `cache`, an OrderedDict of at most
+    CACHE_SIZE entries, computing it with `func` if it is not there."""
+    with _cache_lock:
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+    value = func()
+    with _cache_lock:
+        cache[key] = value
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+    return value
 
 
 def rel_datetime_format(dt, fmt=None, relative=False):
     """Template filter for readable formatting of datetime.datetime"""
+    locale = get_locale()
     if relative:
-        time = dates.format_timedelta(datetime.utcnow() - dt,
-                                      locale=get_locale())
+        delta = datetime.utcnow() - dt
+        key = (str(locale),) + _timedelta_bucket(delta)
+        try:
+            time = _relative_times[key]
+        except KeyError:
+            time = _relative_times[key] = dates.format_timedelta(
+                delta, locale=locale)
         return gettext('{time} ago').format(time=time)
     else:
         fmt = fmt or 'MMM dd, yyyy hh:mm a'
-        return dates.format_datetime(dt, fmt, locale=get_locale())
+        return dates.format_datetime(dt, fmt, locale=locale)
+
+
+def _timedelta_bucket(delta, threshold=.85):
+    """Return the unit and rounded value that `dates.format_timedelta` picks
+    for `delta` with its default arguments: they are all its result depends
+    on.
+    """
+    seconds = int((delta.days * 86400) + delta.seconds)
+    for unit, secs_per_unit in dates.TIMEDELTA_UNITS:
+        value = abs(seconds) / float(secs_per_unit)
+        if value >= threshold or unit == 'second':
+            if unit == 'second' and value > 0:
+                value = max(1, value)
+            return unit, int(round(value))
 
 
 def nl2br(context, value):
@@ -25,13 +82,18 @@ def nl2br(context, value):
 
 
 def filesizeformat(value):
+    locale = get_locale()
+    return _cached(_file_sizes, (str(locale), value),
+                   lambda: _filesizeformat(value, locale))
+
+
+def _filesizeformat(value, locale):
     prefixes = [
         'digital-kilobyte',
         'digital-megabyte',
         'digital-gigabyte',
         'digital-terabyte',
     ]
-    locale = get_locale()
     base = 1024
     #
     # we are using the long length because the short length has no
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for performance-sensitive code paths. They are marked with
+`pytest.mark.benchmark` and skipped unless pytest is run with `--benchmark`:
+
+    pytest --benchmark --no-cov tests/benchmarks
+"""
+import time
+
+
+def timed(func, *args, **kwargs):
+    """Call `func` and return how long it took, in seconds."""
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+
+def report(capsys, title, results):
+    """Print `results`, a list of `(label, value)` pairs, bypassing pytest's
+    output capturing so they show up in the test run."""
+    with capsys.disabled():
+        print('\n{}'.format(title))
+        for label, value in results:
+            print('    {:<48} {}'.format(label, value))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+import shutil
+
+import journalist_app
+import source_app
+import template_cache
+from tests.benchmarks import report, timed
+
+
+def cold_start(interface, config):
+    """Start the app, then load every template as its first requests
+    would."""
+    template_cache.precompile(interface.create_app(config))
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('interface', [source_app, journalist_app])
+def test_cold_start(interface, config, capsys):
+    cache_dir = template_cache.get_cache_dir(config)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.mkdir(cache_dir)
+    uncached = timed(cold_start, interface, config)
+    # The cache is now populated, as it would be by compile-templates
+    cached = timed(cold_start, interface, config)
+
+    report(capsys, 'Cold start of {}'.format(interface.__name__),
+           [('without compiled templates (ms)',
+             '{:.1f}'.format(uncached * 1000)),
+            ('with compiled templates (ms)', '{:.1f}'.format(cached * 1000))])
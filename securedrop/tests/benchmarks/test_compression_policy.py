@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+import pytest
+import random
+import zipfile
+
+from flask import current_app
+
+from secure_tempfile import SecureTemporaryFile
+from store import stored_filename
+from tests.benchmarks import report, timed
+
+SIZE = 8 * 1024 * 1024
+
+
+def _log():
+    rng = random.Random(0)
+    lines = []
+    size = 0
+    while size < SIZE:
+        line = '2018-06-{:02d} {:02d}:{:02d}:{:02d} worker[{}]: request {} ' \
+            'took {} ms\n'.format(rng.randint(1, 30), rng.randint(0, 23),
+                                  rng.randint(0, 59), rng.randint(0, 59),
+                                  rng.randint(1, 16), rng.getrandbits(32),
+                                  rng.randint(1, 5000))
+        lines.append(line)
+        size += len(line)
+    return ''.join(lines)[:SIZE]
+
+
+def _zip():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('log.txt', _log())
+        zf.writestr('photo.jpg', os.urandom(SIZE // 2))
+    return archive.getvalue()
+
+
+def _pdf():
+    # Compressed streams with a little text in between
+    chunks = ['%PDF-1.4\n']
+    while sum(len(chunk) for chunk in chunks) < SIZE:
+        chunks.append('<< /Length 16384 /Filter /FlateDecode >>\nstream\n')
+        chunks.append(os.urandom(16384))
+        chunks.append('\nendstream\nendobj\n')
+    return ''.join(chunks)[:SIZE]
+
+
+CORPUS = (
+    ('log', _log),
+    ('zip', _zip),
+    ('pdf', _pdf),
+    ('jpeg', lambda: b'\xff\xd8\xff\xe0' + os.urandom(SIZE - 4)),
+    ('mp4', lambda: b'\x00\x00\x00\x18ftypmp42' + os.urandom(SIZE - 12)),
+)
+
+
+def _previous_save(stream, path, key):
+    """How file submissions were saved before: gzipped at the highest
+    level, then compressed again by gpg."""
+    with SecureTemporaryFile('/tmp') as stf:  # nosec
+        with gzip.GzipFile(filename='upload', mode='wb', fileobj=stf,
+                           mtime=0) as gzf:
+            while True:
+                buf = stream.read(stf.chunk_size)
+                if not buf:
+                    break
+                gzf.write(buf)
+        current_app.crypto_util.encrypt(stf, key, path)
+
+
+@pytest.mark.benchmark
+def test_compression_policy(journalist_app, test_source, config, capsys):
+    """Time to save file submissions of various types and the size they are
+    stored in, gzipped at the highest level and compressed by gpg again as
+    before, and with the level chosen from their first chunk and no
+    compression by gpg."""
+    results = []
+    filesystem_id = test_source['filesystem_id']
+    with journalist_app.app_context():
+        storage = current_app.storage
+        before_path = storage.path(filesystem_id,
+                                   stored_filename(0, 'doc.gz'))
+        for count, (name, make) in enumerate(CORPUS, 1):
+            data = make()
+            before = timed(_previous_save, io.BytesIO(data), before_path,
+                           config.JOURNALIST_KEY)
+            before_size = os.path.getsize(before_path)
+
+            after = timed(storage.save_file_submission, filesystem_id,
+                          count, name, io.BytesIO(data))
+            after_size = os.path.getsize(storage.path(
+                filesystem_id, stored_filename(count, 'doc.gz')))
+
+            results.append((
+                '{}, before / after (s)'.format(name),
+                '{:.2f} / {:.2f}'.format(before, after)))
+            results.append((
+                '{}, stored size before / after (%)'.format(name),
+                '{:.0f} / {:.0f}'.format(100.0 * before_size / len(data),
+                                         100.0 * after_size / len(data))))
+
+    report(capsys, 'File submissions of {} MiB'.format(SIZE // 1024 // 1024),
+           results)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import pytest
+import time
+
+from flask import url_for
+from pyotp import TOTP
+from threading import Thread
+
+import models
+from tests.benchmarks import report
+
+CONCURRENT_LOGINS = 20
+
+
+def _login(journalist_app, journo, results):
+    with journalist_app.test_client() as app:
+        resp = app.post(url_for('main.login'),
+                        data={'username': journo['username'],
+                              'password': journo['password'],
+                              'token': TOTP(journo['otp_secret']).now()})
+        # A successful login redirects to the index
+        results.append(resp.status_code == 302)
+
+
+@pytest.mark.benchmark
+def test_page_latency_during_concurrent_logins(journalist_app, test_journo,
+                                               test_admin, capsys):
+    """Latency of the journalist index for a logged in journalist while
+    `CONCURRENT_LOGINS` logins verify passwords in parallel."""
+    with journalist_app.test_client() as app:
+        app.post(url_for('main.login'),
+                 data={'username': test_admin['username'],
+                       'password': test_admin['password'],
+                       'token': TOTP(test_admin['otp_secret']).now()})
+
+        logins = []
+        threads = [Thread(target=_login,
+                          args=(journalist_app, test_journo, logins))
+                   for _ in range(CONCURRENT_LOGINS)]
+        before = models.ARGON2_VERIFICATIONS.stats()
+        for thread in threads:
+            thread.start()
+
+        latencies = []
+        while any(thread.is_alive() for thread in threads):
+            start = time.time()
+            assert app.get(url_for('main.index')).status_code == 200
+            latencies.append(time.time() - start)
+
+        for thread in threads:
+            thread.join()
+        after = models.ARGON2_VERIFICATIONS.stats()
+
+    latencies.sort()
+    verified = after['calls'] - before['calls']
+    report(capsys,
+           'Index latency during {} concurrent logins'.format(
+               CONCURRENT_LOGINS),
+           [('index requests', len(latencies)),
+            ('median latency (s)',
+             '{:.3f}'.format(latencies[len(latencies) // 2])),
+            ('max latency (s)', '{:.3f}'.format(latencies[-1])),
+            ('successful logins', logins.count(True)),
+            ('rejected verifications',
+             after['rejected'] - before['rejected']),
+            ('mean verification time (s)', '{:.3f}'.format(
+                (after['run_time'] - before['run_time']) / verified)),
+            ('max verification wait (s)',
+             '{:.3f}'.format(after['max_queued_time']))])
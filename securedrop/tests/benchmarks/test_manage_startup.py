@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import os
+import pytest
+import subprocess
+import sys
+
+import manage
+import management
+from tests.benchmarks import report, timed
+
+RUNS = 5
+
+
+def _enter(context):
+    with context:
+        pass
+
+
+def _run_command(command, *args):
+    subprocess.check_call([sys.executable, 'manage.py', command] + list(args),
+                          cwd=os.path.dirname(os.path.abspath(manage.__file__)))
+
+
+@pytest.mark.benchmark
+def test_command_latency(journalist_app, config, capsys):
+    """Time for a management command to run from start to finish, and how
+    much of it goes to setting up its application context."""
+    original_config = manage.config
+    try:
+        manage.config = config
+        args = argparse.Namespace(data_root=config.SECUREDROP_DATA_ROOT,
+                                  days=1, batch_size=1000,
+                                  verbose=logging.INFO)
+        commands = [
+            ('were-there-submissions-today',
+             manage.were_there_submissions_today),
+            ('prune-login-attempts', manage.prune_login_attempts),
+        ]
+        results = [
+            ('journalist interface context (ms)',
+             '{:.1f}'.format(min(timed(_enter, manage.app_context())
+                                 for i in range(RUNS)) * 1000)),
+            ('management context (ms)',
+             '{:.1f}'.format(min(timed(_enter,
+                                       management.app_context(config))
+                                 for i in range(RUNS)) * 1000)),
+        ]
+        for name, command in commands:
+            results.append(('{} (ms)'.format(name), '{:.1f}'.format(
+                min(timed(command, args) for i in range(RUNS)) * 1000)))
+
+        # Includes starting Python and importing everything
+        results.append(('manage.py clean-tmp, new process (ms)',
+                        '{:.1f}'.format(min(
+                            timed(_run_command, 'clean-tmp', '--directory',
+                                  config.TEMP_DIR)
+                            for i in range(RUNS)) * 1000)))
+    finally:
+        manage.config = original_config
+
+    report(capsys, 'Management command latency (best of {})'.format(RUNS),
+           results)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import pytest
+import tarfile
+
+from flask import current_app
+
+import maintenance
+from db import db
+from models import Submission
+from store import stored_filename
+from tests.benchmarks import report, timed
+from tests.utils import db_helper
+
+SOURCES = 20
+MESSAGES = 50
+MESSAGE_SIZE = 1024
+
+
+def _file_count(store_dir):
+    return sum(len(files) for _, _, files in os.walk(store_dir))
+
+
+def _backup(store_dir, archive):
+    with tarfile.open(archive, 'w') as tar:
+        tar.add(store_dir, arcname='store')
+
+
+def _write_files(sources):
+    storage = current_app.storage
+    for source in sources:
+        for i in range(1, MESSAGES + 1):
+            filename = stored_filename(i, 'msg')
+            with io.open(storage.path(source.filesystem_id, filename),
+                         'wb') as fh:
+                fh.write(os.urandom(MESSAGE_SIZE))
+
+
+def _append_to_packs(sources):
+    storage = current_app.storage
+    for source in sources:
+        with storage.pack_lock(source.filesystem_id):
+            for i in range(1, MESSAGES + 1):
+                location = storage.append_to_pack(source.filesystem_id,
+                                                  os.urandom(MESSAGE_SIZE))
+                db.session.add(Submission(
+                    source,
+                    stored_filename(i, 'msg'),
+                    pack_location=location))
+            db.session.commit()
+
+
+@pytest.mark.benchmark
+def test_pack_store(journalist_app, config, capsys):
+    """Files in the store and time to back it up with one file per message,
+    and with pack files, then the time to compact a pack file after half of
+    its messages were deleted."""
+    archive = os.path.join(config.TEMP_DIR, 'backup.tar')
+    results = []
+    with journalist_app.app_context():
+        for name, write in (('one file per message', _write_files),
+                            ('pack files', _append_to_packs)):
+            sources = [db_helper.init_source_without_keypair()[0]
+                       for _ in range(SOURCES)]
+            write_time = timed(write, sources)
+            results.extend([
+                ('{}: write (messages/s)'.format(name),
+                 '{:.0f}'.format(SOURCES * MESSAGES / write_time)),
+                ('{}: files in the store'.format(name),
+                 _file_count(config.STORE_DIR)),
+                ('{}: backup (ms)'.format(name), '{:.1f}'.format(
+                    timed(_backup, config.STORE_DIR, archive) * 1000)),
+            ])
+            # Only count the pack files in the next round
+            if write is _write_files:
+                for source in sources:
+                    directory = current_app.storage.path(source.filesystem_id)
+                    for filename in os.listdir(directory):
+                        os.remove(os.path.join(directory, filename))
+
+        source = sources[0]
+        filesystem_id = source.filesystem_id
+        for submission in source.submissions[::2]:
+            db.session.delete(submission)
+        db.session.commit()
+
+    result = maintenance.compact_pack(filesystem_id, config=config)
+    results.append(('compaction of {} messages (ms)'.format(MESSAGES),
+                    '{:.1f}, {} bytes reclaimed'.format(
+                        result['time'] * 1000, result['bytes_reclaimed'])))
+
+    report(capsys, '{} sources with {} messages of {} bytes'.format(
+        SOURCES, MESSAGES, MESSAGE_SIZE), results)
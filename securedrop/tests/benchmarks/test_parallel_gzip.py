@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import gzip
+import pytest
+import random
+
+import compression
+from secure_tempfile import SecureTemporaryFile
+from tests.benchmarks import report, timed
+
+SIZE = 64 * 1024 * 1024
+
+
+def _csv():
+    rng = random.Random(0)
+    rows = []
+    size = 0
+    while size < SIZE:
+        row = '{},{},{:.2f},{}\n'.format(
+            rng.getrandbits(32), rng.choice(('open', 'closed', 'pending')),
+            rng.uniform(0, 10000), rng.randint(1, 365))
+        rows.append(row)
+        size += len(row)
+    return ''.join(rows)[:SIZE]
+
+
+def _compress(gzf, stf, data):
+    with gzf:
+        for start in range(0, len(data), stf.chunk_size):
+            gzf.write(data[start:start + stf.chunk_size])
+
+
+@pytest.mark.benchmark
+def test_parallel_gzip(config, capsys):
+    """Throughput and ratio of the compression of a large CSV file into a
+    SecureTemporaryFile, as file submissions are, with gzip.GzipFile and
+    with ParallelGzipFile and various numbers of threads."""
+    data = _csv()
+    megabytes = float(SIZE) / (1024 * 1024)
+    results = []
+    for threads in (None, 1, 2, 4, 8):
+        with SecureTemporaryFile(config.TEMP_DIR) as stf:
+            if threads is None:
+                name = 'gzip.GzipFile'
+                gzf = gzip.GzipFile(filename='data.csv', mode='wb',
+                                    fileobj=stf, mtime=0,
+                                    compresslevel=compression.DEFAULT)
+            else:
+                name = 'ParallelGzipFile, {} threads'.format(threads)
+                gzf = compression.ParallelGzipFile('data.csv', stf,
+                                                   threads=threads)
+            elapsed = timed(_compress, gzf, stf, data)
+            stf.flush()
+            results.append((
+                '{} (MB/s, %)'.format(name),
+                '{:.0f}, {:.1f}'.format(megabytes / elapsed,
+                                        100.0 * stf.tell() / SIZE)))
+
+    report(capsys, 'gzip of a CSV file of {} MiB'.format(SIZE // 1024 // 1024),
+           results)
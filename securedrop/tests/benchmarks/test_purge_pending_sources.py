@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import maintenance
+from db import db
+from models import Source
+from qa_loader import QaLoader
+from tests.benchmarks import report
+
+SOURCES = 1000
+
+
+@pytest.mark.benchmark
+def test_purge_pending_sources(config, capsys):
+    """Throughput of the purge of abandoned pending sources, depending on
+    the size of the batches. About half of them are old enough to be
+    purged."""
+    loader = QaLoader(config, multiplier=1)
+    results = []
+    for batch_size in (10, 100, 1000):
+        with loader.app.app_context():
+            for _ in range(SOURCES):
+                loader.new_pending_source()
+            db.session.commit()
+
+        result = maintenance.purge_pending_sources(
+            max_age_days=30, batch_size=batch_size, config=config)
+        results.append(('batch size {} (sources/s)'.format(batch_size),
+                        '{:.0f}, {} of {} purged'.format(
+                            result['examined'] / result['time'],
+                            result['purged'], result['examined'])))
+
+        with loader.app.app_context():
+            assert Source.query.filter_by(pending=True).count() == \
+                result['examined'] - result['purged']
+            Source.query.delete()
+            db.session.commit()
+
+    report(capsys, 'Purge of {} pending sources'.format(SOURCES), results)
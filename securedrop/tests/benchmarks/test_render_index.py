@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from datetime import datetime, timedelta
+from flask import g, render_template
+
+import i18n
+import template_filters
+from models import Journalist, Source
+from tests.benchmarks import report, timed
+
+SOURCES = 5000
+
+
+def _clear_filter_caches():
+    for cache in (template_filters._relative_times,
+                  template_filters._file_sizes):
+        cache.clear()
+
+
+@pytest.mark.benchmark
+def test_render_index(journalist_app, test_journo, config, capsys):
+    """Render the journalist index with `SOURCES` sources, first with empty
+    template filter caches and then with warm ones."""
+    now = datetime.utcnow()
+    sources = []
+    for i in range(SOURCES):
+        source = Source('fs{}'.format(i), 'source {}'.format(i))
+        source.last_updated = now - timedelta(minutes=7 * i)
+        source.num_unread = i % 3
+        sources.append(source)
+
+    with journalist_app.test_request_context('/'):
+        i18n.set_locale(config)
+        g.user = Journalist.query.get(test_journo['id'])
+
+        def render():
+            render_template('index.html', unstarred=sources, starred=[])
+
+        _clear_filter_caches()
+        cold = timed(render)
+        warm = timed(render)
+
+    report(capsys, 'Rendering index.html with {} sources'.format(SOURCES),
+           [('cold filter caches (s)', '{:.3f}'.format(cold)),
+            ('warm filter caches (s)', '{:.3f}'.format(warm))])
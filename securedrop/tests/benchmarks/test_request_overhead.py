@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import pytest
+import time
+
+import source_app
+from tests.benchmarks import report
+
+REQUESTS = 500
+ACCEPT_LANGUAGES = ['en-US,en;q=0.5', 'fr-FR,fr;q=0.8,en;q=0.5', 'ar',
+                    'de-DE,de;q=0.9', 'zh-TW,zh;q=0.8']
+
+
+@pytest.mark.benchmark
+def test_per_request_overhead(config, capsys):
+    """Time spent serving a simple page, which is mostly the per-request
+    setup: session, locale negotiation and the language menu."""
+    config.SUPPORTED_LOCALES = ['en_US', 'fr_FR', 'ar', 'de_DE', 'zh_Hant',
+                                'nb_NO', 'es_ES', 'it_IT', 'pt_BR', 'ru']
+    app = source_app.create_app(config)
+
+    with app.test_client() as client:
+        start = time.time()
+        for i in range(REQUESTS):
+            headers = {'Accept-Language':
+                       ACCEPT_LANGUAGES[i % len(ACCEPT_LANGUAGES)]}
+            resp = client.get('/tor2web-warning', headers=headers)
+            assert resp.status_code == 200
+        elapsed = time.time() - start
+
+    report(capsys, 'Per-request overhead ({} requests)'.format(REQUESTS),
+           [('ms/request', '{:.2f}'.format(elapsed * 1000 / REQUESTS))])
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+
+from secure_tempfile import SecureTemporaryFile
+from tests.benchmarks import report, timed
+
+SIZE = 64 * 1024 * 1024
+WRITE_SIZE = 8 * 1024
+
+
+def _write(f, data):
+    for start in range(0, len(data), WRITE_SIZE):
+        f.write(data[start:start + WRITE_SIZE])
+    f.flush()
+
+
+def _read(f, size):
+    while f.read(size):
+        pass
+
+
+def _readinto(f, size):
+    buf = bytearray(size)
+    while f.readinto(buf):
+        pass
+
+
+@pytest.mark.benchmark
+def test_secure_tempfile_throughput(config, capsys):
+    """Throughput of SecureTemporaryFile depending on its chunk size, for
+    writes of 8 KiB like those of the gzip file of a submission, and reads
+    with read() and readinto()."""
+    data = os.urandom(SIZE)
+    megabytes = float(SIZE) / (1024 * 1024)
+    results = []
+    for chunk_size in (8 * 1024, 64 * 1024, 1024 * 1024):
+        for name, read in (('read', _read), ('readinto', _readinto)):
+            f = SecureTemporaryFile(config.TEMP_DIR, chunk_size=chunk_size)
+            try:
+                write_time = timed(_write, f, data)
+                read_time = timed(read, f, chunk_size)
+            finally:
+                f.close()
+            results.append((
+                'chunks of {} KiB, write and {} (MB/s)'.format(
+                    chunk_size // 1024, name),
+                '{:.0f} / {:.0f}'.format(megabytes / write_time,
+                                         megabytes / read_time)))
+
+    report(capsys, 'SecureTemporaryFile, {} MiB'.format(SIZE // 1024 // 1024),
+           results)
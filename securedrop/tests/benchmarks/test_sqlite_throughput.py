@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import pytest
+import time
+
+from datetime import datetime
+from sqlalchemy import text
+from threading import Thread
+
+from db import db
+from models import Journalist, JournalistLoginAttempt, Source
+from tests.benchmarks import report
+
+DURATION = 5  # seconds
+READERS = 4
+WRITERS = 2
+
+
+def _run_for(app, duration, operation, counts):
+    deadline = time.time() + duration
+    with app.app_context():
+        while time.time() < deadline:
+            operation()
+            counts.append(1)
+        db.session.remove()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('journal_mode', ['delete', 'wal'])
+def test_mixed_read_write_throughput(journalist_app, test_journo,
+                                     test_submissions, journal_mode, capsys):
+    """Readers listing sources (like the journalist index and the API) while
+    writers record login attempts and update sources (like logins and
+    submissions)."""
+    journalist_id = test_journo['id']
+    source_id = test_submissions['source'].id
+
+    with journalist_app.app_context():
+        db.engine.execute(text('PRAGMA journal_mode = {}'.format(
+            journal_mode)))
+
+    def read():
+        for source in Source.query.filter_by(pending=False).all():
+            source.submissions
+
+    def write():
+        db.session.add(JournalistLoginAttempt(
+            Journalist.query.get(journalist_id)))
+        Source.query.get(source_id).last_updated = datetime.utcnow()
+        db.session.commit()
+
+    reads, writes = [], []
+    threads = ([Thread(target=_run_for,
+                       args=(journalist_app, DURATION, read, reads))
+                for _ in range(READERS)] +
+               [Thread(target=_run_for,
+                       args=(journalist_app, DURATION, write, writes))
+                for _ in range(WRITERS)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report(capsys,
+           'Mixed read/write throughput (journal_mode={})'.format(
+               journal_mode),
+           [('reads/s ({} threads)'.format(READERS),
+             '{:.1f}'.format(len(reads) / float(DURATION))),
+            ('writes/s ({} threads)'.format(WRITERS),
+             '{:.1f}'.format(len(writes) / float(DURATION)))])
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import io
+import pytest
+
+import store
+from store import Storage
+from tests.benchmarks import report, timed
+
+CALLS = 100000
+FILES = 100
+
+
+def _paths(storage, filesystem_id, filenames):
+    for _ in range(CALLS // len(filenames)):
+        for filename in filenames:
+            storage.path(filesystem_id, filename)
+
+
+def _verified_paths(storage, filesystem_id, filenames):
+    for _ in range(CALLS // len(filenames)):
+        for filename in filenames:
+            storage.verify(storage.path(filesystem_id, filename))
+
+
+@pytest.mark.benchmark
+def test_storage_path(config, capsys):
+    """Rate of Storage.path for the filenames of the database, which are
+    only checked as strings, and with the checks of Storage.verify, which
+    paths from user input get as well."""
+    results = []
+    filenames = [store.stored_filename(i, 'msg') for i in range(1, FILES + 1)]
+    for layout in store.LAYOUTS:
+        storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                          config.JOURNALIST_KEY, layout=layout)
+        filesystem_id = 'benchmark-{}'.format(layout)
+        storage.create_source_directory(filesystem_id)
+        for filename in filenames:
+            io.open(storage.path(filesystem_id, filename), 'wb').close()
+
+        for name, func in (('path', _paths),
+                           ('path and verify', _verified_paths)):
+            results.append((
+                '{} layout, {} (calls/s)'.format(layout, name),
+                '{:.0f}'.format(CALLS / timed(func, storage, filesystem_id,
+                                              filenames))))
+
+    report(capsys, 'Storage.path with {} files'.format(FILES), results)
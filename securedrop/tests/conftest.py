@@ -44,17 +44,24 @@ gnupg_logger.setLevel(
 def pytest_addoption(parser):
     parser.addoption("--page-layout", action="store_true",
                      default=False, help="run page layout tests")
+    parser.addoption("--benchmark", action="store_true",
+                     default=False, help="run benchmarks")
 
 
 def pytest_collection_modifyitems(config, items):
-    if config.getoption("--page-layout"):
-        return
     skip_page_layout = pytest.mark.skip(
         reason="need --page-layout option to run page layout tests"
     )
+    skip_benchmark = pytest.mark.skip(
+        reason="need --benchmark option to run benchmarks"
+    )
     for item in items:
-        if "pagelayout" in item.keywords:
+        if ("pagelayout" in item.keywords and
+                not config.getoption("--page-layout")):
             item.add_marker(skip_page_layout)
+        if ("benchmark" in item.keywords and
+                not config.getoption("--benchmark")):
+            item.add_marker(skip_benchmark)
 
 
 @pytest.fixture
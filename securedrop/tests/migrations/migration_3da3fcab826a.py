@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import text
+
+from db import db
+from journalist_app import create_app
+
+AUTO_VACUUM_FULL = 1
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class UpgradeTester():
+    '''This migration only changes the auto-vacuum mode, which does not
+       affect database contents. Check that the change was persisted.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        pass
+
+    def check_upgrade(self):
+        with self.app.app_context():
+            auto_vacuum = db.engine.execute(
+                text('PRAGMA auto_vacuum')).scalar()
+            assert auto_vacuum == AUTO_VACUUM_INCREMENTAL
+
+
+class DowngradeTester():
+    '''Check that the database was switched back to full auto-vacuum.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        pass
+
+    def check_downgrade(self):
+        with self.app.app_context():
+            auto_vacuum = db.engine.execute(
+                text('PRAGMA auto_vacuum')).scalar()
+            assert auto_vacuum == AUTO_VACUUM_FULL
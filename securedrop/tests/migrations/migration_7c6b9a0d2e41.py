@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import random
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.exc import NoSuchColumnError
+
+from db import db
+from journalist_app import create_app
+from .helpers import random_chars
+
+random.seed('ᕕ( ᐛ )ᕗ')
+
+
+def add_source():
+    params = {
+        'uuid': str(uuid.uuid4()),
+        'filesystem_id': random_chars(96),
+        'journalist_designation': random_chars(50),
+        'interaction_count': random.randint(0, 1000),
+    }
+    sql = '''INSERT INTO sources (uuid, filesystem_id,
+                journalist_designation, interaction_count)
+             VALUES (:uuid, :filesystem_id, :journalist_designation,
+                :interaction_count)
+          '''
+    db.engine.execute(text(sql), **params)
+
+
+def add_submission(source_id):
+    params = {
+        'uuid': str(uuid.uuid4()),
+        'source_id': source_id,
+        'filename': random_chars(50),
+        'size': random.randint(0, 1024 * 1024 * 500),
+    }
+    sql = '''INSERT INTO submissions (uuid, source_id, filename, size)
+             VALUES (:uuid, :source_id, :filename, :size)
+          '''
+    db.engine.execute(text(sql), **params)
+
+
+def add_reply(source_id):
+    params = {
+        'uuid': str(uuid.uuid4()),
+        'source_id': source_id,
+        'filename': random_chars(50),
+        'size': random.randint(0, 1024 * 1024 * 500),
+    }
+    sql = '''INSERT INTO replies (uuid, source_id, filename, size,
+                deleted_by_source)
+             VALUES (:uuid, :source_id, :filename, :size, 0)
+          '''
+    db.engine.execute(text(sql), **params)
+
+
+def load_data(app):
+    with app.app_context():
+        for source_id in range(1, 11):
+            add_source()
+            add_submission(source_id)
+            add_reply(source_id)
+        db.session.commit()
+
+
+class UpgradeTester():
+
+    '''This migration verifies that the pack location columns now exist,
+    and are NULL for the existing submissions and replies, which have a
+    file of their own.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        load_data(self.app)
+
+    def check_upgrade(self):
+        with self.app.app_context():
+            for table in ('submissions', 'replies'):
+                rows = db.engine.execute(
+                    text('SELECT * FROM {}'.format(table))).fetchall()
+                assert len(rows) == 10
+                for row in rows:
+                    assert row['pack_generation'] is None
+                    assert row['pack_offset'] is None
+
+
+class DowngradeTester():
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        load_data(self.app)
+
+    def check_downgrade(self):
+        '''Verify that the pack location columns are now gone, but
+        otherwise the tables have the expected number of rows.
+        '''
+        with self.app.app_context():
+            for table in ('submissions', 'replies'):
+                rows = db.engine.execute(
+                    text('SELECT * FROM {}'.format(table))).fetchall()
+                assert len(rows) == 10
+                for row in rows:
+                    try:
+                        # This should produce an exception, as the column
+                        # (should) be gone.
+                        assert row['pack_offset'] is None
+                    except NoSuchColumnError:
+                        pass
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import text
+
+from db import db
+from journalist_app import create_app
+
+
+class UpgradeTester():
+    '''This migration only changes the journal mode, which does not affect
+       database contents. Check that the change was persisted.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        pass
+
+    def check_upgrade(self):
+        with self.app.app_context():
+            journal_mode = db.engine.execute(
+                text('PRAGMA journal_mode')).scalar()
+            assert journal_mode == 'wal'
+
+
+class DowngradeTester():
+    '''Check that the database was switched back to the default rollback
+       journal.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        pass
+
+    def check_downgrade(self):
+        with self.app.app_context():
+            journal_mode = db.engine.execute(
+                text('PRAGMA journal_mode')).scalar()
+            assert journal_mode == 'delete'
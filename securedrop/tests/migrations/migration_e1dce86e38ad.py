@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import text
+
+from db import db
+from journalist_app import create_app
+
+INDEXES = [
+    'ix_sources_pending_last_updated',
+    'ix_submissions_source_id_downloaded',
+    'ix_submissions_filename',
+    'ix_replies_source_id_deleted_by_source',
+    'ix_source_stars_source_id',
+    'ix_journalist_login_attempt_journalist_id_timestamp',
+]
+
+
+def get_index_names():
+    return [x[0] for x in db.engine.execute(text('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'index' AND name LIKE 'ix_%'
+        '''))]
+
+
+class UpgradeTester():
+    '''This migration only adds indexes, which does not affect database
+       contents. Check that all of them were created.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        pass
+
+    def check_upgrade(self):
+        with self.app.app_context():
+            assert sorted(get_index_names()) == sorted(INDEXES)
+
+
+class DowngradeTester():
+    '''Check that all of the indexes were dropped.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.app = create_app(config)
+
+    def load_data(self):
+        pass
+
+    def check_downgrade(self):
+        with self.app.app_context():
+            assert get_index_names() == []
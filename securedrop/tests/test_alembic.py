@@ -221,3 +221,26 @@ def test_downgrade_with_data(alembic_config, config, migration):
 
     # Make sure it applied "cleanly" for some definition of clean
     downgrade_tester.check_downgrade()
+
+
+def test_pack_locations_downgrade_requires_unpacking(alembic_config, config):
+    upgrade(alembic_config, '7c6b9a0d2e41')
+    app = create_app(config)
+    with app.app_context():
+        db.engine.execute(text('''
+            INSERT INTO sources (uuid, filesystem_id, journalist_designation,
+                                 interaction_count)
+            VALUES ('uuid', 'filesystem_id', 'designation', 1)
+        '''))
+        db.engine.execute(text('''
+            INSERT INTO submissions (uuid, source_id, filename, size,
+                                     pack_generation, pack_offset)
+            VALUES ('uuid', 1, '1-msg.gpg', 10, 0, 0)
+        '''))
+
+    # The packed message would be lost
+    with pytest.raises(subprocess.CalledProcessError):
+        downgrade(alembic_config, '-1')
+    with app.app_context():
+        assert db.engine.execute(text(
+            'SELECT pack_offset FROM submissions')).scalar() == 0
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from threading import Event, Thread
+
+from bounded_executor import BoundedExecutor, ExecutorBusy
+
+
+def test_run_returns_result():
+    executor = BoundedExecutor('test', workers=1, max_queued=0)
+    assert executor.run(lambda x, y: x + y, 1, y=2) == 3
+    assert executor.stats()['calls'] == 1
+
+
+def test_run_propagates_exceptions():
+    executor = BoundedExecutor('test', workers=1, max_queued=0)
+
+    def fail():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        executor.run(fail)
+    assert executor.stats()['calls'] == 1
+    # The slot was released
+    assert executor.run(lambda: 'ok') == 'ok'
+
+
+def test_run_rejects_calls_beyond_queue_depth():
+    executor = BoundedExecutor('test', workers=1, max_queued=1)
+    release = Event()
+    threads = [Thread(target=executor.run, args=(release.wait,))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while executor.stats()['max_pending'] < 2:
+        pass
+
+    try:
+        with pytest.raises(ExecutorBusy):
+            executor.run(lambda: None)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    stats = executor.stats()
+    assert stats['calls'] == 2
+    assert stats['rejected'] == 1
+    assert stats['max_queued_time'] > 0
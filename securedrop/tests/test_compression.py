@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+import pytest
+import subprocess
+import zipfile
+
+os.environ['SECUREDROP_ENV'] = 'test'  # noqa
+import compression
+
+TEXT = b'The quick brown fox jumps over the lazy dog.\n' * 1000
+
+
+def test_text_is_compressed_at_default_level():
+    assert compression.gzip_level(TEXT) == compression.DEFAULT
+
+
+def test_empty_file_is_compressed_at_default_level():
+    assert compression.gzip_level(b'') == compression.DEFAULT
+
+
+def test_compressed_formats_are_stored():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('fox.txt', TEXT)
+    assert compression.gzip_level(archive.getvalue()) == compression.STORE
+
+    # Even when their start alone would compress well
+    jpeg = b'\xff\xd8\xff\xe0' + b'\x00' * 1000
+    assert compression.gzip_level(jpeg) == compression.STORE
+    mp4 = b'\x00\x00\x00\x18ftypmp42' + b'\x00' * 1000
+    assert compression.gzip_level(mp4) == compression.STORE
+
+
+def test_random_data_is_stored():
+    assert compression.gzip_level(os.urandom(4096)) == compression.STORE
+
+
+def test_partly_random_data_is_compressed_quickly():
+    # Like PDFs with some text between compressed streams
+    sample = os.urandom(3600) + TEXT[:400]
+    assert compression.gzip_level(sample) == compression.FAST
+
+
+def _parallel_gzip(data, **kwargs):
+    fileobj = io.BytesIO()
+    with compression.ParallelGzipFile('file.txt', fileobj, **kwargs) as gzf:
+        for start in range(0, len(data), 1000):
+            gzf.write(data[start:start + 1000])
+    return fileobj.getvalue()
+
+
+@pytest.mark.parametrize('threads', [1, 3])
+def test_parallel_gzip(threads):
+    data = TEXT * 10 + os.urandom(10000)
+    compressed = _parallel_gzip(data, threads=threads, block_size=4096)
+    assert gzip.GzipFile(fileobj=io.BytesIO(compressed)).read() == data
+    assert len(compressed) < len(data)
+
+
+def test_parallel_gzip_keeps_filename_and_no_mtime():
+    compressed = _parallel_gzip(TEXT, threads=2, block_size=4096)
+    # Like the gzip files of file submissions always were
+    fileobj = io.BytesIO()
+    with gzip.GzipFile(filename='file.txt', mode='wb', fileobj=fileobj,
+                       mtime=0) as gzf:
+        gzf.write(TEXT)
+    assert compressed[:19] == fileobj.getvalue()[:19] == \
+        b'\x1f\x8b\x08\x08\x00\x00\x00\x00\x02\xfffile.txt\x00'
+
+
+def test_parallel_gzip_of_empty_file():
+    assert gzip.GzipFile(fileobj=io.BytesIO(_parallel_gzip(b''))).read() == ''
+
+
+def test_parallel_gzip_can_be_read_by_gunzip(tmpdir):
+    data = TEXT * 10
+    path = str(tmpdir.join('1-doc.gz'))
+    with io.open(path, 'wb') as fh:
+        fh.write(_parallel_gzip(data, threads=2, block_size=4096))
+
+    assert subprocess.check_output(['gunzip', '--test', path]) == ''
+    assert subprocess.check_output(['gunzip', '--stdout', path]) == data
+    assert 'file.txt' in subprocess.check_output(['gunzip', '--list',
+                                                  '--name', path])
+
+
+def test_parallel_gzip_stops_threads():
+    fileobj = io.BytesIO()
+    with pytest.raises(ValueError):
+        with compression.ParallelGzipFile('file.txt', fileobj, threads=2,
+                                          block_size=10) as gzf:
+            gzf.write(TEXT)
+            assert len(gzf._workers) == 2
+            raise ValueError()
+    assert not gzf._workers
@@ -7,6 +7,7 @@ import re
 
 os.environ['SECUREDROP_ENV'] = 'test'  # noqa
 import crypto_util
+import journalist_app as journalist_app_module
 import models
 
 from crypto_util import CryptoUtil, CryptoException
@@ -19,6 +20,16 @@ def test_word_list_does_not_contain_empty_strings(journalist_app):
     assert '' not in journalist_app.crypto_util.adjectives
 
 
+def test_gpg_is_set_up_on_first_use(config, mocker):
+    gpg = mocker.patch('crypto_util.gnupg.GPG')
+    app = journalist_app_module.create_app(config)
+    assert not gpg.called
+
+    assert app.crypto_util.gpg is gpg.return_value
+    assert app.crypto_util.gpg is gpg.return_value
+    gpg.assert_called_once_with(binary='gpg2', homedir=config.GPG_KEY_DIR)
+
+
 def test_clean():
     ok = (' !#%$&)(+*-1032547698;:=?@acbedgfihkjmlonqpsrutwvyxzABCDEFGHIJ'
           'KLMNOPQRSTUVWXYZ')
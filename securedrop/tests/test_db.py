@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 import pytest
 
-from mock import MagicMock
+from datetime import datetime, timedelta
+from flask import g
+from mock import MagicMock, patch
+from redis.exceptions import ConnectionError
 
+from db import db, SQLITE_BUSY_TIMEOUT_MS
 from utils import db_helper
-from models import (Journalist, Submission, Reply, Source, get_one_or_else,
+from models import (Journalist, JournalistLoginAttempt, Submission, Reply,
+                    Source, SourceStar, get_one_or_else,
                     LoginThrottledException)
 
 
@@ -78,6 +83,98 @@ def test_throttle_login(journalist_app, test_journo):
             Journalist.throttle_login(journalist)
 
 
+def test_throttle_login_without_redis(journalist_app, test_journo):
+    with journalist_app.app_context():
+        journalist = test_journo['journalist']
+        with patch.object(Journalist._login_attempts, 'hit',
+                          side_effect=ConnectionError):
+            for _ in range(Journalist._MAX_LOGIN_ATTEMPTS_PER_PERIOD):
+                Journalist.throttle_login(journalist)
+            with pytest.raises(LoginThrottledException):
+                Journalist.throttle_login(journalist)
+        assert (JournalistLoginAttempt.query.count() ==
+                Journalist._MAX_LOGIN_ATTEMPTS_PER_PERIOD + 1)
+
+
+def test_prune_login_attempts(journalist_app, test_journo):
+    with journalist_app.app_context():
+        journalist = test_journo['journalist']
+        for days in range(5):
+            attempt = JournalistLoginAttempt(journalist)
+            attempt.timestamp = datetime.utcnow() - timedelta(days=days)
+            db.session.add(attempt)
+        db.session.commit()
+
+        before = datetime.utcnow() - timedelta(hours=36)
+        assert JournalistLoginAttempt.prune(before, batch_size=2) == 3
+        assert JournalistLoginAttempt.query.count() == 2
+
+
+def test_reserve_interaction_indexes(journalist_app, test_source):
+    with journalist_app.app_context():
+        source = Source.query.get(test_source['id'])
+        assert source.reserve_interaction_indexes() == [1]
+        assert source.reserve_interaction_indexes(2) == [2, 3]
+        assert source.interaction_count == 3
+
+
+def test_sqlite_connection_pragmas(journalist_app):
+    with journalist_app.app_context():
+        assert db.engine.execute('PRAGMA secure_delete').scalar() == 1
+        assert (db.engine.execute('PRAGMA busy_timeout').scalar() ==
+                SQLITE_BUSY_TIMEOUT_MS)
+
+
+def test_write_lock_wait_is_recorded(journalist_app, test_journo):
+    with journalist_app.test_request_context('/'):
+        Journalist.query.all()
+        assert g.get('db_lock_wait') is None
+
+        journalist = Journalist.query.get(test_journo['id'])
+        journalist.last_access = datetime.utcnow()
+        db.session.commit()
+        assert g.db_lock_wait >= 0
+
+
+HOT_QUERIES = [
+    # journalist index
+    (lambda: Source.query.filter_by(pending=False)
+                         .filter(Source.last_updated.isnot(None))
+                         .order_by(Source.last_updated.desc()),
+     'ix_sources_pending_last_updated'),
+    (lambda: SourceStar.query.filter_by(source_id=1),
+     'ix_source_stars_source_id'),
+    (lambda: Submission.query.filter_by(source_id=1, downloaded=False),
+     'ix_submissions_source_id_downloaded'),
+    # downloading all of a source's submissions
+    (lambda: Submission.query.filter(Submission.source_id == 1),
+     'ix_submissions_source_id_downloaded'),
+    # col.download_single_file
+    (lambda: Submission.query.filter(Submission.filename == '1-msg.gpg'),
+     'ix_submissions_filename'),
+    # source lookup
+    (lambda: Reply.query.filter(Reply.source_id == 1)
+                        .filter(Reply.deleted_by_source == False),  # noqa
+     'ix_replies_source_id_deleted_by_source'),
+    # Journalist.throttle_login
+    (lambda: JournalistLoginAttempt.query.filter(
+        JournalistLoginAttempt.journalist_id == 1).filter(
+        JournalistLoginAttempt.timestamp > datetime.utcnow()),
+     'ix_journalist_login_attempt_journalist_id_timestamp'),
+]
+
+
+@pytest.mark.parametrize('make_query,index', HOT_QUERIES)
+def test_hot_queries_use_indexes(journalist_app, make_query, index):
+    with journalist_app.app_context():
+        statement = make_query().statement.compile(dialect=db.engine.dialect)
+        params = [statement.params[name] for name in statement.positiontup]
+        plan = db.engine.execute('EXPLAIN QUERY PLAN ' + str(statement),
+                                 params).fetchall()
+        # The last column of each row describes a step of the query plan
+        assert any(index in row[-1] for row in plan), plan
+
+
 def test_submission_string_representation(journalist_app, test_source):
     with journalist_app.app_context():
         db_helper.submit(test_source['source'], 2)
@@ -16,10 +16,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import collections
 import os
 import re
 
-from flask import request, session, render_template_string, render_template
+from flask import (g, request, session, render_template_string,
+                   render_template)
 from flask_babel import gettext
 from werkzeug.datastructures import Headers
 
@@ -241,6 +243,35 @@ def test_locale_to_rfc_5646():
     assert i18n.locale_to_rfc_5646('zh-hant') == 'zh-Hant'
 
 
+def test_negotiate_accept_languages(monkeypatch):
+    monkeypatch.setattr(i18n, 'LOCALES', ['en_US', 'fr_FR'])
+    monkeypatch.setattr(i18n, 'ACCEPT_LANGUAGES_CACHE_SIZE', 2)
+    monkeypatch.setattr(i18n, '_accept_languages_cache',
+                        collections.OrderedDict())
+
+    assert i18n.negotiate_accept_languages('fr-FR,fr;q=0.8') == 'fr_FR'
+    assert i18n.negotiate_accept_languages('de, en-US;q=0.5') == 'en_US'
+    assert i18n.negotiate_accept_languages('de') is None
+    assert i18n.negotiate_accept_languages('') is None
+
+    # Only the most recently used headers are kept
+    assert list(i18n._accept_languages_cache.keys()) == ['de', '']
+
+
+def test_set_locale_uses_preloaded_translations(config):
+    config.SUPPORTED_LOCALES = ['en_US', 'fr_FR']
+    app = journalist_app_module.create_app(config)
+
+    headers = Headers([('Accept-Language', 'fr-FR')])
+    with app.test_request_context(headers=headers):
+        i18n.set_locale(config)
+        assert g.locale == 'fr_FR'
+        assert g.text_direction == 'ltr'
+        assert g.html_lang == 'fr'
+        assert g.locales is i18n.LOCALE2NAME
+        assert request.babel_translations is i18n.TRANSLATIONS['fr_FR']
+
+
 # Grab the journalist_app fixture to trigger creation of resources
 def test_html_en_lang_correct(journalist_app, config):
     # Then delete it because using it won't test what we want
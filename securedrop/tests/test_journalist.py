@@ -25,9 +25,11 @@ import utils
 os.environ['SECUREDROP_ENV'] = 'test'  # noqa
 from sdconfig import SDConfig, config
 
+from bounded_executor import ExecutorBusy
 from db import db
-from models import (InvalidPasswordLength, Journalist, Reply, Source,
-                    Submission)
+from models import (InvalidPasswordLength, Journalist, LoginThrottledException,
+                    Reply, Source, Submission)
+from store import designation_filename, stored_filename
 from utils.instrument import InstrumentedApp
 
 # Smugly seed the RNG for deterministic testing
@@ -441,6 +443,23 @@ def test_admin_edits_user_password_success_response(journalist_app,
         assert VALID_PASSWORD_2 in text
 
 
+def test_deleted_user_is_logged_out(journalist_app, test_journo):
+    with journalist_app.test_client() as app:
+        _login_user(app, test_journo['username'], test_journo['password'],
+                    test_journo['otp_secret'])
+        # The journalist is now in the journalist cache
+        resp = app.get(url_for('main.index'))
+        assert resp.status_code == 200
+
+        with journalist_app.app_context():
+            db.session.delete(Journalist.query.get(test_journo['id']))
+            db.session.commit()
+
+        resp = app.get(url_for('main.index'))
+        assert resp.status_code == 302
+        assert resp.location == url_for('main.login', _external=True)
+
+
 def test_admin_deletes_invalid_user_404(journalist_app, test_admin):
     with journalist_app.app_context():
         invalid_id = db.session.query(func.max(Journalist.id)).scalar() + 1
@@ -1362,6 +1381,32 @@ def test_journalist_reply_view(journalist_app, test_source, test_journo):
         assert resp.status_code == 302
 
 
+def test_regenerate_code_renames_no_file(journalist_app, test_journo,
+                                         test_source):
+    with journalist_app.app_context():
+        submission = utils.db_helper.submit(test_source['source'], 1)[0]
+        submission_id = submission.id
+        path = current_app.storage.path(test_source['filesystem_id'],
+                                        submission.filename)
+        original_designation = submission.source.journalist_designation
+
+    with journalist_app.test_client() as app:
+        _login_user(app, test_journo['username'], test_journo['password'],
+                    test_journo['otp_secret'])
+        resp = app.post(url_for('main.regenerate_code'),
+                        data=dict(filesystem_id=test_source['filesystem_id']))
+        assert resp.status_code == 302
+
+    with journalist_app.app_context():
+        submission = Submission.query.get(submission_id)
+        source = submission.source
+        assert source.journalist_designation != original_designation
+        assert submission.filename == '1-msg.gpg'
+        assert os.path.exists(path)
+        assert submission.download_filename == \
+            '1-{}-msg.gpg'.format(source.journalist_filename)
+
+
 def test_too_long_user_password_change(journalist_app, test_journo):
     overly_long_password = VALID_PASSWORD + \
         'a' * (Journalist.MAX_PASSWORD_LEN - len(VALID_PASSWORD) + 1)
@@ -1539,7 +1584,7 @@ def test_delete_source_deletes_docs_on_disk(journalist_app,
 
 
 def test_login_with_invalid_password_doesnt_call_argon2(mocker, test_journo):
-    mock_argon2 = mocker.patch('models.argon2.verify')
+    mock_argon2 = mocker.patch('models._argon2').return_value.verify
     invalid_pw = 'a'*(Journalist.MAX_PASSWORD_LEN + 1)
 
     with pytest.raises(InvalidPasswordLength):
@@ -1550,13 +1595,36 @@ def test_login_with_invalid_password_doesnt_call_argon2(mocker, test_journo):
 
 
 def test_valid_login_calls_argon2(mocker, test_journo):
-    mock_argon2 = mocker.patch('models.argon2.verify')
+    mock_argon2 = mocker.patch('models._argon2').return_value.verify
     Journalist.login(test_journo['username'],
                      test_journo['password'],
                      TOTP(test_journo['otp_secret']).now())
     assert mock_argon2.called
 
 
+def test_login_when_argon2_verifications_are_busy(mocker, test_journo):
+    mocker.patch('models.ARGON2_VERIFICATIONS.run',
+                 side_effect=ExecutorBusy)
+    with pytest.raises(LoginThrottledException):
+        Journalist.login(test_journo['username'],
+                         test_journo['password'],
+                         TOTP(test_journo['otp_secret']).now())
+
+
+def test_set_password_when_argon2_verifications_are_busy(journalist_app,
+                                                         mocker, test_journo):
+    mocker.patch('models.ARGON2_VERIFICATIONS.run',
+                 side_effect=ExecutorBusy)
+    new_password = 'correct horse battery staple profanity oil chewy oboe'
+    with journalist_app.app_context():
+        journalist = Journalist.query.get(test_journo['id'])
+        journalist.set_password(new_password)
+        db.session.commit()
+
+        mocker.stopall()
+        assert journalist.valid_password(new_password)
+
+
 def test_render_locales(config, journalist_app, test_journo, test_source):
     """the locales.html template must collect both request.args (l=XX) and
        request.view_args (/<filesystem_id>) to build the URL to
@@ -1666,7 +1734,7 @@ def test_download_selected_submissions_from_source(journalist_app,
                 source.journalist_filename,
                 "%s_%s" % (filename.split('-')[0],
                            source.last_updated.date()),
-                filename
+                designation_filename(filename, source.journalist_filename)
             ))
         assert zipinfo
 
@@ -1684,10 +1752,40 @@ def test_download_selected_submissions_from_source(journalist_app,
                     source.journalist_designation,
                     "%s_%s" % (filename.split('-')[0],
                                source.last_updated.date()),
-                    filename
+                    designation_filename(filename,
+                                         source.journalist_filename)
                 ))
 
 
+def test_bulk_delete_compacts_packs_once(journalist_app, test_journo,
+                                         test_source, mocker):
+    compact_packs = mocker.patch('journalist_app.utils.compact_packs')
+    storage = journalist_app.storage
+    filesystem_id = test_source['filesystem_id']
+    with journalist_app.app_context():
+        source = Source.query.get(test_source['id'])
+        filenames = []
+        with storage.pack_lock(filesystem_id):
+            for i in range(1, 4):
+                location = storage.append_to_pack(filesystem_id, b'message')
+                filenames.append(stored_filename(i, 'msg'))
+                db.session.add(Submission(source, filenames[-1],
+                                          pack_location=location))
+            db.session.commit()
+
+    with journalist_app.test_client() as app:
+        _login_user(app, test_journo['username'], test_journo['password'],
+                    test_journo['otp_secret'])
+        app.post('/bulk', data=dict(action='delete',
+                                    filesystem_id=filesystem_id,
+                                    doc_names_selected=filenames))
+
+    compact_packs.assert_called_once_with(filesystem_id)
+    with journalist_app.app_context():
+        assert Submission.query.filter_by(source_id=test_source['id']) \
+            .count() == 0
+
+
 def _bulk_download_setup(journo):
     """Create a couple sources, make some submissions on their behalf,
     mark some of them as downloaded"""
@@ -1745,7 +1843,7 @@ def test_download_unread_all_sources(journalist_app, test_journo):
                     bulk['source0'].journalist_designation,
                     "%s_%s" % (submission.filename.split('-')[0],
                                bulk['source0'].last_updated.date()),
-                    submission.filename
+                    submission.download_filename
                 ))
         assert zipinfo
 
@@ -1756,7 +1854,7 @@ def test_download_unread_all_sources(journalist_app, test_journo):
                 bulk['source1'].journalist_designation,
                 "%s_%s" % (submission.filename.split('-')[0],
                            bulk['source1'].last_updated.date()),
-                submission.filename
+                submission.download_filename
             ))
         assert zipinfo
 
@@ -1769,7 +1867,7 @@ def test_download_unread_all_sources(journalist_app, test_journo):
                     bulk['source0'].journalist_designation,
                     "%s_%s" % (submission.filename.split('-')[0],
                                bulk['source0'].last_updated.date()),
-                    submission.filename
+                    submission.download_filename
                 ))
 
     for submission in bulk['downloaded1']:
@@ -1780,7 +1878,7 @@ def test_download_unread_all_sources(journalist_app, test_journo):
                     bulk['source1'].journalist_designation,
                     "%s_%s" % (submission.filename.split('-')[0],
                                bulk['source1'].last_updated.date()),
-                    submission.filename
+                    submission.download_filename
                 ))
 
 
@@ -1815,7 +1913,7 @@ def test_download_all_selected_sources(journalist_app, test_journo):
                 bulk['source1'].journalist_designation,
                 "%s_%s" % (submission.filename.split('-')[0],
                            bulk['source1'].last_updated.date()),
-                submission.filename)
+                submission.download_filename)
             )
         assert zipinfo
 
@@ -1828,7 +1926,7 @@ def test_download_all_selected_sources(journalist_app, test_journo):
                     bulk['source0'].journalist_designation,
                     "%s_%s" % (submission.filename.split('-')[0],
                                bulk['source0'].last_updated.date()),
-                    submission.filename)
+                    submission.download_filename)
                 )
 
 
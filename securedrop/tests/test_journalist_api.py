@@ -9,6 +9,7 @@ from uuid import UUID, uuid4
 
 from flask import current_app, url_for
 from itsdangerous import TimedJSONWebSignatureSerializer
+from sqlalchemy import event
 
 from db import db
 from models import Journalist, Reply, Source, SourceStar, Submission
@@ -372,7 +373,7 @@ def test_authorized_user_can_get_all_submissions(journalist_app,
         observed_submissions = [submission['filename'] for
                                 submission in json_response['submissions']]
 
-        expected_submissions = [submission.filename for
+        expected_submissions = [submission.download_filename for
                                 submission in Submission.query.all()]
         assert observed_submissions == expected_submissions
 
@@ -392,8 +393,9 @@ def test_authorized_user_get_source_submissions(journalist_app,
         observed_submissions = [submission['filename'] for
                                 submission in json_response['submissions']]
 
-        expected_submissions = [submission.filename for submission in
-                                test_submissions['source'].submissions]
+        source = Source.query.filter(Source.uuid == uuid).one()
+        expected_submissions = [submission.download_filename for
+                                submission in source.submissions]
         assert observed_submissions == expected_submissions
 
 
@@ -414,8 +416,9 @@ def test_authorized_user_can_get_single_submission(journalist_app,
 
         assert json_response['uuid'] == submission_uuid
         assert json_response['is_read'] is False
-        assert json_response['filename'] == \
-            test_submissions['source'].submissions[0].filename
+        submission = Submission.query.filter(
+            Submission.uuid == submission_uuid).one()
+        assert json_response['filename'] == submission.download_filename
         assert json_response['size'] == \
             test_submissions['source'].submissions[0].size
 
@@ -432,7 +435,7 @@ def test_authorized_user_can_get_all_replies(journalist_app, test_files,
         observed_replies = [reply['filename'] for
                             reply in json_response['replies']]
 
-        expected_replies = [reply.filename for
+        expected_replies = [reply.download_filename for
                             reply in Reply.query.all()]
         assert observed_replies == expected_replies
 
@@ -451,8 +454,9 @@ def test_authorized_user_get_source_replies(journalist_app, test_files,
         observed_replies = [reply['filename'] for
                             reply in json_response['replies']]
 
-        expected_replies = [reply.filename for
-                            reply in test_files['source'].replies]
+        source = Source.query.filter(Source.uuid == uuid).one()
+        expected_replies = [reply.download_filename for
+                            reply in source.replies]
         assert observed_replies == expected_replies
 
 
@@ -478,8 +482,7 @@ def test_authorized_user_can_get_single_reply(journalist_app, test_files,
         assert json_response['journalist_uuid'] == \
             reply.journalist.uuid
         assert json_response['is_deleted_by_source'] is False
-        assert json_response['filename'] == \
-            test_files['source'].replies[0].filename
+        assert json_response['filename'] == reply.download_filename
         assert json_response['size'] == \
             test_files['source'].replies[0].size
 
@@ -554,6 +557,13 @@ def test_authorized_user_can_download_submission(journalist_app,
         # Response should be a PGP encrypted download
         assert response.mimetype == 'application/pgp-encrypted'
 
+        # It is named after the designation of the source, which is not in
+        # the name of the file
+        assert response.headers['Content-Disposition'] == \
+            'attachment; filename={}'.format(submission.download_filename)
+        assert test_submissions['source'].journalist_filename not in \
+            submission.filename
+
         # Response should have Etag field with hash
         assert response.headers['ETag'] == '"sha256:{}"'.format(
             hashlib.sha256(response.data).hexdigest())
@@ -594,6 +604,33 @@ def test_authorized_user_can_get_current_user_endpoint(journalist_app,
         assert json_response['uuid'] == test_journo['journalist'].uuid
 
 
+def test_authorized_request_looks_up_user_at_most_once(journalist_app,
+                                                       test_journo,
+                                                       journalist_api_token):
+    journalist_queries = []
+
+    def count_journalist_queries(conn, cursor, statement, parameters,
+                                 context, executemany):
+        if 'FROM journalists' in statement:
+            journalist_queries.append(statement)
+
+    with journalist_app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     count_journalist_queries)
+
+    with journalist_app.test_client() as app:
+        response = app.get(url_for('api.get_current_user'),
+                           headers=get_api_headers(journalist_api_token))
+        assert response.status_code == 200
+        assert len(journalist_queries) == 1
+
+        # The user is now in the journalist cache
+        response = app.get(url_for('api.get_current_user'),
+                           headers=get_api_headers(journalist_api_token))
+        assert response.status_code == 200
+        assert len(journalist_queries) == 1
+
+
 def test_request_with_missing_auth_header_triggers_403(journalist_app):
     with journalist_app.test_client() as app:
         response = app.get(url_for('api.get_current_user'),
@@ -654,7 +691,7 @@ def test_authorized_user_can_add_reply(journalist_app, journalist_api_token,
     assert reply is not None
 
     # check that the filename is present and correct (#4047)
-    assert response.json['filename'] == reply.filename
+    assert response.json['filename'] == reply.download_filename
 
     with journalist_app.app_context():  # Now verify everything was saved.
         assert reply.journalist_id == test_journo['id']
@@ -665,8 +702,7 @@ def test_authorized_user_can_add_reply(journalist_app, journalist_api_token,
 
         source = Source.query.get(source_id)
 
-        expected_filename = '{}-{}-reply.gpg'.format(
-            source.interaction_count, source.journalist_filename)
+        expected_filename = '{}-reply.gpg'.format(source.interaction_count)
 
         expected_filepath = current_app.storage.path(
             source.filesystem_id, expected_filename)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import datetime
+import io
+import os
+import pytest
+import time
+
+from flask import current_app
+
+os.environ['SECUREDROP_ENV'] = 'test'  # noqa
+import maintenance
+
+from db import db
+from models import Source, Submission
+from store import pack_filename, stored_filename
+from utils import db_helper
+
+
+def test_maintain_database(journalist_app, config, mocker):
+    mocker.patch('maintenance.STEP_PAUSE', 0)
+    with journalist_app.app_context():
+        # The pragma only takes effect with a VACUUM on the same connection
+        with db.engine.connect() as conn:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        for i in range(100):
+            source, _ = db_helper.init_source_without_keypair()
+            source.last_updated = datetime.datetime(2018, 1, 1)
+        db.session.commit()
+        Source.query.delete()
+        db.session.commit()
+
+    report = maintenance.maintain_database(config=config)
+
+    assert report['before']['auto_vacuum'] == 'incremental'
+    assert report['before']['freelist_count'] > 0
+    assert report['pages_freed'] == report['before']['freelist_count']
+    assert report['after']['freelist_count'] == 0
+    assert report['after']['fragmentation'] == 0.0
+    assert report['tables_analyzed'] > 0
+
+
+def test_maintain_database_waits_for_quiet(journalist_app, config):
+    with journalist_app.app_context():
+        source, _ = db_helper.init_source_without_keypair()
+        source.last_updated = datetime.datetime.utcnow()
+        db.session.commit()
+
+    report = maintenance.maintain_database(config=config, quiet_minutes=10)
+    assert report == dict(skipped='not quiet')
+
+
+def _make_old(source, days):
+    directory = current_app.storage.path(source.filesystem_id)
+    created = time.time() - days * 24 * 60 * 60
+    os.utime(directory, (created, created))
+    return directory
+
+
+def test_purge_pending_sources(journalist_app, config):
+    with journalist_app.app_context():
+        abandoned, codename = db_helper.init_source()
+        abandoned_id = abandoned.id
+        abandoned_fid = abandoned.filesystem_id
+        abandoned_dir = _make_old(abandoned, days=31)
+
+        recent, _ = db_helper.init_source_without_keypair()
+        recent_id = recent.id
+
+        submitted, _ = db_helper.init_source_without_keypair()
+        db_helper.submit(submitted, 1)
+        submitted.pending = False
+        db.session.commit()
+        submitted_id = submitted.id
+        _make_old(submitted, days=31)
+
+    report = maintenance.purge_pending_sources(
+        max_age_days=30, batch_size=1, config=config)
+
+    assert report['examined'] == 2
+    assert report['purged'] == 1
+    assert report['reply_keys_deleted'] == 1
+    with journalist_app.app_context():
+        assert Source.query.get(abandoned_id) is None
+        assert Source.query.get(recent_id) is not None
+        assert Source.query.get(submitted_id) is not None
+        assert not os.path.exists(abandoned_dir)
+        assert current_app.crypto_util.getkey(abandoned_fid) is None
+
+
+def test_purge_pending_sources_spares_sources_submitting(journalist_app,
+                                                         config):
+    with journalist_app.app_context():
+        submitting, _ = db_helper.init_source_without_keypair()
+        directory = _make_old(submitting, days=31)
+        # What submitting does before writing to their directory
+        submitting.reserve_interaction_indexes()
+        submitting_id = submitting.id
+
+    report = maintenance.purge_pending_sources(max_age_days=30,
+                                               config=config)
+
+    assert report['examined'] == 1
+    assert report['purged'] == 0
+    with journalist_app.app_context():
+        assert Source.query.get(submitting_id).pending
+    assert os.path.isdir(directory)
+
+
+def _packed_submissions(source, contents):
+    storage = current_app.storage
+    submissions = []
+    with storage.pack_lock(source.filesystem_id):
+        for i, content in enumerate(contents, 1):
+            location = storage.append_to_pack(source.filesystem_id, content)
+            submissions.append(Submission(
+                source, stored_filename(i, 'msg'),
+                pack_location=location))
+            db.session.add(submissions[-1])
+        db.session.commit()
+    return submissions
+
+
+def test_compact_pack(journalist_app, config):
+    with journalist_app.app_context():
+        source, _ = db_helper.init_source_without_keypair()
+        filesystem_id = source.filesystem_id
+        deleted, kept = _packed_submissions(source, [b'deleted', b'kept'])
+        kept_id = kept.id
+        db.session.delete(deleted)
+        db.session.commit()
+        first_pack = current_app.storage.path(filesystem_id, pack_filename(0))
+
+    report = maintenance.compact_pack(filesystem_id, config=config)
+
+    assert report['items'] == 1
+    assert report['bytes_reclaimed'] == len(b'deleted')
+    assert not os.path.exists(first_pack)
+    with journalist_app.app_context():
+        kept = Submission.query.get(kept_id)
+        assert kept.pack_generation == 1
+        assert current_app.storage.read_packed(
+            filesystem_id, kept.pack_location) == b'kept'
+
+    report = maintenance.compact_pack(filesystem_id, config=config)
+    assert report == dict(skipped='nothing to compact')
+
+
+def _move_packed(submission, generation, offset):
+    # Like another request committing a compaction, which leaves the location
+    # `submission` loaded before it as it was
+    db.session.query(Submission) \
+        .filter(Submission.id == submission.id) \
+        .update({Submission.pack_generation: generation,
+                 Submission.pack_offset: offset},
+                synchronize_session=False)
+
+
+def test_read_packed_item_after_compaction(journalist_app, config):
+    with journalist_app.app_context():
+        storage = current_app.storage
+        source, _ = db_helper.init_source_without_keypair()
+        filesystem_id = source.filesystem_id
+        deleted, kept = _packed_submissions(source, [b'deleted', b'kept'])
+        kept = Submission.query.get(kept.id)
+        assert kept.pack_generation == 0
+
+        with storage.pack_lock(filesystem_id):
+            location, = storage.write_pack(filesystem_id,
+                                           [kept.pack_location])
+        _move_packed(kept, location.generation, location.offset)
+        storage.remove_pack(filesystem_id, 0)
+
+        assert storage.read_packed_item(filesystem_id, kept)[0] == b'kept'
+        assert kept.pack_location == location
+
+        # Unless it was moved, a deleted pack file is an error
+        storage.remove_pack(filesystem_id, 1)
+        with pytest.raises(IOError):
+            storage.read_packed_item(filesystem_id, kept)
+
+
+def test_read_packed_item_after_unpacking(journalist_app, config):
+    with journalist_app.app_context():
+        storage = current_app.storage
+        source, _ = db_helper.init_source_without_keypair()
+        filesystem_id = source.filesystem_id
+        submission, = _packed_submissions(source, [b'message'])
+        submission = Submission.query.get(submission.id)
+
+        with io.open(storage.path(filesystem_id, submission.filename),
+                     'wb') as fh:
+            fh.write(b'message')
+        _move_packed(submission, None, None)
+        storage.remove_pack(filesystem_id, 0)
+
+        assert storage.read_packed_item(filesystem_id,
+                                        submission)[0] == b'message'
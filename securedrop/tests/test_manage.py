@@ -6,7 +6,10 @@ import datetime
 import logging
 import os
 import manage
+import management
 import mock
+import stat
+import store
 import sys
 import time
 
@@ -14,7 +17,11 @@ from StringIO import StringIO
 
 os.environ['SECUREDROP_ENV'] = 'test'  # noqa
 
-from models import Journalist, db
+from flask import current_app
+from crypto_util import CryptoUtil
+from models import (Journalist, JournalistLoginAttempt, Reply, Source,
+                    Submission, db)
+from store import Storage
 from utils import db_helper
 
 
@@ -199,6 +206,9 @@ def test_get_username(mocker):
 def test_clean_tmp_do_nothing(caplog):
     args = argparse.Namespace(days=0,
                               directory=' UNLIKELY::::::::::::::::: ',
+                              spool_hours=0,
+                              spool_directory=' UNLIKELY::::::::::::::::: ',
+                              min_size=0,
                               verbose=logging.DEBUG)
     manage.setup_verbosity(args)
     manage.clean_tmp(args)
@@ -208,6 +218,9 @@ def test_clean_tmp_do_nothing(caplog):
 def test_clean_tmp_too_young(config, caplog):
     args = argparse.Namespace(days=24*60*60,
                               directory=config.TEMP_DIR,
+                              spool_hours=24,
+                              spool_directory=config.TEMP_DIR,
+                              min_size=0,
                               verbose=logging.DEBUG)
     # create a file
     io.open(os.path.join(config.TEMP_DIR, 'FILE'), 'a').close()
@@ -220,6 +233,9 @@ def test_clean_tmp_too_young(config, caplog):
 def test_clean_tmp_removed(config, caplog):
     args = argparse.Namespace(days=0,
                               directory=config.TEMP_DIR,
+                              spool_hours=24,
+                              spool_directory=config.TEMP_DIR,
+                              min_size=0,
                               verbose=logging.DEBUG)
     fname = os.path.join(config.TEMP_DIR, 'FILE')
     with io.open(fname, 'a'):
@@ -230,6 +246,60 @@ def test_clean_tmp_removed(config, caplog):
     assert 'FILE removed' in caplog.text
 
 
+def _make_old_file(path, size):
+    with io.open(path, 'wb') as f:
+        f.write(b'x' * size)
+    old = time.time() - 2*24*60*60
+    os.utime(path, (old, old))
+
+
+def test_clean_tmp_abandoned_spools(config, caplog):
+    spool_dir = os.path.join(config.SECUREDROP_DATA_ROOT, 'spools')
+    os.mkdir(spool_dir)
+    args = argparse.Namespace(days=7,
+                              directory=config.TEMP_DIR,
+                              spool_hours=1,
+                              spool_directory=spool_dir,
+                              min_size=0,
+                              verbose=logging.DEBUG)
+    spool = os.path.join(spool_dir, 'A' * 43 + '.aes')
+    _make_old_file(spool, 1000)
+    # Not created by SecureTemporaryFile
+    other = os.path.join(spool_dir, 'other.aes')
+    _make_old_file(other, 1000)
+
+    manage.setup_verbosity(args)
+    manage.clean_tmp(args)
+    assert not os.path.exists(spool)
+    assert os.path.exists(other)
+    assert '1000 bytes reclaimed' in caplog.text
+
+
+def test_clean_tmp_thresholds(config, caplog):
+    args = argparse.Namespace(days=1,
+                              directory=config.TEMP_DIR,
+                              spool_hours=1,
+                              spool_directory=config.TEMP_DIR,
+                              min_size=1024,
+                              verbose=logging.DEBUG)
+    in_use = os.path.join(config.TEMP_DIR, 'in_use.zip')
+    _make_old_file(in_use, 2048)
+    small = os.path.join(config.TEMP_DIR, 'small.zip')
+    _make_old_file(small, 10)
+    big = os.path.join(config.TEMP_DIR, 'big.zip')
+    _make_old_file(big, 2048)
+
+    manage.setup_verbosity(args)
+    with io.open(in_use, 'rb'):
+        manage.clean_tmp(args)
+    assert 'in_use.zip is in use' in caplog.text
+    assert os.path.exists(in_use)
+    assert 'small.zip smaller than 1024 bytes' in caplog.text
+    assert os.path.exists(small)
+    assert not os.path.exists(big)
+    assert '2048 bytes reclaimed' in caplog.text
+
+
 def test_were_there_submissions_today(source_app, config):
     original_config = manage.config
     try:
@@ -245,11 +315,225 @@ def test_were_there_submissions_today(source_app, config):
             source.last_updated = (datetime.datetime.utcnow() -
                                    datetime.timedelta(hours=24*2))
             db.session.commit()
+            source_id = source.id
             manage.were_there_submissions_today(args)
             assert io.open(count_file).read() == "0"
+            # The command's own app context ended the session
+            source = Source.query.get(source_id)
             source.last_updated = datetime.datetime.utcnow()
             db.session.commit()
             manage.were_there_submissions_today(args)
             assert io.open(count_file).read() == "1"
     finally:
         manage.config = original_config
+
+
+def test_apply_retention_policy(journalist_app, config, caplog, mocker):
+    original_config = manage.config
+    try:
+        # We need to override the config to point at the per-test DB
+        manage.config = config
+        enqueue = mocker.patch('worker.enqueue')
+        args = argparse.Namespace(downloaded_submissions_days=None,
+                                  inactive_sources_days=None,
+                                  batch_size=10, dry_run=True,
+                                  verbose=logging.DEBUG)
+        manage.setup_verbosity(args)
+        assert manage.apply_retention_policy(args) == 1
+        assert 'No retention rule given' in caplog.text
+
+        args.inactive_sources_days = 90
+        assert manage.apply_retention_policy(args) == 0
+        assert ('Retention rule inactive-sources (90 days) (dry run): '
+                '0 selected') in caplog.text
+        assert not enqueue.called
+
+        args.dry_run = False
+        assert manage.apply_retention_policy(args) == 0
+        assert enqueue.call_args[0][1:] == ({'inactive-sources': 90}, False,
+                                            10)
+    finally:
+        manage.config = original_config
+
+
+def test_migrate_store(config, caplog, mocker):
+    mocker.patch('management.store_layout.BATCH_PAUSE', 0)
+    flat = Storage(config.STORE_DIR, config.TEMP_DIR, config.JOURNALIST_KEY)
+    sharded = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, layout=store.SHARDED)
+    filesystem_ids = ['source{}'.format(i) for i in range(5)]
+    for filesystem_id in filesystem_ids:
+        flat.create_source_directory(filesystem_id)
+        io.open(flat.path(filesystem_id, '1-source-msg.gpg'), 'w').close()
+
+    args = argparse.Namespace(store_dir=config.STORE_DIR, layout='sharded',
+                              batch_size=2, verbose=logging.DEBUG)
+    manage.setup_verbosity(args)
+    assert manage.migrate_store(args) == 0
+    assert '4 of 5 source directories moved' in caplog.text
+    assert '5 source directories moved to the sharded layout' in caplog.text
+    for filesystem_id in filesystem_ids:
+        path = sharded.path(filesystem_id, '1-source-msg.gpg')
+        assert os.path.isfile(path)
+        assert store.shards(filesystem_id)[0] in path
+    assert not any(os.path.isdir(os.path.join(config.STORE_DIR, f))
+                   for f in filesystem_ids)
+
+    # Nothing left to move
+    assert manage.migrate_store(args) == 0
+    assert '0 source directories moved to the sharded layout' in caplog.text
+
+    args.layout = 'flat'
+    assert manage.migrate_store(args) == 0
+    assert sorted(os.listdir(config.STORE_DIR)) == filesystem_ids
+    for filesystem_id in filesystem_ids:
+        assert os.path.isfile(os.path.join(config.STORE_DIR, filesystem_id,
+                                           '1-source-msg.gpg'))
+
+
+def test_migrate_filenames(journalist_app, config, caplog, mocker):
+    mocker.patch('management.store_filenames.BATCH_PAUSE', 0)
+    original_config = manage.config
+    try:
+        manage.config = config
+        with journalist_app.app_context():
+            source, _ = db_helper.init_source_without_keypair()
+            journalist, _ = db_helper.init_journalist()
+            filenames = ['1-{}-msg.gpg'.format(source.journalist_filename),
+                         '2-{}-reply.gpg'.format(source.journalist_filename),
+                         '3-msg.gpg']
+            for filename in filenames:
+                with io.open(current_app.storage.path(source.filesystem_id,
+                                                      filename), 'wb') as f:
+                    f.write(filename.encode('utf-8'))
+            db.session.add(Submission(source, filenames[0]))
+            db.session.add(Reply(journalist, source, filenames[1]))
+            db.session.add(Submission(source, filenames[2]))
+            db.session.commit()
+            source_id = source.id
+            directory = current_app.storage.path(source.filesystem_id)
+
+        args = argparse.Namespace(batch_size=1, verbose=logging.DEBUG)
+        manage.setup_verbosity(args)
+        assert manage.migrate_filenames(args) == 0
+        assert '2 files renamed after their index and type' in caplog.text
+
+        assert sorted(os.listdir(directory)) == ['1-msg.gpg', '2-reply.gpg',
+                                                 '3-msg.gpg']
+        with io.open(os.path.join(directory, '1-msg.gpg'), 'rb') as f:
+            assert f.read() == filenames[0].encode('utf-8')
+        with journalist_app.app_context():
+            source = Source.query.get(source_id)
+            assert [item.filename for item in source.collection] == \
+                ['1-msg.gpg', '2-reply.gpg', '3-msg.gpg']
+            assert source.collection[0].download_filename == filenames[0]
+
+        # Nothing left to rename
+        assert manage.migrate_filenames(args) == 0
+        assert '0 files renamed after their index and type' in caplog.text
+    finally:
+        manage.config = original_config
+
+
+def test_unpack_messages(journalist_app, config, caplog):
+    original_config = manage.config
+    try:
+        manage.config = config
+        with journalist_app.app_context():
+            storage = current_app.storage
+            source, _ = db_helper.init_source_without_keypair()
+            journalist, _ = db_helper.init_journalist()
+            with storage.pack_lock(source.filesystem_id):
+                db.session.add(Submission(
+                    source, '1-msg.gpg', pack_location=storage.append_to_pack(
+                        source.filesystem_id, b'message')))
+                db.session.add(Reply(
+                    journalist, source, '2-reply.gpg',
+                    pack_location=storage.append_to_pack(
+                        source.filesystem_id, b'reply')))
+                db.session.commit()
+            source_id = source.id
+            directory = storage.path(source.filesystem_id)
+
+        args = argparse.Namespace(verbose=logging.DEBUG)
+        manage.setup_verbosity(args)
+        assert manage.unpack_messages(args) == 0
+        assert '2 messages and replies unpacked' in caplog.text
+
+        assert sorted(os.listdir(directory)) == ['1-msg.gpg', '2-reply.gpg']
+        with io.open(os.path.join(directory, '2-reply.gpg'), 'rb') as f:
+            assert f.read() == b'reply'
+        with journalist_app.app_context():
+            source = Source.query.get(source_id)
+            assert [item.pack_location for item in source.collection] == \
+                [None, None]
+    finally:
+        manage.config = original_config
+
+
+def test_unpack_messages_while_packing(journalist_app, config, caplog,
+                                       mocker):
+    mocker.patch.object(config, 'STORE_PACK_MESSAGES', True, create=True)
+    original_config = manage.config
+    try:
+        manage.config = config
+        args = argparse.Namespace(verbose=logging.DEBUG)
+        assert manage.unpack_messages(args) == 1
+        assert 'STORE_PACK_MESSAGES must be disabled' in caplog.text
+    finally:
+        manage.config = original_config
+
+
+def test_prune_login_attempts(journalist_app, test_journo, config, caplog):
+    original_config = manage.config
+    try:
+        # We need to override the config to point at the per-test DB
+        manage.config = config
+        args = argparse.Namespace(days=1, batch_size=10,
+                                  verbose=logging.DEBUG)
+
+        with journalist_app.app_context():
+            for days in (0, 2):
+                attempt = JournalistLoginAttempt(test_journo['journalist'])
+                attempt.timestamp = (datetime.datetime.utcnow() -
+                                     datetime.timedelta(days=days))
+                db.session.add(attempt)
+            db.session.commit()
+
+            manage.setup_verbosity(args)
+            manage.prune_login_attempts(args)
+            assert '1 login attempts older than 1 days removed' in caplog.text
+            assert JournalistLoginAttempt.query.count() == 1
+    finally:
+        manage.config = original_config
+
+
+def test_compile_templates(config, caplog):
+    original_config = manage.config
+    try:
+        # We need to override the config to point at the per-test data root
+        manage.config = config
+        args = argparse.Namespace(verbose=logging.DEBUG)
+        manage.setup_verbosity(args)
+
+        assert manage.compile_templates(args) == 0
+        assert 'source_app templates compiled' in caplog.text
+        assert 'journalist_app templates compiled' in caplog.text
+
+        cache_dir = os.path.join(config.SECUREDROP_DATA_ROOT, 'jinja_cache')
+        assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+        assert len(os.listdir(cache_dir)) == (
+            len(os.listdir(config.SOURCE_TEMPLATES_DIR)) +
+            len(os.listdir(config.JOURNALIST_TEMPLATES_DIR)))
+    finally:
+        manage.config = original_config
+
+
+# Note: we use the `journalist_app` fixture because it creates the DB
+def test_management_app_context(journalist_app, test_journo, config):
+    with management.app_context(config):
+        assert isinstance(current_app.storage, Storage)
+        assert isinstance(current_app.crypto_util, CryptoUtil)
+        assert Journalist.query.count() == 1
+        # None of the web interfaces' machinery is set up
+        assert 'babel' not in current_app.extensions
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import time
+import uuid
+
+from rate_limit import SlidingWindowCounter
+
+
+def make_counter(period=60, limit=3):
+    # Use a unique prefix so the tests don't share state through Redis
+    return SlidingWindowCounter(str(uuid.uuid4()), period, limit)
+
+
+def test_hit_counts_events_per_key():
+    counter = make_counter()
+    assert counter.hit('a') == 1
+    assert counter.hit('a') == 2
+    assert counter.hit('b') == 1
+
+
+def test_hit_count_is_bounded():
+    counter = make_counter(limit=3)
+    for _ in range(10):
+        count = counter.hit('a')
+    assert count == 4
+    assert counter.redis.zcard('{}:a'.format(counter.prefix)) == 4
+
+
+def test_events_leave_the_window():
+    counter = make_counter(period=1)
+    assert counter.hit('a') == 1
+    time.sleep(1.1)
+    assert counter.hit('a') == 1
+
+
+def test_keys_expire():
+    counter = make_counter(period=1)
+    counter.hit('a')
+    assert counter.redis.ttl('{}:a'.format(counter.prefix)) <= 1
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+
+os.environ['SECUREDROP_ENV'] = 'test'  # noqa
+from request_that_secures_file_uploads import BudgetedSpool, SpoolBudget
+from secure_tempfile import SecureTemporaryFile
+
+
+def test_upload_within_budget_stays_in_memory():
+    budget = SpoolBudget(limit=10)
+    spool = BudgetedSpool(budget, size=8)
+    spool.write('abcd')
+    spool.write('efgh')
+    assert not spool.spilled
+    assert budget.stats()['memory'] == 8
+
+    spool.seek(0)
+    assert spool.read() == 'abcdefgh'
+    spool.close()
+    assert budget.stats() == dict(memory=0, limit=10, max_memory=8,
+                                  spilled_uploads=0, spilled_bytes=0)
+
+
+def test_upload_spills_when_budget_is_exceeded():
+    budget = SpoolBudget(limit=10)
+    other = BudgetedSpool(budget)
+    other.write('abcdef')
+
+    spool = BudgetedSpool(budget)
+    spool.write('ghij')
+    spool.write('klmn')
+    assert spool.spilled
+    assert isinstance(spool._file, SecureTemporaryFile)
+    assert budget.stats()['memory'] == 6
+    assert budget.stats()['spilled_uploads'] == 1
+    assert budget.stats()['spilled_bytes'] == 8
+
+    spool.seek(0)
+    assert spool.read() == 'ghijklmn'
+    spool.close()
+    other.close()
+    assert budget.stats()['memory'] == 0
+
+
+def test_upload_bigger_than_budget_goes_to_disk():
+    budget = SpoolBudget(limit=10)
+    spool = BudgetedSpool(budget, size=11)
+    assert spool.spilled
+    spool.write('x' * 11)
+    spool.seek(0)
+    assert spool.read() == 'x' * 11
+    spool.close()
+    assert budget.stats()['memory'] == 0
+
+
+def test_budget_released_when_spool_is_not_closed():
+    budget = SpoolBudget(limit=10)
+    spool = BudgetedSpool(budget)
+    spool.write('abcd')
+    del spool
+    assert budget.stats()['memory'] == 0
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import time
+
+from flask import current_app
+
+os.environ['SECUREDROP_ENV'] = 'test'  # noqa
+import retention
+
+from db import db
+from models import Source, Submission
+from utils import db_helper
+
+
+def _make_old(submission, days):
+    path = current_app.storage.path(submission.source.filesystem_id,
+                                    submission.filename)
+    received = time.time() - days * 24 * 60 * 60
+    os.utime(path, (received, received))
+
+
+def test_downloaded_submissions_rule(journalist_app, config, mocker):
+    mocker.patch('retention.BATCH_PAUSE', 0)
+    with journalist_app.app_context():
+        source, _ = db_helper.init_source()
+        old_downloaded, old_unread, recent_downloaded = \
+            db_helper.submit(source, 3)
+        db_helper.mark_downloaded(old_downloaded, recent_downloaded)
+        _make_old(old_downloaded, days=31)
+        _make_old(old_unread, days=31)
+        expected_bytes = old_downloaded.size
+        old_downloaded_id = old_downloaded.id
+
+    policy = {'downloaded-submissions': 30}
+    report = retention.apply_retention_policy(policy, dry_run=True,
+                                              batch_size=1, config=config)
+    result = report['rules']['downloaded-submissions']
+    assert result == dict(days=30, selected=1, deleted=0,
+                          bytes=expected_bytes, rows=1)
+    with journalist_app.app_context():
+        assert Submission.query.count() == 3
+
+    report = retention.apply_retention_policy(policy, batch_size=1,
+                                              config=config)
+    result = report['rules']['downloaded-submissions']
+    assert result['deleted'] == 1
+    assert result['bytes'] == expected_bytes
+    with journalist_app.app_context():
+        assert Submission.query.count() == 2
+        assert Submission.query.get(old_downloaded_id) is None
+
+
+def test_inactive_sources_rule(journalist_app, test_journo, config,
+                               mocker):
+    mocker.patch('retention.BATCH_PAUSE', 0)
+    with journalist_app.app_context():
+        inactive, _ = db_helper.init_source()
+        submissions = db_helper.submit(inactive, 2)
+        replies = db_helper.reply(test_journo['journalist'], inactive, 1)
+        inactive.last_updated = (datetime.datetime.utcnow() -
+                                 datetime.timedelta(days=91))
+        db.session.commit()
+        inactive_id = inactive.id
+        inactive_fid = inactive.filesystem_id
+        expected_bytes = sum(f.size for f in submissions + replies)
+
+        active, _ = db_helper.init_source()
+        db_helper.submit(active, 1)
+        active_id = active.id
+
+    policy = {'inactive-sources': 90}
+    report = retention.apply_retention_policy(policy, dry_run=True,
+                                              config=config)
+    assert report['rules']['inactive-sources'] == dict(
+        days=90, selected=1, deleted=0, bytes=expected_bytes, rows=4)
+    with journalist_app.app_context():
+        assert Source.query.get(inactive_id) is not None
+
+    report = retention.apply_retention_policy(policy, config=config)
+    assert report['rules']['inactive-sources']['deleted'] == 1
+    with journalist_app.app_context():
+        assert Source.query.get(inactive_id) is None
+        assert Source.query.get(active_id) is not None
+        assert Submission.query.filter_by(source_id=inactive_id).count() == 0
+        assert current_app.crypto_util.getkey(inactive_fid) is None
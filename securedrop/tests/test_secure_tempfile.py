@@ -108,3 +108,90 @@ def test_tmp_file_id_omits_invalid_chars():
     f = SecureTemporaryFile('/tmp')
     assert '/' not in f.tmp_file_id
     assert '\0' not in f.tmp_file_id
+
+
+def test_readinto():
+    f = SecureTemporaryFile('/tmp', chunk_size=7)
+    msg = MESSAGE * 10
+    f.write(msg)
+    buf = bytearray(12)
+    out = ''
+    while True:
+        count = f.readinto(buf)
+        if not count:
+            break
+        out += str(buf[:count])
+
+    assert out == msg
+
+
+def test_small_chunks():
+    f = SecureTemporaryFile('/tmp', chunk_size=4)
+    for c in MESSAGE:
+        f.write(c)
+    assert f.read(5) == MESSAGE[:5]
+    assert f.read() == MESSAGE[5:]
+
+
+def test_writes_are_encrypted_once_flushed():
+    f = SecureTemporaryFile('/tmp')
+    f.write(MESSAGE)
+    f.flush()
+    with io.open(f.filepath, 'rb') as fh:
+        contents = fh.read()
+
+    assert len(contents) == len(MESSAGE)
+    assert MESSAGE not in contents
+
+
+def test_read_again_after_seeking_back():
+    f = SecureTemporaryFile('/tmp', chunk_size=16)
+    msg = MESSAGE * 10
+    f.write(msg)
+    assert f.read() == msg
+    assert f.read() == ''
+
+    f.seek(0)
+    assert f.read(7) == msg[:7]
+    f.seek(0)
+    assert f.read() == msg
+
+
+def test_seek_to_any_position():
+    f = SecureTemporaryFile('/tmp', chunk_size=16)
+    msg = os.urandom(100)
+    f.write(msg)
+    for offset in (0, 1, 15, 16, 17, 33, 99, 100):
+        assert f.seek(offset) == offset
+        assert f.tell() == offset
+        assert f.read(10) == msg[offset:offset + 10]
+        assert f.tell() == min(offset + 10, len(msg))
+
+    assert f.seek(120) == 120
+    assert f.read() == ''
+    f.seek(-5, io.SEEK_END)
+    assert f.read() == msg[-5:]
+    f.seek(40)
+    f.read(3)
+    f.seek(2, io.SEEK_CUR)
+    assert f.read(4) == msg[45:49]
+
+
+def test_seek_when_iv_counter_wraps_around():
+    f = SecureTemporaryFile('/tmp')
+    f.iv = '\xff' * 16
+    f.initialize_cipher()
+    msg = os.urandom(64)
+    f.write(msg)
+    f.seek(20)
+    assert f.read() == msg[20:]
+
+
+def test_seek_then_write():
+    f = SecureTemporaryFile('/tmp')
+    f.write(MESSAGE)
+    f.seek(0)
+
+    with pytest.raises(AssertionError) as err:
+        f.write(MESSAGE)
+    assert 'You cannot write after reading!' in str(err)
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 import gzip
 import json
+import os
 import re
 import subprocess
 
 from cStringIO import StringIO
 from flask import session, escape, current_app, url_for, g
 from mock import patch, ANY
+from threading import Thread
 
+import compression
 import crypto_util
 import source
 import utils
@@ -15,6 +18,7 @@ import version
 
 from db import db
 from models import Source, Reply
+from store import Storage
 from source_app import main as source_app_main
 from utils.db_helper import new_codename
 from utils.instrument import InstrumentedApp
@@ -297,6 +301,29 @@ def test_submit_message(source_app):
         assert "Thanks! We received your message" in text
 
 
+def test_submit_message_to_pack(source_app, config):
+    source_app.storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                                 config.JOURNALIST_KEY, pack_messages=True)
+    with source_app.test_client() as app:
+        new_codename(app, session)
+        for msg in ("First message.", "Second message."):
+            resp = app.post(
+                url_for('main.submit'),
+                data=dict(msg=msg, fh=(StringIO(''), '')),
+                follow_redirects=True)
+            assert resp.status_code == 200
+        source = g.source
+        first, second = source.submissions
+        assert first.pack_location.offset == 0
+        assert second.pack_location.offset == first.size
+        assert os.listdir(source_app.storage.path(source.filesystem_id)) == \
+            ['messages-0.pack']
+        ciphertext = source_app.storage.read_packed(
+            source.filesystem_id, second.pack_location)
+        assert len(ciphertext) == second.size
+        assert b'Second message.' not in ciphertext
+
+
 def test_submit_empty_message(source_app):
     with source_app.test_client() as app:
         new_codename(app, session)
@@ -356,6 +383,46 @@ def test_submit_both(source_app):
         assert "Thanks! We received your message and document" in text
 
 
+def test_concurrent_submissions_get_unique_filenames(source_app):
+    """Submissions racing each other for the same source must each be given
+    their own interaction index, otherwise they end up with the same filename
+    and overwrite each other on disk."""
+    num_submissions = 50
+    errors = []
+
+    with source_app.test_client() as app:
+        codename = new_codename(app, session)
+    filesystem_id = current_app.crypto_util.hash_codename(codename)
+
+    def submit():
+        try:
+            with source_app.test_client() as app:
+                with app.session_transaction() as sess:
+                    sess['codename'] = codename
+                    sess['logged_in'] = True
+                resp = app.post('/submit',
+                                data=dict(msg="This is a test.",
+                                          fh=(StringIO(''), '')))
+                assert resp.status_code == 302
+        except Exception as e:
+            errors.append(e)
+
+    with patch.object(source_app_main, 'async_genkey'):
+        threads = [Thread(target=submit) for _ in range(num_submissions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    source = Source.query.filter_by(filesystem_id=filesystem_id).one()
+    filenames = [submission.filename for submission in source.submissions]
+    assert len(set(filenames)) == num_submissions
+    assert source.interaction_count == num_submissions
+    assert (sorted(int(f.split('-')[0]) for f in filenames) ==
+            list(range(1, num_submissions + 1)))
+
+
 def test_submit_message_with_low_entropy(source_app):
     with patch.object(source_app_main, 'async_genkey') as async_genkey:
         with patch.object(source_app_main, 'get_entropy_estimate') \
@@ -479,7 +546,43 @@ def test_submit_sanitizes_filename(source_app):
             gzipfile.assert_called_with(filename=sanitized_filename,
                                         mode=ANY,
                                         fileobj=ANY,
-                                        mtime=0)
+                                        mtime=0,
+                                        compresslevel=ANY)
+
+
+def test_submit_sanitizes_filename_of_compressed_files(source_app, config,
+                                                       mocker):
+    """Test that the file name of uploads compressed by several threads is
+    sanitized too"""
+    source_app.storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                                 config.JOURNALIST_KEY, gzip_threads=2)
+    parallel_gzip_file = mocker.patch('compression.ParallelGzipFile',
+                                      wraps=compression.ParallelGzipFile)
+    plaintexts = []
+
+    def encrypt(plaintext, fingerprints, output=None, compress=True):
+        plaintexts.append(plaintext.read())
+        with open(output, 'wb') as fh:
+            fh.write(plaintexts[-1])
+    mocker.patch.object(source_app.crypto_util, 'encrypt',
+                        side_effect=encrypt)
+
+    contents = 'This is a test\n' * 10000
+    with source_app.test_client() as app:
+        new_codename(app, session)
+        resp = app.post(
+            url_for('main.submit'),
+            data=dict(
+                msg="",
+                fh=(StringIO(contents), '../../bin/gpg')),
+            follow_redirects=True)
+        assert resp.status_code == 200
+
+    assert parallel_gzip_file.called
+    gz, = plaintexts
+    # The name is after the 10 bytes of the gzip header that always come
+    assert gz[10:gz.index('\0', 10)] == 'bin_gpg'
+    assert gzip.GzipFile(fileobj=StringIO(gz)).read() == contents
 
 
 def test_tor2web_warning_headers(source_app):
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+os.environ['SECUREDROP_ENV'] = 'test'  # noqa
+import i18n
+import journalist_app as journalist_app_module
+import startup
+
+
+def test_preload(config, mocker):
+    config.SUPPORTED_LOCALES = ['en_US', 'fr_FR']
+    app = journalist_app_module.create_app(config)
+    assert i18n.TRANSLATIONS == {}
+    crypto_preload = mocker.patch.object(app.crypto_util, 'preload')
+
+    startup.preload(app)
+
+    assert crypto_preload.called
+    assert sorted(i18n.TRANSLATIONS) == ['en_US', 'fr_FR']
+    assert 'pyotp' in sys.modules
+    assert 'qrcode.image.svg' in sys.modules
+    assert 'index.html' in [name for _, name in app.jinja_env.cache.keys()]
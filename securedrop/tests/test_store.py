@@ -2,6 +2,7 @@
 import os
 import io
 import pytest
+import random
 import re
 import store
 import zipfile
@@ -9,6 +10,7 @@ import zipfile
 os.environ['SECUREDROP_ENV'] = 'test'  # noqa
 import utils
 
+from crypto_util import CryptoException
 from store import Storage
 
 
@@ -48,6 +50,134 @@ def test_path_returns_filename_of_items_within_folder(journalist_app, config):
     assert generated_absolute_path == expected_absolute_path
 
 
+def test_sharded_path(config):
+    storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, layout=store.SHARDED)
+    filesystem_id = 'example'
+    first, second = store.shards(filesystem_id)
+    assert storage.path(filesystem_id, '1-quintuple_cant-msg.gpg') == \
+        os.path.join(config.STORE_DIR, first, second, filesystem_id,
+                     '1-quintuple_cant-msg.gpg')
+
+    directory = storage.create_source_directory(filesystem_id)
+    assert os.path.isdir(directory)
+    assert directory == os.path.join(config.STORE_DIR, first, second,
+                                     filesystem_id)
+
+
+@pytest.mark.parametrize('filesystem_id', ['..', '.', '', 'a/../../..',
+                                           '/etc'])
+def test_sharded_path_rejects_traversal(config, filesystem_id):
+    storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, layout=store.SHARDED)
+    with pytest.raises(store.PathException):
+        storage.path(filesystem_id, 'passwd')
+    with pytest.raises(store.PathException):
+        storage.path('example', '..', '..', '..', '..', 'etc', 'passwd')
+
+
+def test_path_finds_directory_in_other_layout(config):
+    flat = Storage(config.STORE_DIR, config.TEMP_DIR, config.JOURNALIST_KEY)
+    sharded = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, layout=store.SHARDED)
+    flat_directory = flat.create_source_directory('in-flat-layout')
+    sharded_directory = sharded.create_source_directory('in-sharded-layout')
+
+    assert sharded.path('in-flat-layout') == flat_directory
+    assert flat.path('in-sharded-layout') == sharded_directory
+
+
+# Pieces of path components that could be used to get out of the store
+TRAVERSAL_PIECES = ['..', '.', '/', '//', '\0', '~', 'etc', 'passwd',
+                    '1-msg.gpg', '_FLAG', 'example-filesystem-id', '%2e',
+                    '\\', ' ', '\n']
+
+
+def random_components(rng):
+    return [''.join(rng.choice(TRAVERSAL_PIECES)
+                    for _ in range(rng.randint(0, 4)))
+            for _ in range(rng.randint(0, 4))]
+
+
+@pytest.mark.parametrize('layout', store.LAYOUTS)
+def test_path_stays_in_store(config, layout):
+    """Whatever the components, path() either rejects them or returns a
+    normalized path within the store, that verify() accepts."""
+    storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, layout=layout)
+    store_dir = os.path.abspath(config.STORE_DIR)
+    rng = random.Random(1545)
+    accepted = 0
+    for _ in range(2000):
+        components = random_components(rng)
+        try:
+            path = storage.path(*components)
+        except store.PathException:
+            assert any(not store.is_path_component(component)
+                       for component in components)
+            continue
+        accepted += 1
+        assert path == os.path.abspath(path)
+        assert path == store_dir or path.startswith(store_dir + os.sep)
+        storage.verify(path)
+    # Some of them were accepted
+    assert accepted > 0
+
+
+def test_path_does_not_stat_known_directories(config, mocker):
+    storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY)
+    directory = storage.create_source_directory('example-filesystem-id')
+    assert storage.path('example-filesystem-id') == directory
+
+    stat = mocker.patch('os.stat', side_effect=AssertionError)
+    assert storage.path('example-filesystem-id', '1-msg.gpg') == \
+        os.path.join(directory, '1-msg.gpg')
+    assert not stat.called
+
+
+def test_unknown_layout(config):
+    with pytest.raises(ValueError):
+        Storage(config.STORE_DIR, config.TEMP_DIR, config.JOURNALIST_KEY,
+                layout='nested')
+
+
+def test_append_to_pack_and_read_packed(config):
+    storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, pack_messages=True)
+    storage.create_source_directory('example-filesystem-id')
+
+    with storage.pack_lock('example-filesystem-id'):
+        first = storage.append_to_pack('example-filesystem-id', b'first')
+        second = storage.append_to_pack('example-filesystem-id', b'second')
+
+    assert first == store.PackLocation(0, 0, 5)
+    assert second == store.PackLocation(0, 5, 6)
+    assert storage.read_packed('example-filesystem-id', second) == b'second'
+    assert storage.pack_generations('example-filesystem-id') == [0]
+    storage.verify(storage.path('example-filesystem-id',
+                                store.pack_filename(0)))
+
+
+def test_write_pack_starts_new_generation(config):
+    storage = Storage(config.STORE_DIR, config.TEMP_DIR,
+                      config.JOURNALIST_KEY, pack_messages=True)
+    storage.create_source_directory('example-filesystem-id')
+    with storage.pack_lock('example-filesystem-id'):
+        locations = [storage.append_to_pack('example-filesystem-id', content)
+                     for content in (b'deleted', b'kept')]
+        new_locations = storage.write_pack('example-filesystem-id',
+                                           locations[1:])
+
+    assert new_locations == [store.PackLocation(1, 0, 4)]
+    assert storage.pack_generations('example-filesystem-id') == [0, 1]
+    assert storage.read_packed('example-filesystem-id',
+                               new_locations[0]) == b'kept'
+    with storage.pack_lock('example-filesystem-id'):
+        assert storage.append_to_pack('example-filesystem-id',
+                                      b'new') == store.PackLocation(1, 4, 3)
+
+
 def test_verify_path_not_absolute(journalist_app, config):
     with pytest.raises(store.PathException):
         journalist_app.storage.verify(
@@ -138,28 +268,66 @@ def test_get_zip(journalist_app, test_source, config):
         assert zipped_file_content == actual_file_content
 
 
-def test_rename_valid_submission(journalist_app, test_source):
+def test_designation_filename():
+    assert store.designation_filename('1-msg.gpg', 'abject_hand') == \
+        '1-abject_hand-msg.gpg'
+    assert store.designation_filename('2-doc.gz.gpg', 'abject_hand') == \
+        '2-abject_hand-doc.gz.gpg'
+    # Files stored by older versions are downloaded under the current
+    # designation too
+    assert store.designation_filename('3-plain_carp-reply.gpg',
+                                      'abject_hand') == \
+        '3-abject_hand-reply.gpg'
+    assert store.designation_filename('_FLAG', 'abject_hand') == '_FLAG'
+
+
+def test_get_zip_names_files_after_designation(journalist_app, test_source):
     with journalist_app.app_context():
-        old_journalist_filename = test_source['source'].journalist_filename
-        old_filename = utils.db_helper.submit(
-            test_source['source'], 1)[0].filename
+        submission = utils.db_helper.submit(test_source['source'], 1)[0]
+        assert submission.filename == '1-msg.gpg'
+        archive = zipfile.ZipFile(
+            journalist_app.storage.get_bulk_archive([submission]))
+        journalist_filename = submission.source.journalist_filename
+
+    assert archive.namelist()[0].endswith(
+        '/1-{}-msg.gpg'.format(journalist_filename))
 
-        new_journalist_filename = 'nestor_makhno'
-        expected_filename = old_filename.replace(old_journalist_filename,
-                                                 new_journalist_filename)
-        actual_filename = journalist_app.storage.rename_submission(
-            test_source['source'].filesystem_id, old_filename,
-            new_journalist_filename)
 
-    assert actual_filename == expected_filename
+def test_save_file_submission_retries_encryption(journalist_app, test_source,
+                                                 mocker):
+    encrypt = journalist_app.crypto_util.encrypt
+    plaintexts = []
 
+    def flaky_encrypt(plaintext, fingerprints, output=None, compress=True):
+        # Fail after having consumed some of the file
+        plaintexts.append(plaintext.read(2))
+        if len(plaintexts) == 1:
+            raise CryptoException('gpg-agent went away')
+        return encrypt(plaintext, fingerprints, output, compress)
 
-def test_rename_submission_with_invalid_filename(journalist_app):
-    original_filename = '1-quintuple_cant-msg.gpg'
-    returned_filename = journalist_app.storage.rename_submission(
-            'example-filesystem-id', original_filename,
-            'this-new-filename-should-not-be-returned')
+    mocker.patch.object(journalist_app.crypto_util, 'encrypt',
+                        side_effect=flaky_encrypt)
+    with journalist_app.app_context():
+        filename = journalist_app.storage.save_file_submission(
+            test_source['filesystem_id'], 1, 'file.txt',
+            io.BytesIO(b'some file'))
+        path = journalist_app.storage.path(test_source['filesystem_id'],
+                                           filename)
+
+    # Both attempts read the gzip file from its start
+    assert plaintexts == [b'\x1f\x8b', b'\x1f\x8b']
+    assert os.path.exists(path)
+
+
+def test_save_file_submission_gives_up_encryption(journalist_app,
+                                                  test_source, mocker):
+    encrypt = mocker.patch.object(
+        journalist_app.crypto_util, 'encrypt',
+        side_effect=CryptoException('gpg-agent went away'))
+    with journalist_app.app_context():
+        with pytest.raises(CryptoException):
+            journalist_app.storage.save_file_submission(
+                test_source['filesystem_id'], 1, 'file.txt',
+                io.BytesIO(b'some file'))
 
-    # None of the above files exist, so we expect the attempt to rename
-    # the submission to fail and the original filename to be returned.
-    assert original_filename == returned_filename
+    assert encrypt.call_count == store.ENCRYPTION_ATTEMPTS
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import os
+import stat
+
+os.environ['SECUREDROP_ENV'] = 'test'  # noqa
+import source_app
+import template_cache
+
+
+def test_cache_dir_permissions_are_restored(config):
+    cache_dir = template_cache.get_cache_dir(config)
+    os.mkdir(cache_dir, 0o755)
+
+    app = source_app.create_app(config)
+
+    assert app.jinja_env.bytecode_cache is not None
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_app_works_without_cache(config):
+    # Something that is not a directory is in the way of the cache
+    open(template_cache.get_cache_dir(config), 'w').close()
+
+    app = source_app.create_app(config)
+
+    assert app.jinja_env.bytecode_cache is None
+    with app.test_client() as app:
+        resp = app.get('/')
+        assert resp.status_code == 200
+
+
+def test_compiled_templates_are_reused(config):
+    template_cache.precompile(source_app.create_app(config))
+    cache_dir = template_cache.get_cache_dir(config)
+    cached = sorted(os.listdir(cache_dir))
+    mtimes = [os.stat(os.path.join(cache_dir, name)).st_mtime
+              for name in cached]
+
+    with source_app.create_app(config).test_client() as app:
+        resp = app.get('/')
+        assert resp.status_code == 200
+
+    assert sorted(os.listdir(cache_dir)) == cached
+    assert [os.stat(os.path.join(cache_dir, name)).st_mtime
+            for name in cached] == mtimes
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+import collections
 from datetime import datetime, timedelta
 import os
 
+from babel import dates
 from flask import session
 
 os.environ['SECUREDROP_ENV'] = 'test'  # noqa
@@ -80,6 +82,26 @@ def verify_filesizeformat(app):
         assert "072 To" in template_filters.filesizeformat(value)
 
 
+def test_timedelta_bucket_matches_babel():
+    seconds = range(0, 3 * 3600, 7) + [24 * 3600 * n for n in range(400)]
+    for s in seconds:
+        delta = timedelta(seconds=s)
+        time = dates.format_timedelta(delta, locale='en_US')
+        unit, value = template_filters._timedelta_bucket(delta)
+        assert time.startswith(str(value) + ' ' + unit)
+
+
+def test_filter_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(template_filters, 'CACHE_SIZE', 2)
+    cache = collections.OrderedDict()
+    for i in range(5):
+        assert template_filters._cached(cache, i, lambda: i * 2) == i * 2
+        assert len(cache) <= 2
+    # The most recent entries are kept
+    assert template_filters._cached(cache, 4, lambda: None) == 8
+    assert template_filters._cached(cache, 3, lambda: None) == 6
+
+
 # We can't use fixtures because these options are set at app init time, and we
 # can't modify them after.
 def test_source_filters(config):
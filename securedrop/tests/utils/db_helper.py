@@ -13,6 +13,7 @@ from sdconfig import config
 import models
 
 from db import db
+from store import stored_filename
 
 # models.{Journalist, Reply}
 
@@ -52,8 +53,7 @@ def reply(journalist, source, num_replies):
     replies = []
     for _ in range(num_replies):
         source.interaction_count += 1
-        fname = "{}-{}-reply.gpg".format(source.interaction_count,
-                                         source.journalist_filename)
+        fname = stored_filename(source.interaction_count, 'reply')
         current_app.crypto_util.encrypt(
             str(os.urandom(1)),
             [current_app.crypto_util.getkey(source.filesystem_id),
@@ -110,7 +110,7 @@ def init_source_without_keypair():
     db.session.add(source)
     db.session.commit()
     # Create the directory to store their submissions and replies
-    os.mkdir(current_app.storage.path(source.filesystem_id))
+    current_app.storage.create_source_directory(source.filesystem_id)
 
     return source, codename
 
@@ -153,7 +153,6 @@ def submit(source, num_submissions):
         fpath = current_app.storage.save_message_submission(
             source.filesystem_id,
             source.interaction_count,
-            source.journalist_filename,
             str(os.urandom(1))
         )
         submission = models.Submission(source, fpath)